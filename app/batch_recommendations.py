@@ -0,0 +1,201 @@
+"""
+Calcul nocturne des recommandations de tous les passagers.
+
+Usage : python batch_recommendations.py [--workers 4] [--chunk-size 500] [--limit 10] [--resume]
+
+Les passagers sont découpés en plages d'identifiants traitées par un pool de
+processus. Chaque plage est calculée puis réécrite d'un bloc (COPY) dans
+`recommendations` ; les plages terminées sont notées dans un fichier de
+reprise pour relancer un job interrompu avec --resume. Le job se termine en
+erreur (code 1) si une plage a échoué, en listant les plages à reprendre.
+Les délais des branches du pipeline, faits pour l'API, sont levés par défaut.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from database import SessionLocal, engine
+from models import Passenger
+from services.interaction_matrix import ML_DATA_DIR, interaction_matrix
+from services.model_registry import model_registry
+from services.recommendation_service import STAGE_TIMEOUTS, AdvancedRecommendationService
+from services.recommendation_store import recommendation_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("batch_recommendations")
+
+CHECKPOINT_PATH = os.getenv("BATCH_CHECKPOINT_PATH", os.path.join(ML_DATA_DIR, "batch_recommendations.json"))
+# Délai par branche du pipeline en batch (0: sans délai, une branche lente ne vide pas les recommandations)
+BATCH_STAGE_TIMEOUT = float(os.getenv("BATCH_STAGE_TIMEOUT", "0"))
+
+# Service propre à chaque processus du pool
+_service: Optional[AdvancedRecommendationService] = None
+
+
+def plan_chunks(db: Session, chunk_size: int) -> List[Tuple[int, int]]:
+    """Découper l'intervalle des identifiants passagers en plages fixes"""
+    min_id, max_id = db.query(func.min(Passenger.id), func.max(Passenger.id)).one()
+    if min_id is None:
+        return []
+    return [(start, min(start + chunk_size - 1, max_id)) for start in range(min_id, max_id + 1, chunk_size)]
+
+
+def load_checkpoint() -> Optional[Dict]:
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_checkpoint(checkpoint: Dict) -> None:
+    """Écriture atomique du fichier de reprise"""
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    tmp_path = f"{CHECKPOINT_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def _init_worker() -> None:
+    """Initialisation d'un processus du pool (modèles et matrice d'interactions hérités du parent)"""
+    global _service
+    # Ne pas réutiliser les connexions ouvertes par le processus parent
+    engine.dispose(close=False)
+    logging.getLogger("services").setLevel(logging.WARNING)
+    timeout = BATCH_STAGE_TIMEOUT or None
+    _service = AdvancedRecommendationService(stage_timeouts={name: timeout for name in STAGE_TIMEOUTS})
+
+
+async def _compute_chunk(db: Session, passengers: List[Passenger], limit: int) -> List[Dict]:
+    rows = []
+    created_at = datetime.now()
+    for passenger in passengers:
+        try:
+            recommendations = await _service.compute_recommendations(db, passenger, limit)
+        except Exception as e:
+            logger.error(f"❌ Erreur recommandations passager {passenger.id}: {e}")
+            continue
+
+        rows.extend({
+            "passenger_id": passenger.id,
+            "flight_id": rec["flight_id"],
+            "recommendation_type": rec["type"],
+            "score": rec["score"],
+            "reason": rec["reason"],
+            "created_at": created_at
+        } for rec in recommendations)
+    return rows
+
+
+def process_chunk(chunk: Tuple[int, int], limit: int) -> Tuple[Tuple[int, int], int, int]:
+    """Calculer puis réécrire les recommandations d'une plage de passagers"""
+    start_id, end_id = chunk
+    with SessionLocal() as db:
+        passengers = db.query(Passenger).filter(
+            Passenger.id.between(start_id, end_id)
+        ).order_by(Passenger.id).all()
+        rows = asyncio.run(_compute_chunk(db, passengers, limit))
+        recommendation_store.replace_range(db, start_id, end_id, rows)
+    return chunk, len(passengers), len(rows)
+
+
+def run(workers: int = 4, chunk_size: int = 500, limit: int = 10, resume: bool = False) -> Dict:
+    """Exécuter le job complet (ou reprendre le dernier job interrompu)"""
+    started = time.perf_counter()
+
+    # Modèles et matrice d'interactions chargés une fois dans le parent, partagés par fork
+    model_registry.load()
+    with SessionLocal() as db:
+        interaction_matrix.initialize(db)
+        chunks = plan_chunks(db, chunk_size)
+
+    checkpoint = load_checkpoint() if resume else None
+    if checkpoint and checkpoint.get("chunk_size") == chunk_size and not checkpoint.get("finished_at"):
+        completed = {tuple(chunk) for chunk in checkpoint["completed"]}
+        logger.info(f"⏩ Reprise du job {checkpoint['run_id']}: {len(completed)} plages déjà traitées")
+    else:
+        checkpoint = {
+            "run_id": datetime.now().strftime("%Y%m%d%H%M%S"),
+            "chunk_size": chunk_size,
+            "limit": limit,
+            "completed": [],
+            "started_at": datetime.now().isoformat()
+        }
+        completed = set()
+        save_checkpoint(checkpoint)
+
+    pending = [chunk for chunk in chunks if chunk not in completed]
+    logger.info(f"🚀 Batch recommandations: {len(pending)}/{len(chunks)} plages, {workers} processus")
+
+    passengers_done = 0
+    recommendations_written = 0
+    failed: List[Tuple[int, int]] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(process_chunk, chunk, limit): chunk for chunk in pending}
+        for future in as_completed(futures):
+            try:
+                chunk, n_passengers, n_recommendations = future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                logger.error(f"❌ Erreur traitement plage {futures[future][0]}-{futures[future][1]}: {e}")
+                continue
+
+            passengers_done += n_passengers
+            recommendations_written += n_recommendations
+            checkpoint["completed"].append(list(chunk))
+            save_checkpoint(checkpoint)
+
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"📦 Plage {chunk[0]}-{chunk[1]}: {n_passengers} passagers "
+                f"({len(checkpoint['completed'])}/{len(chunks)}, {passengers_done / elapsed:.1f} passagers/s)"
+            )
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "run_id": checkpoint["run_id"],
+        "chunks": len(chunks),
+        "chunks_completed": len(checkpoint["completed"]),
+        "failed_chunks": [list(chunk) for chunk in sorted(failed)],
+        "passengers": passengers_done,
+        "recommendations": recommendations_written,
+        "seconds": round(elapsed, 2),
+        "passengers_per_second": round(passengers_done / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    if len(checkpoint["completed"]) == len(chunks):
+        checkpoint["finished_at"] = datetime.now().isoformat()
+        checkpoint["report"] = report
+        save_checkpoint(checkpoint)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcul en batch des recommandations de tous les passagers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Nombre de processus")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Passagers par plage d'identifiants")
+    parser.add_argument("--limit", type=int, default=10, help="Recommandations conservées par passager")
+    parser.add_argument("--resume", action="store_true", help="Reprendre le dernier job interrompu")
+    args = parser.parse_args()
+
+    report = run(workers=args.workers, chunk_size=args.chunk_size, limit=args.limit, resume=args.resume)
+    if report["failed_chunks"]:
+        ranges = ", ".join(f"{start}-{end}" for start, end in report["failed_chunks"])
+        logger.error(
+            f"❌ {len(report['failed_chunks'])} plages en échec ({ranges}) : "
+            f"relancer avec --resume --chunk-size {args.chunk_size}"
+        )
+        sys.exit(1)
+    logger.info(
+        f"✅ {report['passengers']} passagers, {report['recommendations']} recommandations "
+        f"en {report['seconds']}s ({report['passengers_per_second']} passagers/s)"
+    )
@@ -0,0 +1,135 @@
+"""
+Débit des endpoints sous concurrence : session synchrone vs AsyncSession.
+
+Usage : python benchmark_async.py [--requests 500] [--concurrency 50] [--output rapport.json]
+
+Rejoue `--requests` requêtes « liste des vols + statistiques du dashboard »
+avec `--concurrency` requêtes simultanées sur une seule boucle d'événements,
+comme uvicorn. Avant : les handlers async utilisaient une Session psycopg2,
+chaque requête SQL bloquait la boucle et les requêtes s'exécutaient l'une
+après l'autre. Après : FlightService sur AsyncSession (asyncpg), la boucle
+reste libre pendant les allers-retours vers la base. Le retard maximal d'un
+battement de 10 ms mesure le blocage de la boucle. Lecture seule : la base
+de l'API (DATABASE_URL) peut être utilisée.
+"""
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Awaitable, Callable, Dict, List
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from models import Flight
+from services.flight_service import FlightService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("benchmark_async")
+
+HEARTBEAT_INTERVAL = 0.01
+flight_service = FlightService()
+
+
+def blocking_dashboard(db: Session) -> int:
+    """Requêtes de l'ancien FlightService (get_flights + get_dashboard_stats), session synchrone"""
+    today = datetime.now().date()
+    flights = db.query(Flight).offset(0).limit(100).all()
+    db.query(Flight).filter(func.date(Flight.departure_time) == today).count()
+    db.query(Flight.status, func.count(Flight.id)).filter(
+        func.date(Flight.departure_time) == today
+    ).group_by(Flight.status).all()
+    db.query(func.avg(Flight.occupied_seats * 100.0 / Flight.capacity)).filter(
+        func.date(Flight.departure_time) == today
+    ).scalar()
+    db.query(Flight.destination, func.count(Flight.id)).filter(
+        Flight.departure_time >= datetime.now()
+    ).group_by(Flight.destination).order_by(func.count(Flight.id).desc()).limit(5).all()
+    return len(flights)
+
+
+async def sync_request() -> None:
+    # Ancien handler: `async def` + Depends(get_db) -> la boucle attend chaque requête SQL
+    with SessionLocal() as db:
+        blocking_dashboard(db)
+
+
+async def async_request() -> None:
+    async with AsyncSessionLocal() as db:
+        await flight_service.get_flights(db, skip=0, limit=100)
+        await flight_service.get_dashboard_stats(db)
+
+
+async def heartbeat(lags: List[float], stop: asyncio.Event) -> None:
+    """Retard des réveils de la boucle (0 si la boucle n'est jamais bloquée)"""
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run(request: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    lags: List[float] = []
+    stop = asyncio.Event()
+
+    async def timed() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - started)
+
+    await request()  # chauffe (connexions, cache de requêtes)
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "max_loop_lag_ms": round(max(lags, default=0.0) * 1000, 2)
+    }
+
+
+async def main(requests: int, concurrency: int) -> Dict:
+    try:
+        return {
+            "sync_session": await run(sync_request, requests, concurrency),
+            "async_session": await run(async_request, requests, concurrency)
+        }
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit concurrent: session synchrone vs AsyncSession")
+    parser.add_argument("--requests", type=int, default=500, help="Nombre total de requêtes")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requêtes simultanées")
+    parser.add_argument("--output", help="Fichier JSON du rapport")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args.requests, args.concurrency))
+    for mode, result in report.items():
+        logger.info(
+            f"🚦 {mode}: {result['throughput_rps']} req/s, p95 {result['p95_ms']} ms, "
+            f"boucle bloquée jusqu'à {result['max_loop_lag_ms']} ms"
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,83 @@
+"""
+Mémoire des workers avec et sans projection des artefacts ML.
+
+Usage : python benchmark_memory.py [--workers 4] [--models-dir ml_data/models] [--output rapport.json]
+
+Lance `--workers` processus neufs qui chargent la dernière version publiée
+du registre, puis lisent tous les tableaux (comme le service le fait au fil
+des requêtes). Le RSS de chaque processus est relevé avant et après
+chargement, une fois avec des copies privées (MODELS_MMAP=0, comportement
+précédent) et une fois avec les tableaux projetés en mémoire. La part
+anonyme du RSS est propre à chaque worker ; la part projetée depuis les
+fichiers est partagée par tous via le cache disque.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+
+from services.model_registry import MODELS_DIR, ModelRegistry, process_memory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("benchmark_memory")
+
+
+def load_worker(models_dir: str, mmap: bool) -> Dict:
+    """Charger le registre dans un processus neuf et relever sa mémoire"""
+    before = process_memory()
+    registry = ModelRegistry(models_dir, mmap=mmap)
+    if not registry.load():
+        raise RuntimeError(f"Aucune version publiée dans {models_dir} (lancer train.py)")
+    # Lire toutes les pages, comme après un certain temps de service
+    for array in registry.arrays.values():
+        if array.dtype.kind in "biuf":
+            array.sum()
+    return {
+        "pid": os.getpid(),
+        "version": registry.version,
+        "before": before,
+        "after": process_memory(),
+        "arrays_mb": round(sum(array.nbytes for array in registry.arrays.values()) / 1024 ** 2, 2)
+    }
+
+
+def run(workers: int, models_dir: str, mmap: bool) -> Dict:
+    # spawn: chaque worker part d'un interpréteur vide, comme les workers uvicorn
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        results: List[Dict] = list(executor.map(load_worker, [models_dir] * workers, [mmap] * workers))
+
+    def total(moment: str, field: str) -> float:
+        return round(sum(result[moment].get(field, 0.0) for result in results), 1)
+
+    return {
+        "mode": "mmap" if mmap else "copy",
+        "workers": results,
+        "total_rss_mb": total("after", "rss_mb"),
+        "total_rss_anon_mb": total("after", "rss_anon_mb"),
+        "rss_anon_growth_mb": round(total("after", "rss_anon_mb") - total("before", "rss_anon_mb"), 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RSS des workers avec et sans projection des artefacts ML")
+    parser.add_argument("--workers", type=int, default=4, help="Nombre de processus simulant les workers")
+    parser.add_argument("--models-dir", default=MODELS_DIR, help="Registre de modèles à charger")
+    parser.add_argument("--output", help="Fichier JSON du rapport")
+    args = parser.parse_args()
+
+    report = {mode: run(args.workers, args.models_dir, mmap) for mode, mmap in (("copy", False), ("mmap", True))}
+    for mode, result in report.items():
+        logger.info(
+            f"📏 {mode}: RSS total {result['total_rss_mb']} Mo, "
+            f"dont anonyme {result['total_rss_anon_mb']} Mo (+{result['rss_anon_growth_mb']} Mo au chargement)"
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
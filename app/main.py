@@ -1,22 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Optional
+from typing import List, Optional, Union
+import asyncio
 import logging
 from datetime import datetime
 import os
 
-from database import get_db
+from database import AsyncSessionLocal, DATABASE_URL, get_async_db, get_db, SessionLocal
 from models import Flight, Passenger, Service, Booking, Recommendation
 from schemas import (
-    FlightCreate, FlightResponse, FlightUpdate,
-    PassengerCreate, PassengerResponse, PassengerUpdate,
-    ServiceCreate, ServiceResponse, ServiceUpdate,
-    BookingCreate, BookingResponse,
-    RecommendationResponse
+    FlightCreate, FlightPage, FlightResponse, FlightUpdate,
+    PassengerCreate, PassengerPage, PassengerResponse, PassengerUpdate,
+    ServiceCreate, ServicePage, ServiceResponse, ServiceUpdate,
+    BookingCreate, BookingPage, BookingResponse,
+    RecommendationResponse, TravelEmailRequest, MarketingEmailRequest
 )
 from services.flight_service import FlightService
 from services.passenger_service import PassengerService
@@ -25,6 +28,19 @@ from services.booking_service import BookingService
 from services.recommendation_service import AdvancedRecommendationService
 from services.email_service import EmailService
 from services.data_consistency_service import DataConsistencyService
+from services.interaction_matrix import interaction_matrix
+from services.model_registry import model_registry
+from services.trending import trending_destinations
+from services.cache import recommendation_cache
+from services.similarity import passenger_similarity_engine
+from services.recommendation_store import recommendation_store
+from services.online_clustering import passenger_clusters
+from services.flight_index import bookable_flight_index
+from services.dirty_tracker import dirty_passengers
+from services.pool_monitor import pool_monitor
+from services.event_stream import EVENT_EMOJIS, HIGH_URGENCY_EVENTS, event_broadcaster
+from services.change_feed import DELTA_POLL_INTERVAL, DeltaFilter, change_feed
+from services.pagination import Page, page_payload
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -44,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Servir les fichiers statiques
@@ -60,6 +77,185 @@ recommendation_service = AdvancedRecommendationService()
 email_service = EmailService()
 data_consistency_service = DataConsistencyService()
 
+# Reconstruction périodique de la matrice d'interactions (écritures directes du générateur)
+INTERACTION_MATRIX_REBUILD_INTERVAL = int(os.getenv("INTERACTION_MATRIX_REBUILD_INTERVAL", "900"))
+TRENDING_REFRESH_INTERVAL = int(os.getenv("TRENDING_REFRESH_INTERVAL", "60"))
+RECOMMENDATION_RETENTION_INTERVAL = int(os.getenv("RECOMMENDATION_RETENTION_INTERVAL", "3600"))
+PASSENGER_CLUSTERS_UPDATE_INTERVAL = int(os.getenv("PASSENGER_CLUSTERS_UPDATE_INTERVAL", "10"))
+FLIGHT_INDEX_REFRESH_INTERVAL = int(os.getenv("FLIGHT_INDEX_REFRESH_INTERVAL", "30"))
+DIRTY_REFRESH_INTERVAL = int(os.getenv("DIRTY_REFRESH_INTERVAL", "5"))
+DB_LEAK_CHECK_INTERVAL = int(os.getenv("DB_LEAK_CHECK_INTERVAL", "10"))
+background_tasks: List[asyncio.Task] = []
+
+def _initialize_interaction_matrix():
+    with SessionLocal() as db:
+        interaction_matrix.initialize(db)
+
+def _rebuild_interaction_matrix():
+    with SessionLocal() as db:
+        interaction_matrix.build(db)
+    interaction_matrix.save_snapshot()
+
+async def _maintain_interaction_matrix():
+    """Charger la matrice (snapshot ou base) puis la réconcilier périodiquement"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, _initialize_interaction_matrix)
+    except Exception as e:
+        logger.warning(f"⚠️ Matrice d'interactions non initialisée: {e}")
+    
+    while True:
+        await asyncio.sleep(INTERACTION_MATRIX_REBUILD_INTERVAL)
+        try:
+            await loop.run_in_executor(None, _rebuild_interaction_matrix)
+        except Exception as e:
+            logger.error(f"❌ Erreur reconstruction matrice d'interactions: {e}")
+
+def _rebuild_similarity_engine():
+    with SessionLocal() as db:
+        passenger_similarity_engine.build(db)
+
+async def _maintain_similarity_engine():
+    """Reconstruire périodiquement les vecteurs de similarité (hors des requêtes API)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _rebuild_similarity_engine)
+        except Exception as e:
+            logger.error(f"❌ Erreur construction moteur de similarité: {e}")
+        await asyncio.sleep(max(1, passenger_similarity_engine.max_age - 30))
+
+def _refresh_trending():
+    with SessionLocal() as db:
+        if trending_destinations.is_loaded:
+            trending_destinations.refresh(db)
+        else:
+            trending_destinations.backfill(db)
+
+async def _maintain_trending():
+    """Remplir les compteurs de tendances puis compter les réservations insérées en base"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _refresh_trending)
+        except Exception as e:
+            logger.error(f"❌ Erreur rafraîchissement tendances: {e}")
+        await asyncio.sleep(TRENDING_REFRESH_INTERVAL)
+
+def _refresh_flight_index():
+    with SessionLocal() as db:
+        bookable_flight_index.refresh(db)
+
+async def _maintain_flight_index():
+    """Construire l'index des vols réservables puis appliquer les vols modifiés en base"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _refresh_flight_index)
+        except Exception as e:
+            logger.error(f"❌ Erreur rafraîchissement index des vols: {e}")
+        await asyncio.sleep(FLIGHT_INDEX_REFRESH_INTERVAL)
+
+def _update_passenger_clusters():
+    with SessionLocal() as db:
+        passenger_clusters.update(db)
+
+async def _maintain_passenger_clusters():
+    """Intégrer les passagers nouveaux ou modifiés au clustering (partial_fit par micro-lots)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _update_passenger_clusters)
+        except Exception as e:
+            logger.error(f"❌ Erreur mise à jour clustering passagers: {e}")
+        await asyncio.sleep(PASSENGER_CLUSTERS_UPDATE_INTERVAL)
+
+def _apply_recommendation_retention():
+    with SessionLocal() as db:
+        recommendation_store.apply_retention(db)
+
+async def _maintain_recommendations():
+    """Purger périodiquement les recommandations expirées ou en surnombre"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _apply_recommendation_retention)
+        except Exception as e:
+            logger.error(f"❌ Erreur rétention recommandations: {e}")
+        await asyncio.sleep(RECOMMENDATION_RETENTION_INTERVAL)
+
+def _refresh_dirty_recommendations():
+    with SessionLocal() as db:
+        dirty_passengers.reconcile(db)
+        # Vider l'arriéré présent au début du passage, par lots (une transaction chacun)
+        backlog = len(dirty_passengers)
+        while backlog > 0 and dirty_passengers.refresh_batch(db, recommendation_service.compute_recommendations):
+            backlog -= dirty_passengers.batch_size
+
+async def _maintain_dirty_recommendations():
+    """Recalculer uniquement les passagers dont les entrées ont changé"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, _refresh_dirty_recommendations)
+        except Exception as e:
+            logger.error(f"❌ Erreur rafraîchissement incrémental des recommandations: {e}")
+        await asyncio.sleep(DIRTY_REFRESH_INTERVAL)
+
+async def _maintain_pool_monitor():
+    """Signaler les sessions gardées au-delà du seuil (connexions jamais rendues au pool)"""
+    while True:
+        await asyncio.sleep(DB_LEAK_CHECK_INTERVAL)
+        try:
+            pool_monitor.check_leaks()
+        except Exception as e:
+            logger.error(f"❌ Erreur détection des sessions oubliées: {e}")
+
+async def _maintain_event_listener():
+    """Connexion LISTEN unique du processus, partagée par tous les clients SSE"""
+    await event_broadcaster.run(DATABASE_URL, AsyncSessionLocal)
+
+def _poll_change_feed():
+    with SessionLocal() as db:
+        return change_feed.poll(db)
+
+async def _maintain_change_feed():
+    """Détecter les lignes modifiées et pousser les deltas aux abonnés WebSocket"""
+    loop = asyncio.get_running_loop()
+    while True:
+        # Sans abonné, pas de relecture: le filigrane reprend là où il s'était arrêté
+        if change_feed.has_subscribers:
+            try:
+                change_feed.publish(await loop.run_in_executor(None, _poll_change_feed))
+            except Exception as e:
+                logger.error(f"❌ Erreur flux de modifications: {e}")
+        await asyncio.sleep(DELTA_POLL_INTERVAL)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Charger les structures de recommandation en mémoire au démarrage"""
+    if not model_registry.load():
+        logger.warning("⚠️ Aucun modèle ML publié, lancer train.py")
+    background_tasks.append(asyncio.create_task(_maintain_interaction_matrix()))
+    background_tasks.append(asyncio.create_task(_maintain_trending()))
+    background_tasks.append(asyncio.create_task(_maintain_similarity_engine()))
+    background_tasks.append(asyncio.create_task(_maintain_recommendations()))
+    background_tasks.append(asyncio.create_task(_maintain_passenger_clusters()))
+    background_tasks.append(asyncio.create_task(_maintain_flight_index()))
+    background_tasks.append(asyncio.create_task(_maintain_dirty_recommendations()))
+    background_tasks.append(asyncio.create_task(_maintain_pool_monitor()))
+    background_tasks.append(asyncio.create_task(_maintain_event_listener()))
+    background_tasks.append(asyncio.create_task(_maintain_change_feed()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """Arrêter les tâches de fond et sauvegarder les snapshots"""
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    if interaction_matrix.is_loaded:
+        interaction_matrix.save_snapshot()
+
 @app.get("/")
 async def root():
     """Page d'accueil web moderne"""
@@ -88,6 +284,7 @@ async def root():
                 "services": "/services/",
                 "realtime": "/realtime/dashboard",
                 "recommendations": "/recommendations/passenger/{id}",
+                "trending": "/recommendations/trending",
                 "emails": "/emails/generate-travel-suggestion"
             },
             "dashboard_url": "http://localhost:8501",
@@ -118,6 +315,7 @@ async def api_info():
             "services": "/services/",
             "realtime": "/realtime/dashboard",
             "recommendations": "/recommendations/passenger/{id}",
+            "trending": "/recommendations/trending",
             "emails": "/emails/generate-travel-suggestion"
         },
         "dashboard_url": "http://localhost:8501",
@@ -126,12 +324,11 @@ async def api_info():
     }
 
 @app.get("/health")
-async def health_check():
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """Vérification de santé de l'API avec métriques détaillées"""
     try:
-        # Test de connexion base de données
-        db = next(get_db())
-        test_query = db.execute(text("SELECT COUNT(*) FROM flights")).scalar()
+        # Test de connexion base de données (session fermée par la dépendance)
+        test_query = await db.scalar(text("SELECT COUNT(*) FROM flights"))
         db_status = "🟢 Connectée"
         flight_count = test_query
     except Exception as e:
@@ -155,21 +352,41 @@ async def health_check():
         }
     }
 
+@app.get("/database/pool/stats")
+async def get_database_pool_stats():
+    """Connexions sorties, inactives et en débordement, attente du pool et sessions gardées trop longtemps"""
+    return pool_monitor.stats()
+
+# === PAGINATION DES LISTES ===
+
+def _page_response(response: Response, page: Page, cursor: Optional[str]):
+    """Liste seule pour les appels historiques (curseur suivant en en-tête), enveloppe si `cursor` est passé"""
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.items if cursor is None else page_payload(page)
+
 # === ENDPOINTS VOLS ===
 
-@app.get("/flights/", response_model=List[FlightResponse])
+@app.get("/flights/", response_model=Union[List[FlightResponse], FlightPage])
 async def get_flights(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
     destination: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Récupérer la liste des vols avec filtres optionnels"""
-    return await flight_service.get_flights(db, skip=skip, limit=limit, status=status, destination=destination)
+    """Récupérer la liste des vols avec filtres optionnels (curseur `next_cursor` ou skip/limit)"""
+    try:
+        page = await flight_service.get_flights(db, skip=skip, limit=limit, status=status, destination=destination, cursor=cursor, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page_response(response, page, cursor)
 
 @app.get("/flights/{flight_id}", response_model=FlightResponse)
-async def get_flight(flight_id: int, db: Session = Depends(get_db)):
+async def get_flight(flight_id: int, db: AsyncSession = Depends(get_async_db)):
     """Récupérer un vol par son ID"""
     flight = await flight_service.get_flight(db, flight_id)
     if not flight:
@@ -177,12 +394,12 @@ async def get_flight(flight_id: int, db: Session = Depends(get_db)):
     return flight
 
 @app.post("/flights/", response_model=FlightResponse)
-async def create_flight(flight: FlightCreate, db: Session = Depends(get_db)):
+async def create_flight(flight: FlightCreate, db: AsyncSession = Depends(get_async_db)):
     """Créer un nouveau vol"""
     return await flight_service.create_flight(db, flight)
 
 @app.put("/flights/{flight_id}", response_model=FlightResponse)
-async def update_flight(flight_id: int, flight_update: FlightUpdate, db: Session = Depends(get_db)):
+async def update_flight(flight_id: int, flight_update: FlightUpdate, db: AsyncSession = Depends(get_async_db)):
     """Mettre à jour un vol"""
     flight = await flight_service.update_flight(db, flight_id, flight_update)
     if not flight:
@@ -190,7 +407,7 @@ async def update_flight(flight_id: int, flight_update: FlightUpdate, db: Session
     return flight
 
 @app.delete("/flights/{flight_id}")
-async def delete_flight(flight_id: int, db: Session = Depends(get_db)):
+async def delete_flight(flight_id: int, db: AsyncSession = Depends(get_async_db)):
     """Supprimer un vol"""
     success = await flight_service.delete_flight(db, flight_id)
     if not success:
@@ -198,24 +415,31 @@ async def delete_flight(flight_id: int, db: Session = Depends(get_db)):
     return {"message": "Vol supprimé avec succès"}
 
 @app.get("/flights/stats/dashboard")
-async def get_flight_stats(db: Session = Depends(get_db)):
+async def get_flight_stats(db: AsyncSession = Depends(get_async_db)):
     """Statistiques pour le dashboard"""
     return await flight_service.get_dashboard_stats(db)
 
 # === ENDPOINTS PASSAGERS ===
 
-@app.get("/passengers/", response_model=List[PassengerResponse])
+@app.get("/passengers/", response_model=Union[List[PassengerResponse], PassengerPage])
 async def get_passengers(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     nationality: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Récupérer la liste des passagers"""
-    return await passenger_service.get_passengers(db, skip=skip, limit=limit, nationality=nationality)
+    """Récupérer la liste des passagers (curseur `next_cursor` ou skip/limit)"""
+    try:
+        page = await passenger_service.get_passengers(db, skip=skip, limit=limit, nationality=nationality, cursor=cursor, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page_response(response, page, cursor)
 
 @app.get("/passengers/{passenger_id}", response_model=PassengerResponse)
-async def get_passenger(passenger_id: int, db: Session = Depends(get_db)):
+async def get_passenger(passenger_id: int, db: AsyncSession = Depends(get_async_db)):
     """Récupérer un passager par son ID"""
     passenger = await passenger_service.get_passenger(db, passenger_id)
     if not passenger:
@@ -223,12 +447,15 @@ async def get_passenger(passenger_id: int, db: Session = Depends(get_db)):
     return passenger
 
 @app.post("/passengers/", response_model=PassengerResponse)
-async def create_passenger(passenger: PassengerCreate, db: Session = Depends(get_db)):
+async def create_passenger(passenger: PassengerCreate, db: AsyncSession = Depends(get_async_db)):
     """Créer un nouveau passager"""
-    return await passenger_service.create_passenger(db, passenger)
+    try:
+        return await passenger_service.create_passenger(db, passenger)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.put("/passengers/{passenger_id}", response_model=PassengerResponse)
-async def update_passenger(passenger_id: int, passenger_update: PassengerUpdate, db: Session = Depends(get_db)):
+async def update_passenger(passenger_id: int, passenger_update: PassengerUpdate, db: AsyncSession = Depends(get_async_db)):
     """Mettre à jour un passager"""
     passenger = await passenger_service.update_passenger(db, passenger_id, passenger_update)
     if not passenger:
@@ -236,7 +463,7 @@ async def update_passenger(passenger_id: int, passenger_update: PassengerUpdate,
     return passenger
 
 @app.delete("/passengers/{passenger_id}")
-async def delete_passenger(passenger_id: int, db: Session = Depends(get_db)):
+async def delete_passenger(passenger_id: int, db: AsyncSession = Depends(get_async_db)):
     """Supprimer un passager"""
     success = await passenger_service.delete_passenger(db, passenger_id)
     if not success:
@@ -245,19 +472,26 @@ async def delete_passenger(passenger_id: int, db: Session = Depends(get_db)):
 
 # === ENDPOINTS SERVICES ===
 
-@app.get("/services/", response_model=List[ServiceResponse])
+@app.get("/services/", response_model=Union[List[ServiceResponse], ServicePage])
 async def get_services(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     service_type: Optional[str] = None,
     terminal: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Récupérer la liste des services"""
-    return await service_service.get_services(db, skip=skip, limit=limit, service_type=service_type, terminal=terminal)
+    """Récupérer la liste des services (curseur `next_cursor` ou skip/limit)"""
+    try:
+        page = await service_service.get_services(db, skip=skip, limit=limit, service_type=service_type, terminal=terminal, cursor=cursor, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page_response(response, page, cursor)
 
 @app.get("/services/{service_id}", response_model=ServiceResponse)
-async def get_service(service_id: int, db: Session = Depends(get_db)):
+async def get_service(service_id: int, db: AsyncSession = Depends(get_async_db)):
     """Récupérer un service par son ID"""
     service = await service_service.get_service(db, service_id)
     if not service:
@@ -265,12 +499,12 @@ async def get_service(service_id: int, db: Session = Depends(get_db)):
     return service
 
 @app.post("/services/", response_model=ServiceResponse)
-async def create_service(service: ServiceCreate, db: Session = Depends(get_db)):
+async def create_service(service: ServiceCreate, db: AsyncSession = Depends(get_async_db)):
     """Créer un nouveau service"""
     return await service_service.create_service(db, service)
 
 @app.put("/services/{service_id}", response_model=ServiceResponse)
-async def update_service(service_id: int, service_update: ServiceUpdate, db: Session = Depends(get_db)):
+async def update_service(service_id: int, service_update: ServiceUpdate, db: AsyncSession = Depends(get_async_db)):
     """Mettre à jour un service"""
     service = await service_service.update_service(db, service_id, service_update)
     if not service:
@@ -278,7 +512,7 @@ async def update_service(service_id: int, service_update: ServiceUpdate, db: Ses
     return service
 
 @app.delete("/services/{service_id}")
-async def delete_service(service_id: int, db: Session = Depends(get_db)):
+async def delete_service(service_id: int, db: AsyncSession = Depends(get_async_db)):
     """Supprimer un service"""
     success = await service_service.delete_service(db, service_id)
     if not success:
@@ -287,19 +521,26 @@ async def delete_service(service_id: int, db: Session = Depends(get_db)):
 
 # === ENDPOINTS RÉSERVATIONS ===
 
-@app.get("/bookings/", response_model=List[BookingResponse])
+@app.get("/bookings/", response_model=Union[List[BookingResponse], BookingPage])
 async def get_bookings(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     passenger_id: Optional[int] = None,
     flight_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Récupérer la liste des réservations"""
-    return await booking_service.get_bookings(db, skip=skip, limit=limit, passenger_id=passenger_id, flight_id=flight_id)
+    """Récupérer la liste des réservations (curseur `next_cursor` ou skip/limit)"""
+    try:
+        page = await booking_service.get_bookings(db, skip=skip, limit=limit, passenger_id=passenger_id, flight_id=flight_id, cursor=cursor, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page_response(response, page, cursor)
 
 @app.get("/bookings/{booking_id}", response_model=BookingResponse)
-async def get_booking(booking_id: int, db: Session = Depends(get_db)):
+async def get_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
     """Récupérer une réservation par son ID"""
     booking = await booking_service.get_booking(db, booking_id)
     if not booking:
@@ -307,12 +548,15 @@ async def get_booking(booking_id: int, db: Session = Depends(get_db)):
     return booking
 
 @app.post("/bookings/", response_model=BookingResponse)
-async def create_booking(booking: BookingCreate, db: Session = Depends(get_db)):
+async def create_booking(booking: BookingCreate, db: AsyncSession = Depends(get_async_db)):
     """Créer une nouvelle réservation"""
-    return await booking_service.create_booking(db, booking)
+    try:
+        return await booking_service.create_booking(db, booking)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/bookings/{booking_id}")
-async def delete_booking(booking_id: int, db: Session = Depends(get_db)):
+async def delete_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
     """Supprimer une réservation"""
     success = await booking_service.delete_booking(db, booking_id)
     if not success:
@@ -321,61 +565,113 @@ async def delete_booking(booking_id: int, db: Session = Depends(get_db)):
 
 # === ENDPOINTS RECOMMANDATIONS ===
 
+# Le pipeline de recommandation reste sur la session synchrone (étapes en threads,
+# NumPy/SciPy) : il s'exécute hors de la boucle d'événements pour ne pas la bloquer
+async def _off_loop(coroutine):
+    return await run_in_threadpool(asyncio.run, coroutine)
+
 @app.get("/recommendations/passenger/{passenger_id}", response_model=List[RecommendationResponse])
-async def get_recommendations_for_passenger(passenger_id: int, db: Session = Depends(get_db)):
-    """Obtenir des recommandations pour un passager"""
-    recommendations = await recommendation_service.get_recommendations_for_passenger(db, passenger_id)
+async def get_recommendations_for_passenger(
+    passenger_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Obtenir les meilleures recommandations d'un passager (précalculées par le batch)"""
+    recommendations = await _off_loop(recommendation_service.get_recommendations_for_passenger(db, passenger_id, limit))
     return recommendations
 
+@app.get("/recommendations/cache/stats")
+async def get_recommendation_cache_stats():
+    """Compteurs du cache de recommandations (hits, misses, évictions)"""
+    return recommendation_cache.stats()
+
+@app.get("/recommendations/clusters/stats")
+async def get_passenger_cluster_stats():
+    """État du clustering incrémental (tailles des clusters, dérive, réajustements)"""
+    return passenger_clusters.stats()
+
+@app.get("/recommendations/refresh/stats")
+async def get_recommendation_refresh_stats():
+    """Arriéré des passagers à recalculer (rafraîchissement incrémental)"""
+    return dirty_passengers.stats()
+
+@app.get("/recommendations/models/stats")
+async def get_model_registry_stats():
+    """Version des modèles servie, tableaux projetés en mémoire et RSS de ce worker"""
+    return model_registry.stats()
+
+@app.get("/recommendations/trending")
+async def get_trending_destinations(
+    hours: int = Query(24, ge=1, le=720),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Destinations les plus réservées sur les dernières heures"""
+    if not trending_destinations.is_loaded:
+        await run_in_threadpool(trending_destinations.backfill, db)
+    return {
+        "window_hours": hours,
+        "destinations": trending_destinations.top(window_hours=hours, limit=limit),
+        "timestamp": datetime.now()
+    }
+
 @app.post("/recommendations/generate/{passenger_id}")
 async def generate_recommendations(passenger_id: int, db: Session = Depends(get_db)):
     """Générer de nouvelles recommandations pour un passager"""
-    recommendations = await recommendation_service.generate_recommendations(db, passenger_id)
+    recommendations = await _off_loop(recommendation_service.generate_recommendations(db, passenger_id))
     return {"message": f"{len(recommendations)} recommandations générées", "recommendations": recommendations}
 
 @app.get("/recommendations/similar-passengers/{passenger_id}")
-async def get_similar_passengers(passenger_id: int, db: Session = Depends(get_db)):
-    """Trouver des passagers similaires"""
-    similar_passengers = await recommendation_service.find_similar_passengers(db, passenger_id)
+async def get_similar_passengers(
+    passenger_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    min_score: float = Query(0.3, ge=0.0, le=1.0),
+    method: str = Query("auto", pattern="^(auto|exact|minhash)$"),
+    db: Session = Depends(get_db)
+):
+    """Trouver des passagers similaires (paginé, score > min_score)"""
+    similar_passengers = await _off_loop(recommendation_service.find_similar_passengers(
+        db, passenger_id, limit=limit, skip=skip, min_score=min_score, method=method
+    ))
     return similar_passengers
 
 # === ENDPOINTS EMAIL ===
 
 @app.post("/emails/generate-travel-suggestion")
-async def generate_travel_email(
-    passenger_id: int,
-    flight_id: int,
-    email_type: str = "travel_suggestion",
-    db: Session = Depends(get_db)
-):
+async def generate_travel_email(request: TravelEmailRequest, db: AsyncSession = Depends(get_async_db)):
     """Générer un email de suggestion de voyage personnalisé"""
-    email_content = await email_service.generate_travel_email(db, passenger_id, flight_id, email_type)
+    try:
+        email_content = await email_service.generate_travel_email(
+            db, request.passenger_id, request.flight_id, request.email_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     return {"email_content": email_content}
 
 @app.post("/emails/generate-marketing")
-async def generate_marketing_email(
-    passenger_id: int,
-    campaign_type: str = "destination_promotion",
-    db: Session = Depends(get_db)
-):
+async def generate_marketing_email(request: MarketingEmailRequest, db: AsyncSession = Depends(get_async_db)):
     """Générer un email marketing personnalisé"""
-    email_content = await email_service.generate_marketing_email(db, passenger_id, campaign_type)
+    try:
+        email_content = await email_service.generate_marketing_email(db, request.passenger_id, request.campaign_type)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     return {"email_content": email_content}
 
 # === ENDPOINTS TEMPS RÉEL OPTIMISÉS ===
 
 @app.get("/realtime/flights")
-async def get_realtime_flights(db: Session = Depends(get_db)):
+async def get_realtime_flights(db: AsyncSession = Depends(get_async_db)):
     """Données temps réel des vols avec optimisations PostgreSQL"""
     return await flight_service.get_realtime_data(db)
 
 @app.get("/realtime/services")
-async def get_realtime_services(db: Session = Depends(get_db)):
+async def get_realtime_services(db: AsyncSession = Depends(get_async_db)):
     """Données temps réel des services avec optimisations"""
     return await service_service.get_realtime_data(db)
 
 @app.get("/realtime/dashboard")
-async def get_realtime_dashboard(db: Session = Depends(get_db)):
+async def get_realtime_dashboard(db: AsyncSession = Depends(get_async_db)):
     """Données temps réel pour le dashboard avec requêtes optimisées"""
     return {
         "flights": await flight_service.get_realtime_data(db),
@@ -384,7 +680,7 @@ async def get_realtime_dashboard(db: Session = Depends(get_db)):
     }
 
 @app.get("/realtime/metrics/live")
-async def get_live_metrics(db: Session = Depends(get_db)):
+async def get_live_metrics(db: AsyncSession = Depends(get_async_db)):
     """Métriques ultra-rapides pour effet temps réel impressionnant"""
     try:
         # Requête optimisée PostgreSQL pour métriques instantanées
@@ -423,7 +719,7 @@ async def get_live_metrics(db: Session = Depends(get_db)):
             FROM flight_stats f, service_stats s, recent_events e
         """)
         
-        result = db.execute(metrics_query).fetchone()
+        result = (await db.execute(metrics_query)).fetchone()
         
         if result:
             return {
@@ -459,7 +755,7 @@ async def get_live_metrics(db: Session = Depends(get_db)):
         return {"error": str(e), "timestamp": datetime.now()}
 
 @app.get("/realtime/events/stream")
-async def get_event_stream(limit: int = 10, db: Session = Depends(get_db)):
+async def get_event_stream(limit: int = 10, db: AsyncSession = Depends(get_async_db)):
     """Stream des événements récents avec optimisation"""
     try:
         # Requête optimisée pour les événements récents
@@ -479,22 +775,14 @@ async def get_event_stream(limit: int = 10, db: Session = Depends(get_db)):
             LIMIT :limit
         """)
         
-        results = db.execute(events_query, {"limit": limit}).fetchall()
+        results = (await db.execute(events_query, {"limit": limit})).fetchall()
         
         events = []
         for row in results:
             event_id, event_type, description, timestamp, flight_number, destination, seconds_ago = row
             
             # Formatage avancé des événements
-            event_emoji = {
-                "BOARDING_STARTED": "🛫",
-                "GATE_CHANGE": "🚪", 
-                "FLIGHT_DELAYED": "⏰",
-                "WEATHER_DELAY": "🌧️",
-                "TECHNICAL_ISSUE": "🔧",
-                "SECURITY_ALERT": "🚨",
-                "FLIGHT_DEPARTED": "🚀"
-            }.get(event_type, "📢")
+            event_emoji = EVENT_EMOJIS.get(event_type, "📢")
             
             time_ago = f"{int(seconds_ago)}s" if seconds_ago < 60 else f"{int(seconds_ago/60)}m"
             
@@ -507,22 +795,95 @@ async def get_event_stream(limit: int = 10, db: Session = Depends(get_db)):
                 "destination": destination,
                 "timestamp": timestamp,
                 "time_ago": time_ago,
-                "urgency": "high" if event_type in ["SECURITY_ALERT", "TECHNICAL_ISSUE"] else "normal"
+                "urgency": "high" if event_type in HIGH_URGENCY_EVENTS else "normal"
             })
         
         return {
             "events": events,
             "total_count": len(events),
             "last_updated": datetime.now(),
-            "refresh_interval": 3  # Secondes recommandées pour refresh
+            "refresh_interval": 3,  # Secondes recommandées pour refresh
+            "stream_url": "/realtime/events/sse"  # Flux poussé, sans polling
         }
         
     except Exception as e:
         logger.error(f"❌ Erreur stream événements: {e}")
         return {"error": str(e), "events": []}
 
+@app.get("/realtime/events/sse")
+async def stream_events(
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Flux Server-Sent Events des événements (rattrapage via l'en-tête Last-Event-ID)"""
+    try:
+        since = int(last_event_id) if last_event_id else None
+    except ValueError:
+        since = None
+    return StreamingResponse(
+        event_broadcaster.stream(db, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/realtime/events/sse/stats")
+async def get_event_stream_stats():
+    """Écoute LISTEN/NOTIFY, abonnés SSE connectés et tampon de rattrapage"""
+    return event_broadcaster.stats()
+
+@app.websocket("/ws/deltas")
+async def subscribe_deltas(websocket: WebSocket):
+    """Abonnement filtré aux modifications des vols et services (instantané puis deltas par ligne)
+
+    Le client envoie {"action": "subscribe", "filters": {"tables": [...], "terminal": [...],
+    "status": [...], "flight_ids": [...], "service_type": [...]}} ; il peut le renvoyer pour
+    changer de filtres.
+    """
+    await websocket.accept()
+    queue = change_feed.new_queue()
+
+    async def receive_subscriptions():
+        while True:
+            message = await websocket.receive_json()
+            if message.get("action") != "subscribe":
+                await websocket.send_json({"type": "error", "detail": "action attendue: subscribe"})
+                continue
+            try:
+                delta_filter = DeltaFilter.from_message(message.get("filters") or {})
+            except (TypeError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if not change_feed.loaded:
+                change_feed.publish(await run_in_threadpool(_poll_change_feed))
+            change_feed.subscribe(queue, delta_filter)
+
+    async def send_changes():
+        while True:
+            message = await queue.get()
+            if message["type"] == "resync":
+                message = change_feed.snapshot(change_feed.filter_of(queue))
+            await websocket.send_json(message)
+
+    tasks = [asyncio.create_task(receive_subscriptions()), asyncio.create_task(send_changes())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    except Exception as e:
+        logger.error(f"❌ Erreur abonnement WebSocket: {e}")
+    finally:
+        change_feed.unsubscribe(queue)
+        for task in tasks:
+            task.cancel()
+
+@app.get("/realtime/deltas/stats")
+async def get_change_feed_stats():
+    """Abonnés WebSocket, lignes suivies, filigranes et volume de deltas diffusés"""
+    return change_feed.stats()
+
 @app.get("/realtime/capacity/heatmap")
-async def get_capacity_heatmap(db: Session = Depends(get_db)):
+async def get_capacity_heatmap(db: AsyncSession = Depends(get_async_db)):
     """Heatmap des capacités pour visualisation temps réel"""
     try:
         # Requête pour heatmap des terminaux
@@ -564,7 +925,7 @@ async def get_capacity_heatmap(db: Session = Depends(get_db)):
             ORDER BY t.terminal
         """)
         
-        results = db.execute(heatmap_query).fetchall()
+        results = (await db.execute(heatmap_query)).fetchall()
         
         terminals = []
         for row in results:
@@ -612,7 +973,7 @@ async def get_capacity_heatmap(db: Session = Depends(get_db)):
 # === ENDPOINTS CONSOLIDÉS ===
 
 @app.get("/api/consolidated/dashboard")
-async def get_consolidated_dashboard_data(db: Session = Depends(get_db)):
+def get_consolidated_dashboard_data(db: Session = Depends(get_db)):
     """Endpoint consolidé avec données cohérentes pour le dashboard"""
     try:
         consolidated_data = DataConsistencyService.get_consolidated_dashboard_data(db)
@@ -622,22 +983,22 @@ async def get_consolidated_dashboard_data(db: Session = Depends(get_db)):
         return {"error": str(e), "timestamp": datetime.now()}
 
 @app.get("/api/flights/normalized")
-async def get_normalized_flights(db: Session = Depends(get_db)):
+def get_normalized_flights(db: Session = Depends(get_db)):
     """Obtenir les vols avec structure normalisée"""
     return DataConsistencyService.normalize_flight_data(db)
 
 @app.get("/api/passengers/normalized")
-async def get_normalized_passengers(limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+def get_normalized_passengers(limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
     """Obtenir les passagers avec structure normalisée"""
     return DataConsistencyService.normalize_passenger_data(db, limit)
 
 @app.get("/api/services/normalized")
-async def get_normalized_services(db: Session = Depends(get_db)):
+def get_normalized_services(db: Session = Depends(get_db)):
     """Obtenir les services avec structure normalisée"""
     return DataConsistencyService.normalize_service_data(db)
 
 @app.get("/api/events/normalized")
-async def get_normalized_events(limit: int = Query(50, ge=1, le=200), db: Session = Depends(get_db)):
+def get_normalized_events(limit: int = Query(50, ge=1, le=200), db: Session = Depends(get_db)):
     """Obtenir les événements avec structure normalisée"""
     return DataConsistencyService.normalize_event_data(db, limit)
 
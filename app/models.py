@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ARRAY, ForeignKey, TIMESTAMP, JSON, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ARRAY, ForeignKey, TIMESTAMP, JSON, Numeric, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -39,7 +39,7 @@ class Passenger(Base):
     nationality = Column(String(50), index=True)
     date_of_birth = Column(DateTime)
     frequent_flyer_id = Column(String(20))
-    preferred_destinations = Column(ARRAY(String))
+    preferred_destinations = Column(ARRAY(String).with_variant(JSON, "sqlite"))
     travel_class_preference = Column(String(20), default="ECONOMY")
     total_flights = Column(Integer, default=0)
     created_at = Column(TIMESTAMP, server_default=func.now())
@@ -65,6 +65,7 @@ class Service(Base):
     rating = Column(Numeric(3, 2), default=0.0)
     price_range = Column(String(20))
     created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -98,6 +99,15 @@ class Recommendation(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     is_sent = Column(Boolean, default=False)
     
+    # Lecture top-K par passager sans tri ; une seule ligne par (passager, vol, type) pour l'upsert
+    __table_args__ = (
+        Index("idx_recommendations_passenger_score", passenger_id, score.desc()),
+        UniqueConstraint(
+            "passenger_id", "flight_id", "recommendation_type",
+            name="uq_recommendations_passenger_flight_type"
+        ),
+    )
+    
     # Relations
     passenger = relationship("Passenger", back_populates="recommendations")
     flight = relationship("Flight", back_populates="recommendations")
@@ -144,6 +144,24 @@ class BookingResponse(BookingBase):
     class Config:
         from_attributes = True
 
+# === SCHÉMAS PAGINATION (réponse avec `cursor`) ===
+
+class FlightPage(BaseModel):
+    items: List[FlightResponse]
+    next_cursor: Optional[str] = None
+
+class PassengerPage(BaseModel):
+    items: List[PassengerResponse]
+    next_cursor: Optional[str] = None
+
+class ServicePage(BaseModel):
+    items: List[ServiceResponse]
+    next_cursor: Optional[str] = None
+
+class BookingPage(BaseModel):
+    items: List[BookingResponse]
+    next_cursor: Optional[str] = None
+
 # === SCHÉMAS RECOMMANDATIONS ===
 
 class RecommendationResponse(BaseModel):
@@ -192,6 +210,15 @@ class EmailContent(BaseModel):
     recipient_email: str
     recipient_name: str
 
+class TravelEmailRequest(BaseModel):
+    passenger_id: int
+    flight_id: int
+    email_type: str = "travel_suggestion"
+
+class MarketingEmailRequest(BaseModel):
+    passenger_id: int
+    campaign_type: str = "destination_promotion"
+
 class EmailTemplate(BaseModel):
     template_type: str
     passenger_data: dict
@@ -0,0 +1,113 @@
+"""
+Chargement par lot des entités du pipeline de recommandation (façon DataLoader).
+
+Les identifiants demandés pendant un même tour de boucle asyncio sont
+regroupés en une seule requête `IN (...)`, et chaque entité chargée est
+mémorisée pour toute la durée d'un calcul de recommandations.
+"""
+from sqlalchemy.orm import Session
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import asyncio
+import logging
+
+from models import Flight, Passenger
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """Identity map + regroupement des chargements par clé primaire"""
+
+    def __init__(self, db: Session, model: Any):
+        self.db = db
+        self.model = model
+        self._cache: Dict[int, Optional[Any]] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._scheduled = False
+        self.queries = 0
+
+    def prime(self, entity: Any) -> Any:
+        """Enregistrer une entité déjà chargée par une autre requête"""
+        if entity is not None:
+            self._cache.setdefault(entity.id, entity)
+        return entity
+
+    def prime_many(self, entities: Iterable[Any]) -> List[Any]:
+        return [self.prime(entity) for entity in entities]
+
+    async def load(self, entity_id: int) -> Optional[Any]:
+        if entity_id in self._cache:
+            return self._cache[entity_id]
+
+        future = self._pending.get(entity_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[entity_id] = future
+            if not self._scheduled:
+                # Requête groupée au prochain tour de boucle
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+        return await future
+
+    async def load_many(self, entity_ids: Iterable[int]) -> List[Optional[Any]]:
+        return list(await asyncio.gather(*(self.load(entity_id) for entity_id in entity_ids)))
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        if not pending:
+            return
+
+        try:
+            rows = self.db.query(self.model).filter(self.model.id.in_(list(pending))).all()
+            self.queries += 1
+        except Exception as e:
+            logger.error(f"❌ Erreur chargement groupé {self.model.__tablename__}: {e}")
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {row.id: row for row in rows}
+        for entity_id, future in pending.items():
+            entity = found.get(entity_id)
+            self._cache[entity_id] = entity
+            if not future.done():
+                future.set_result(entity)
+
+
+class PipelineLoaders:
+    """Chargeurs partagés par toutes les étapes d'un calcul de recommandations"""
+
+    def __init__(self, db: Session):
+        self.flights = BatchLoader(db, Flight)
+        self.passengers = BatchLoader(db, Passenger)
+
+    @property
+    def queries(self) -> int:
+        return self.flights.queries + self.passengers.queries
+
+
+_current_loaders: ContextVar[Optional[PipelineLoaders]] = ContextVar("pipeline_loaders", default=None)
+
+
+@contextmanager
+def pipeline_loaders(db: Session) -> Iterator[PipelineLoaders]:
+    """Ouvrir une portée de chargeurs pour un calcul de recommandations"""
+    loaders = PipelineLoaders(db)
+    token = _current_loaders.set(loaders)
+    try:
+        yield loaders
+    finally:
+        _current_loaders.reset(token)
+
+
+def get_loaders(db: Session) -> PipelineLoaders:
+    """Chargeurs de la portée courante (ou éphémères hors pipeline)"""
+    loaders = _current_loaders.get()
+    if loaders is None or loaders.flights.db is not db:
+        return PipelineLoaders(db)
+    return loaders
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import List, Optional
 import logging
 import random
@@ -6,6 +7,13 @@ import string
 
 from models import Booking, Flight, Passenger
 from schemas import BookingCreate
+from services.pagination import Page, paginate
+from services.interaction_matrix import interaction_matrix
+from services.trending import trending_destinations
+from services.cache import recommendation_cache
+from services.flight_index import bookable_flight_index
+from services.dirty_tracker import REASON_BOOKING, dirty_passengers
+from services.similarity import passenger_similarity_engine
 
 logger = logging.getLogger(__name__)
 
@@ -13,34 +21,36 @@ class BookingService:
     
     async def get_bookings(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
         passenger_id: Optional[int] = None,
-        flight_id: Optional[int] = None
-    ) -> List[Booking]:
-        """Récupérer les réservations avec filtres optionnels"""
-        query = db.query(Booking)
+        flight_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort: str = "id"
+    ) -> Page:
+        """Récupérer les réservations avec filtres optionnels (page par curseur ou skip historique)"""
+        query = select(Booking)
         
         if passenger_id:
-            query = query.filter(Booking.passenger_id == passenger_id)
+            query = query.where(Booking.passenger_id == passenger_id)
         if flight_id:
-            query = query.filter(Booking.flight_id == flight_id)
+            query = query.where(Booking.flight_id == flight_id)
             
-        return query.offset(skip).limit(limit).all()
+        return await paginate(db, query, Booking, limit, sort=sort, cursor=cursor, skip=skip)
     
-    async def get_booking(self, db: Session, booking_id: int) -> Optional[Booking]:
+    async def get_booking(self, db: AsyncSession, booking_id: int) -> Optional[Booking]:
         """Récupérer une réservation par ID"""
-        return db.query(Booking).filter(Booking.id == booking_id).first()
+        return await db.get(Booking, booking_id)
     
-    async def get_booking_by_reference(self, db: Session, booking_reference: str) -> Optional[Booking]:
+    async def get_booking_by_reference(self, db: AsyncSession, booking_reference: str) -> Optional[Booking]:
         """Récupérer une réservation par référence"""
-        return db.query(Booking).filter(Booking.booking_reference == booking_reference).first()
+        return await db.scalar(select(Booking).where(Booking.booking_reference == booking_reference).limit(1))
     
-    async def create_booking(self, db: Session, booking_data: BookingCreate) -> Booking:
+    async def create_booking(self, db: AsyncSession, booking_data: BookingCreate) -> Booking:
         """Créer une nouvelle réservation"""
         # Vérifier que le vol existe et a de la place
-        flight = db.query(Flight).filter(Flight.id == booking_data.flight_id).first()
+        flight = await db.get(Flight, booking_data.flight_id)
         if not flight:
             raise ValueError("Vol non trouvé")
             
@@ -48,7 +58,7 @@ class BookingService:
             raise ValueError("Vol complet")
             
         # Vérifier que le passager existe
-        passenger = db.query(Passenger).filter(Passenger.id == booking_data.passenger_id).first()
+        passenger = await db.get(Passenger, booking_data.passenger_id)
         if not passenger:
             raise ValueError("Passager non trouvé")
         
@@ -60,7 +70,7 @@ class BookingService:
         
         # Créer la réservation
         db_booking = Booking(
-            **booking_data.dict(),
+            **booking_data.dict(exclude={"seat_number"}),
             booking_reference=booking_reference,
             seat_number=seat_number
         )
@@ -69,35 +79,69 @@ class BookingService:
         # Mettre à jour le nombre de sièges occupés
         flight.occupied_seats += 1
         
-        db.commit()
-        db.refresh(db_booking)
+        # Identifiant connu des tendances avant le commit: la réconciliation ne la comptera pas en double
+        await db.flush()
+        trending_destinations.reserve_booking(db_booking.id)
+        await db.commit()
+        await db.refresh(db_booking)
+        bookable_flight_index.upsert_flight(flight)
+        passenger_similarity_engine.add_visit(passenger, flight.destination)
         
         # Mettre à jour le nombre total de vols du passager
         from services.passenger_service import PassengerService
         passenger_service = PassengerService()
         await passenger_service.update_flight_count(db, booking_data.passenger_id)
+        recommendation_cache.invalidate_group(booking_data.passenger_id)
+        dirty_passengers.mark(booking_data.passenger_id, REASON_BOOKING)
+        if flight.occupied_seats >= flight.capacity:
+            await db.run_sync(dirty_passengers.mark_flight, flight.id)
+        
+        # Réservation sur un vol déjà parti: mettre à jour la matrice d'interactions
+        if flight.status == "DEPARTED":
+            interaction_matrix.record_booking(booking_data.passenger_id, flight.destination)
+        
+        trending_destinations.record_booking(
+            flight.destination, db_booking.booking_date, flight.departure_time, booking_id=db_booking.id
+        )
         
         logger.info(f"Réservation créée: {booking_reference}")
         return db_booking
     
-    async def delete_booking(self, db: Session, booking_id: int) -> bool:
+    async def delete_booking(self, db: AsyncSession, booking_id: int) -> bool:
         """Supprimer une réservation"""
         db_booking = await self.get_booking(db, booking_id)
         if not db_booking:
             return False
         
         # Libérer le siège dans le vol
-        flight = db.query(Flight).filter(Flight.id == db_booking.flight_id).first()
+        flight = await db.get(Flight, db_booking.flight_id)
         if flight and flight.occupied_seats > 0:
             flight.occupied_seats -= 1
             
-        db.delete(db_booking)
-        db.commit()
+        passenger_id = db_booking.passenger_id
+        booking_date = db_booking.booking_date
+        await db.delete(db_booking)
+        await db.commit()
+        if flight:
+            bookable_flight_index.upsert_flight(flight)
+        
+        # Recompter les vols du passager (met aussi à jour son updated_at pour les rafraîchissements incrémentaux)
+        from services.passenger_service import PassengerService
+        passenger_service = PassengerService()
+        await passenger_service.update_flight_count(db, passenger_id)
+        recommendation_cache.invalidate_group(passenger_id)
+        dirty_passengers.mark(passenger_id, REASON_BOOKING)
+        
+        if flight and flight.status == "DEPARTED":
+            interaction_matrix.record_booking(passenger_id, flight.destination, delta=-1)
+        
+        if flight:
+            trending_destinations.record_booking(flight.destination, booking_date, flight.departure_time, delta=-1)
         
         logger.info(f"Réservation supprimée: {db_booking.booking_reference}")
         return True
     
-    async def check_in_passenger(self, db: Session, booking_id: int) -> Optional[Booking]:
+    async def check_in_passenger(self, db: AsyncSession, booking_id: int) -> Optional[Booking]:
         """Enregistrer un passager"""
         booking = await self.get_booking(db, booking_id)
         if not booking:
@@ -107,21 +151,21 @@ class BookingService:
         booking.check_in_time = datetime.now()
         booking.status = "CHECKED_IN"
         
-        db.commit()
-        db.refresh(booking)
+        await db.commit()
+        await db.refresh(booking)
         
         logger.info(f"Passager enregistré: {booking.booking_reference}")
         return booking
     
-    async def get_passenger_bookings(self, db: Session, passenger_id: int) -> List[Booking]:
+    async def get_passenger_bookings(self, db: AsyncSession, passenger_id: int) -> List[Booking]:
         """Récupérer toutes les réservations d'un passager"""
-        return db.query(Booking).filter(Booking.passenger_id == passenger_id).all()
+        return list(await db.scalars(select(Booking).where(Booking.passenger_id == passenger_id)))
     
-    async def get_flight_bookings(self, db: Session, flight_id: int) -> List[Booking]:
+    async def get_flight_bookings(self, db: AsyncSession, flight_id: int) -> List[Booking]:
         """Récupérer toutes les réservations d'un vol"""
-        return db.query(Booking).filter(Booking.flight_id == flight_id).all()
+        return list(await db.scalars(select(Booking).where(Booking.flight_id == flight_id)))
     
-    async def _generate_booking_reference(self, db: Session) -> str:
+    async def _generate_booking_reference(self, db: AsyncSession) -> str:
         """Générer une référence de réservation unique"""
         while True:
             reference = 'CDG' + ''.join(random.choices(string.digits, k=6))
@@ -129,14 +173,15 @@ class BookingService:
             if not existing:
                 return reference
     
-    async def _assign_seat(self, db: Session, flight: Flight, travel_class: str) -> str:
+    async def _assign_seat(self, db: AsyncSession, flight: Flight, travel_class: str) -> str:
         """Assigner automatiquement un siège"""
         # Récupérer les sièges déjà pris pour ce vol
-        taken_seats = db.query(Booking.seat_number).filter(
-            Booking.flight_id == flight.id,
-            Booking.seat_number.isnot(None)
-        ).all()
-        taken_seats = {seat[0] for seat in taken_seats}
+        taken_seats = set(await db.scalars(
+            select(Booking.seat_number).where(
+                Booking.flight_id == flight.id,
+                Booking.seat_number.isnot(None)
+            )
+        ))
         
         # Générer les sièges selon la classe
         if travel_class == "BUSINESS":
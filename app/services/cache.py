@@ -0,0 +1,117 @@
+"""
+Cache LRU borné avec expiration par entrée.
+
+Les valeurs sont stockées telles quelles : les appelants y placent des DTO
+détachés de la session SQLAlchemy. Chaque entrée peut être rattachée à un
+groupe (ex: un passager) pour être invalidée d'un coup lors d'une écriture.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Cache LRU à taille bornée et TTL, avec compteurs pour le monitoring"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # clé -> (expiration, groupe, valeur), ordre = récence d'utilisation
+        self._entries: "OrderedDict[Hashable, Tuple[float, Optional[Hashable], Any]]" = OrderedDict()
+        self._groups: Dict[Hashable, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, group, value)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_group(self, group: Hashable) -> int:
+        """Supprimer toutes les entrées d'un groupe"""
+        with self._lock:
+            keys = list(self._groups.get(group, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        _, group, _ = self._entries.pop(key)
+        if group is not None:
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
+
+
+# Cache des recommandations servies, partagé par les services (invalidation sur écriture)
+recommendation_cache = LRUCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "30"))
+)
@@ -0,0 +1,301 @@
+"""
+Flux de modifications des vols et services pour les abonnements WebSocket.
+
+Une seule tâche de fond par processus relit, à chaque tick, les lignes dont
+`updated_at` a dépassé le filigrane (moins une marge pour les transactions
+commitées en retard) et les compare à un instantané en mémoire : seules les
+lignes réellement modifiées produisent un delta, avec les champs changés.
+Les suppressions sont trouvées par un balayage périodique des identifiants.
+Chaque abonné a ses filtres (terminal, statut, vols, type de service) :
+il reçoit un instantané filtré à l'abonnement, puis uniquement les deltas
+qui le concernent. Une ligne qui entre dans ses filtres arrive en
+`insert`, une ligne qui en sort en `delete`. La charge base dépend du
+nombre de modifications, pas du nombre de clients ni de la taille des
+tables.
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from models import Flight, Service
+
+logger = logging.getLogger(__name__)
+
+DELTA_POLL_INTERVAL = float(os.getenv("DELTA_POLL_INTERVAL", "1"))
+DELTA_WATERMARK_LAG = float(os.getenv("DELTA_WATERMARK_LAG", "5"))
+DELTA_DELETE_SWEEP_INTERVAL = float(os.getenv("DELTA_DELETE_SWEEP_INTERVAL", "30"))
+DELTA_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("DELTA_SUBSCRIBER_QUEUE_SIZE", "100"))
+
+FLIGHT_COLUMNS = [
+    "flight_number", "airline", "origin", "destination", "departure_time", "arrival_time", "status",
+    "aircraft_type", "gate", "terminal", "capacity", "occupied_seats", "price"
+]
+SERVICE_COLUMNS = [
+    "name", "type", "location", "terminal", "status", "capacity", "current_usage",
+    "opening_hours", "rating", "price_range"
+]
+
+# Filtres acceptés -> tables auxquelles ils s'appliquent
+FILTER_TABLES = {
+    "terminal": {"flights", "services"},
+    "status": {"flights", "services"},
+    "flight_ids": {"flights"},
+    "service_type": {"services"}
+}
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class DeltaFilter:
+    """Filtres d'un abonné (listes de valeurs acceptées ; absent = tout)"""
+
+    def __init__(self, tables: Iterable[str], terminal: Optional[Iterable[str]] = None,
+                 status: Optional[Iterable[str]] = None, flight_ids: Optional[Iterable[int]] = None,
+                 service_type: Optional[Iterable[str]] = None):
+        self.tables = set(tables)
+        self.terminal = set(terminal) if terminal else None
+        self.status = set(status) if status else None
+        self.flight_ids = {int(flight_id) for flight_id in flight_ids} if flight_ids else None
+        self.service_type = set(service_type) if service_type else None
+
+    @classmethod
+    def from_message(cls, filters: Dict[str, Any]) -> "DeltaFilter":
+        """Filtres envoyés par le client ; ValueError si invalides"""
+        unknown = set(filters) - set(FILTER_TABLES) - {"tables"}
+        if unknown:
+            raise ValueError(f"Filtres inconnus: {', '.join(sorted(unknown))}")
+        tables = filters.get("tables") or ["flights", "services"]
+        if not set(tables) <= {"flights", "services"}:
+            raise ValueError("tables doit contenir 'flights' et/ou 'services'")
+        values = {}
+        for key in FILTER_TABLES:
+            value = filters.get(key)
+            if value is not None and not isinstance(value, list):
+                value = [value]
+            values[key] = value
+        return cls(tables, **values)
+
+    def matches(self, table: str, row_id: int, row: Dict[str, Any]) -> bool:
+        if table not in self.tables:
+            return False
+        if self.terminal is not None and row.get("terminal") not in self.terminal:
+            return False
+        if self.status is not None and row.get("status") not in self.status:
+            return False
+        if table == "flights" and self.flight_ids is not None and row_id not in self.flight_ids:
+            return False
+        if table == "services" and self.service_type is not None and row.get("type") not in self.service_type:
+            return False
+        return True
+
+    def delta(self, change: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Delta vu par cet abonné (entrée/sortie de ses filtres comprises), None s'il n'est pas concerné"""
+        table, row_id, before, after = change["table"], change["id"], change["before"], change["after"]
+        was_visible = before is not None and self.matches(table, row_id, before)
+        is_visible = after is not None and self.matches(table, row_id, after)
+        if was_visible and is_visible:
+            fields = {key: value for key, value in after.items() if before.get(key) != value}
+            return {"table": table, "op": "update", "id": row_id, "fields": fields}
+        if is_visible:
+            return {"table": table, "op": "insert", "id": row_id, "row": after}
+        if was_visible:
+            return {"table": table, "op": "delete", "id": row_id}
+        return None
+
+
+class _WatchedTable:
+    """Instantané d'une table et filigrane `updated_at`"""
+
+    def __init__(self, name: str, model, columns: List[str]):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.watermark: Optional[datetime] = None
+
+    def query(self):
+        table = self.model.__table__
+        return select(table.c.id, table.c.updated_at, *(table.c[column] for column in self.columns))
+
+    def to_row(self, values) -> Dict[str, Any]:
+        return {column: _jsonable(value) for column, value in zip(self.columns, values)}
+
+
+class ChangeFeed:
+    """Détection des modifications par filigrane et diffusion filtrée aux abonnés"""
+
+    def __init__(self, lag: float = DELTA_WATERMARK_LAG, sweep_interval: float = DELTA_DELETE_SWEEP_INTERVAL,
+                 queue_size: int = DELTA_SUBSCRIBER_QUEUE_SIZE):
+        self.lag = timedelta(seconds=lag)
+        self.sweep_interval = sweep_interval
+        self.queue_size = queue_size
+        self.tables = {
+            "flights": _WatchedTable("flights", Flight, FLIGHT_COLUMNS),
+            "services": _WatchedTable("services", Service, SERVICE_COLUMNS)
+        }
+        # Instantanés lus par la boucle, écrits par le thread de relecture
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._subscribers: Dict[asyncio.Queue, DeltaFilter] = {}
+        self.loaded = False
+        self.version = 0
+        self.last_sweep: Optional[float] = None
+        self.polls = 0
+        self.changes = 0
+        self.messages = 0
+        self.resyncs = 0
+        self.last_poll_seconds: Optional[float] = None
+
+    # === DÉTECTION (thread de fond, session synchrone) ===
+
+    def poll(self, db: Session) -> List[Dict[str, Any]]:
+        """Modifications depuis le dernier passage (le premier passage charge l'instantané)"""
+        with self._poll_lock:
+            started = time.perf_counter()
+            if not self.loaded:
+                self._load(db)
+                self.last_poll_seconds = time.perf_counter() - started
+                return []
+
+            changes = []
+            for table in self.tables.values():
+                changes.extend(self._changed_rows(db, table))
+            if time.monotonic() - self.last_sweep >= self.sweep_interval:
+                for table in self.tables.values():
+                    changes.extend(self._deleted_rows(db, table))
+                self.last_sweep = time.monotonic()
+
+            with self._lock:
+                for change in changes:
+                    rows = self.tables[change["table"]].rows
+                    if change["after"] is None:
+                        rows.pop(change["id"], None)
+                    else:
+                        rows[change["id"]] = change["after"]
+                if changes:
+                    self.version += 1
+            self.polls += 1
+            self.changes += len(changes)
+            self.last_poll_seconds = time.perf_counter() - started
+            return changes
+
+    def _load(self, db: Session) -> None:
+        for table in self.tables.values():
+            rows = {}
+            for row_id, updated_at, *values in db.execute(table.query()):
+                rows[row_id] = table.to_row(values)
+                if updated_at is not None and (table.watermark is None or updated_at > table.watermark):
+                    table.watermark = updated_at
+            with self._lock:
+                table.rows = rows
+        self.last_sweep = time.monotonic()
+        self.loaded = True
+        logger.info(
+            f"🔁 Flux de modifications initialisé ({len(self.tables['flights'].rows)} vols, "
+            f"{len(self.tables['services'].rows)} services)"
+        )
+
+    def _changed_rows(self, db: Session, table: _WatchedTable) -> List[Dict[str, Any]]:
+        # >= filigrane - marge: relecture idempotente, les lignes inchangées sont écartées par comparaison
+        query = table.query()
+        if table.watermark is not None:
+            query = query.where(table.model.__table__.c.updated_at >= table.watermark - self.lag)
+        changes = []
+        for row_id, updated_at, *values in db.execute(query):
+            after = table.to_row(values)
+            before = table.rows.get(row_id)
+            if before != after:
+                changes.append({"table": table.name, "op": "insert" if before is None else "update",
+                                "id": row_id, "before": before, "after": after})
+            if updated_at is not None and (table.watermark is None or updated_at > table.watermark):
+                table.watermark = updated_at
+        return changes
+
+    def _deleted_rows(self, db: Session, table: _WatchedTable) -> List[Dict[str, Any]]:
+        existing = set(db.scalars(select(table.model.__table__.c.id)))
+        return [
+            {"table": table.name, "op": "delete", "id": row_id, "before": before, "after": None}
+            for row_id, before in list(table.rows.items()) if row_id not in existing
+        ]
+
+    # === DIFFUSION (boucle d'événements) ===
+
+    def publish(self, changes: List[Dict[str, Any]]) -> None:
+        """Envoyer à chaque abonné les deltas qui passent ses filtres"""
+        if not changes:
+            return
+        for queue, delta_filter in list(self._subscribers.items()):
+            deltas = [delta for delta in map(delta_filter.delta, changes) if delta is not None]
+            if not deltas:
+                continue
+            try:
+                queue.put_nowait({"type": "delta", "version": self.version, "changes": deltas})
+                self.messages += 1
+            except asyncio.QueueFull:
+                # Client trop lent: remplacer son retard par un nouvel instantané
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                self.resyncs += 1
+
+    def subscribe(self, queue: asyncio.Queue, delta_filter: DeltaFilter) -> None:
+        """Enregistrer (ou remplacer) les filtres d'un abonné et lui envoyer l'instantané correspondant"""
+        self._subscribers[queue] = delta_filter
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(self.snapshot(delta_filter))
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.pop(queue, None)
+
+    def new_queue(self) -> asyncio.Queue:
+        return asyncio.Queue(maxsize=self.queue_size)
+
+    def snapshot(self, delta_filter: DeltaFilter) -> Dict[str, Any]:
+        with self._lock:
+            message = {"type": "snapshot", "version": self.version}
+            for name, table in self.tables.items():
+                if name in delta_filter.tables:
+                    message[name] = [
+                        {"id": row_id, **row} for row_id, row in table.rows.items()
+                        if delta_filter.matches(name, row_id, row)
+                    ]
+            return message
+
+    def filter_of(self, queue: asyncio.Queue) -> Optional[DeltaFilter]:
+        return self._subscribers.get(queue)
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "subscribers": len(self._subscribers),
+            "version": self.version,
+            "rows": {name: len(table.rows) for name, table in self.tables.items()},
+            "watermarks": {name: _jsonable(table.watermark) for name, table in self.tables.items()},
+            "polls": self.polls,
+            "changes": self.changes,
+            "messages": self.messages,
+            "resyncs": self.resyncs,
+            "last_poll_seconds": round(self.last_poll_seconds, 4) if self.last_poll_seconds is not None else None
+        }
+
+
+# Instance partagée par l'API
+change_feed = ChangeFeed()
@@ -0,0 +1,159 @@
+"""
+Vecteurs de contenu TF-IDF des destinations (démarrage à froid).
+
+Chaque destination est décrite par un document texte construit à partir de
+ses vols (compagnies, appareils, terminaux, gamme de prix) et des types
+d'événements observés sur ces vols. Les documents sont vectorisés une fois
+par TF-IDF en une matrice creuse normalisée (destinations x termes), gardée
+en mémoire. Un passager sans historique est décrit par ses
+`preferred_destinations` et sa classe préférée : un seul produit creux
+matrice-vecteur donne la similarité cosinus avec toutes les destinations.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional, Sequence, Tuple
+from collections import defaultdict
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from models import Passenger
+
+logger = logging.getLogger(__name__)
+
+CONTENT_VECTORS_MAX_AGE = int(os.getenv("CONTENT_VECTORS_MAX_AGE", "3600"))
+CONTENT_VECTORS_MAX_FEATURES = int(os.getenv("CONTENT_VECTORS_MAX_FEATURES", "1000"))
+
+# Gamme de prix moyenne d'une destination, alignée sur les classes de voyage
+PRICE_TIERS = [(3000, "FIRST"), (1500, "BUSINESS")]
+
+
+def price_tier(avg_price: float) -> str:
+    for threshold, tier in PRICE_TIERS:
+        if avg_price > threshold:
+            return tier
+    return "ECONOMY"
+
+
+def _token(value: str) -> str:
+    """Terme unique pour une valeur multi-mots (ex: « Air France » -> air_france)"""
+    return "_".join(value.lower().split())
+
+
+class DestinationContentVectors:
+    """Matrice TF-IDF des destinations et recherche des destinations proches d'un profil"""
+
+    def __init__(self, max_age: float = CONTENT_VECTORS_MAX_AGE, max_features: int = CONTENT_VECTORS_MAX_FEATURES):
+        self.max_age = max_age
+        self.max_features = max_features
+        self._lock = threading.RLock()
+        self.vectorizer: Optional[TfidfVectorizer] = None
+        self.destinations: List[str] = []
+        self.destination_index: Dict[str, int] = {}
+        self.matrix = sparse.csr_matrix((0, 0))
+        self.refreshed_at: Optional[float] = None
+        self.stale = True
+
+    def build(self, db: Session) -> None:
+        """Construire les documents (deux requêtes groupées) puis la matrice TF-IDF"""
+        flight_rows = db.execute(text("""
+            SELECT destination, airline, aircraft_type, terminal, COUNT(*), AVG(price)
+            FROM flights
+            GROUP BY destination, airline, aircraft_type, terminal
+        """)).fetchall()
+        event_rows = db.execute(text("""
+            SELECT f.destination, e.event_type, COUNT(*)
+            FROM events e
+            JOIN flights f ON e.flight_id = f.id
+            GROUP BY f.destination, e.event_type
+        """)).fetchall()
+
+        terms: Dict[str, List[str]] = defaultdict(list)
+        price_sums: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+        for destination, airline, aircraft_type, terminal, count, avg_price in flight_rows:
+            # « New York » -> new_york: un seul terme, comme dans profile_vector
+            terms[destination].append(_token(destination))
+            for value in (airline, aircraft_type):
+                if value:
+                    terms[destination].append(_token(value))
+            if terminal:
+                terms[destination].append(f"terminal_{_token(terminal)}")
+            if avg_price is not None:
+                price_sums[destination][0] += float(avg_price) * count
+                price_sums[destination][1] += count
+        for destination, event_type, _ in event_rows:
+            if destination in terms and event_type:
+                terms[destination].append(f"event_{_token(event_type)}")
+        for destination, (total, count) in price_sums.items():
+            if count:
+                terms[destination].append(f"tier_{price_tier(total / count).lower()}")
+
+        destinations = sorted(terms)
+        if not destinations:
+            logger.warning("⚠️ Aucun vol pour construire les vecteurs de contenu")
+            return
+
+        vectorizer = TfidfVectorizer(max_features=self.max_features, stop_words='english', sublinear_tf=True)
+        matrix = vectorizer.fit_transform([" ".join(terms[dest]) for dest in destinations]).tocsr()
+
+        with self._lock:
+            self.vectorizer = vectorizer
+            self.destinations = destinations
+            self.destination_index = {dest: i for i, dest in enumerate(destinations)}
+            self.matrix = matrix
+            self.refreshed_at = time.monotonic()
+            self.stale = False
+
+        logger.info(f"📝 Vecteurs de contenu: {len(destinations)} destinations x {matrix.shape[1]} termes")
+
+    def mark_stale(self) -> None:
+        """Reconstruire à la prochaine lecture (nouveau vol, nouvelle destination)"""
+        self.stale = True
+
+    def ensure_fresh(self, db: Session) -> None:
+        if self.stale or self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.max_age:
+            self.build(db)
+
+    def profile_vector(self, preferred_destinations: Sequence[str], travel_class: Optional[str]) -> Optional[sparse.csr_matrix]:
+        """Vecteur (1 x termes) d'un passager: ses destinations préférées et sa classe"""
+        with self._lock:
+            if self.vectorizer is None:
+                return None
+            rows = [self.destination_index[dest] for dest in preferred_destinations if dest in self.destination_index]
+            # Destinations préférées absentes des vols: vectorisées par leur nom
+            document = " ".join(_token(dest) for dest in preferred_destinations if dest not in self.destination_index)
+            if travel_class:
+                document += f" tier_{travel_class.lower()}"
+            vector = self.vectorizer.transform([document])
+            if rows:
+                vector = vector + sparse.csr_matrix(self.matrix[rows].sum(axis=0))
+        if vector.nnz == 0:
+            return None
+        return normalize(vector)
+
+    def top_destinations(self, passenger: Passenger, k: int = 5) -> List[Tuple[str, float]]:
+        """(destination, similarité cosinus) des k destinations les plus proches du profil"""
+        vector = self.profile_vector(passenger.preferred_destinations or [], passenger.travel_class_preference)
+        if vector is None:
+            return []
+
+        with self._lock:
+            scores = (self.matrix @ vector.T).toarray().ravel()
+            destinations = self.destinations
+
+        k = min(k, int(np.count_nonzero(scores > 0)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(destinations[i], float(scores[i])) for i in top]
+
+
+# Instance partagée par l'API
+destination_content_vectors = DestinationContentVectors()
@@ -0,0 +1,175 @@
+"""
+Table de caractéristiques des destinations pour le scoring multi-critères.
+
+Prix (min/moyen/max), taux de places libres et réservations sur 90 jours sont
+calculés pour toutes les destinations en une seule requête groupée, puis
+convertis en facteurs de scoring sous forme de tableaux NumPy. La table est
+recalculée périodiquement et dès qu'un vol est modifié. L'étape « scoring
+avancé » de la branche ML note toutes les destinations préférées d'un
+passager en un produit matriciel.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DESTINATION_FEATURES_MAX_AGE = int(os.getenv("DESTINATION_FEATURES_MAX_AGE", "300"))
+
+# Facteurs saisonniers par destination et par mois (simulation réaliste)
+SEASONAL_FACTORS = {
+    "Dubai": [0.9, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.4, 0.6, 0.8, 0.9, 1.0],
+    "London": [0.6, 0.6, 0.7, 0.8, 0.9, 1.0, 1.0, 1.0, 0.9, 0.8, 0.7, 0.6],
+    "New York": [0.7, 0.7, 0.8, 0.9, 1.0, 1.0, 0.9, 0.9, 1.0, 0.9, 0.8, 0.7],
+    "Tokyo": [0.8, 0.8, 0.9, 1.0, 0.9, 0.8, 0.7, 0.8, 0.9, 1.0, 0.9, 0.8],
+    "Sydney": [1.0, 1.0, 0.9, 0.8, 0.7, 0.6, 0.6, 0.7, 0.8, 0.9, 1.0, 1.0]
+}
+
+# Valeurs par défaut des facteurs quand une destination n'a pas de données
+DEFAULT_SEASONAL = 0.8
+DEFAULT_PRICE = 0.7
+DEFAULT_AVAILABILITY = 0.5
+DEFAULT_POPULARITY = 0.3
+
+# Pondérations du score composite (saisonnier, prix, disponibilité, popularité)
+COMPOSITE_WEIGHTS = np.array([0.3, 0.25, 0.25, 0.2])
+
+
+def seasonal_factor(destination: str, month: Optional[int] = None) -> float:
+    """Facteur saisonnier d'une destination pour un mois donné (mois courant par défaut)"""
+    month = month or datetime.now().month
+    factors = SEASONAL_FACTORS.get(destination)
+    return factors[month - 1] if factors else DEFAULT_SEASONAL
+
+
+class DestinationFeatureStore:
+    """Caractéristiques et facteurs de scoring de toutes les destinations"""
+
+    def __init__(self, max_age: float = DESTINATION_FEATURES_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self.destinations: List[str] = []
+        self.destination_index: Dict[str, int] = {}
+        self.price_min = np.zeros(0)
+        self.price_avg = np.zeros(0)
+        self.price_max = np.zeros(0)
+        self.free_seat_ratio = np.zeros(0)
+        self.bookings_90d = np.zeros(0)
+        # Facteurs (n_destinations x 4) dans l'ordre de COMPOSITE_WEIGHTS
+        self.factors = np.zeros((0, 4))
+        self.refreshed_at: Optional[float] = None
+        self.stale = True
+
+    def refresh(self, db: Session) -> None:
+        """Recalculer la table complète avec une seule requête groupée"""
+        now = datetime.now()
+        rows = db.execute(text("""
+            WITH upcoming AS (
+                SELECT destination,
+                       MIN(price) as min_price,
+                       AVG(price) as avg_price,
+                       MAX(price) as max_price,
+                       AVG(CASE WHEN capacity > 0
+                                THEN CAST(capacity - occupied_seats AS FLOAT) / capacity END) as free_ratio
+                FROM flights
+                WHERE departure_time > :now
+                AND status = 'SCHEDULED'
+                GROUP BY destination
+            ),
+            popularity AS (
+                SELECT f.destination, COUNT(*) as booking_count
+                FROM bookings b
+                JOIN flights f ON b.flight_id = f.id
+                WHERE b.booking_date >= :since
+                GROUP BY f.destination
+            )
+            SELECT COALESCE(u.destination, p.destination),
+                   u.min_price, u.avg_price, u.max_price, u.free_ratio,
+                   COALESCE(p.booking_count, 0)
+            FROM upcoming u
+            FULL OUTER JOIN popularity p ON u.destination = p.destination
+        """), {"now": now, "since": now - timedelta(days=90)}).fetchall()
+
+        destinations = [row[0] for row in rows]
+        columns = np.array(
+            [[np.nan if value is None else float(value) for value in row[1:]] for row in rows],
+            dtype=np.float64
+        ).reshape(len(rows), 5)
+        price_min, price_avg, price_max, free_ratio, bookings = columns.T
+
+        factors = np.column_stack([
+            [seasonal_factor(dest) for dest in destinations],
+            self._price_factor(price_min, price_avg, price_max),
+            self._availability_factor(free_ratio),
+            self._popularity_factor(bookings)
+        ]) if rows else np.zeros((0, 4))
+
+        with self._lock:
+            self.destinations = destinations
+            self.destination_index = {dest: i for i, dest in enumerate(destinations)}
+            self.price_min, self.price_avg, self.price_max = price_min, price_avg, price_max
+            self.free_seat_ratio = free_ratio
+            self.bookings_90d = bookings
+            self.factors = factors
+            self.refreshed_at = time.monotonic()
+            self.stale = False
+
+        logger.info(f"🗺️ Caractéristiques destinations calculées: {len(destinations)} destinations")
+
+    def mark_stale(self) -> None:
+        """Forcer le recalcul à la prochaine lecture (vol créé, modifié ou supprimé)"""
+        self.stale = True
+
+    def ensure_fresh(self, db: Session) -> None:
+        if self.stale or self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.max_age:
+            self.refresh(db)
+
+    def factor_matrix(self, destinations: List[str]) -> np.ndarray:
+        """Facteurs (len(destinations) x 4), valeurs par défaut pour les destinations inconnues"""
+        defaults = np.array([DEFAULT_SEASONAL, DEFAULT_PRICE, DEFAULT_AVAILABILITY, DEFAULT_POPULARITY])
+        matrix = np.tile(defaults, (len(destinations), 1))
+        with self._lock:
+            for i, destination in enumerate(destinations):
+                index = self.destination_index.get(destination)
+                if index is not None:
+                    matrix[i] = self.factors[index]
+                else:
+                    matrix[i, 0] = seasonal_factor(destination)
+        return matrix
+
+    def composite_scores(self, destinations: List[str]) -> np.ndarray:
+        """Score composite pondéré de chaque destination (une multiplication matricielle)"""
+        if not destinations:
+            return np.zeros(0)
+        return self.factor_matrix(destinations) @ COMPOSITE_WEIGHTS
+
+    # === FACTEURS ===
+
+    @staticmethod
+    def _price_factor(price_min: np.ndarray, price_avg: np.ndarray, price_max: np.ndarray) -> np.ndarray:
+        """Attractivité prix: inversement proportionnelle au prix moyen normalisé"""
+        spread = price_max - price_min
+        valid = (price_avg > 0) & (spread > 0)
+        normalized = np.divide(price_avg - price_min, spread, out=np.zeros_like(price_avg), where=valid)
+        return np.where(valid, np.maximum(0.1, 1.0 - normalized), DEFAULT_PRICE)
+
+    @staticmethod
+    def _availability_factor(free_ratio: np.ndarray) -> np.ndarray:
+        valid = free_ratio > 0
+        return np.where(valid, np.clip(np.nan_to_num(free_ratio), 0.1, 1.0), DEFAULT_AVAILABILITY)
+
+    @staticmethod
+    def _popularity_factor(bookings: np.ndarray) -> np.ndarray:
+        """Popularité normalisée sur une base de 50 réservations"""
+        return np.where(bookings > 0, np.minimum(1.0, bookings / 50.0), DEFAULT_POPULARITY)
+
+
+# Instance partagée par l'API
+destination_feature_store = DestinationFeatureStore()
@@ -0,0 +1,257 @@
+"""
+Suivi des passagers dont les recommandations sont à recalculer.
+
+Un passager est marqué « sale » quand ses réservations changent, quand un vol
+qui lui est recommandé change de statut ou se remplit, ou quand ses
+`preferred_destinations` changent. Les services API marquent directement ;
+les écritures directes du générateur sont retrouvées par réconciliation
+(identifiant de réservation, `flights.updated_at`, `passengers.updated_at`).
+Le rafraîchisseur de fond recalcule les passagers sales par lots, du plus
+ancien au plus récent, et réécrit leurs recommandations en une transaction.
+"""
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import Counter
+from datetime import datetime
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from models import Booking, Flight, Passenger, Recommendation
+from services.cache import recommendation_cache
+from services.recommendation_store import recommendation_store
+
+logger = logging.getLogger(__name__)
+
+DIRTY_REFRESH_BATCH_SIZE = int(os.getenv("DIRTY_REFRESH_BATCH_SIZE", "200"))
+DIRTY_REFRESH_LIMIT = int(os.getenv("DIRTY_REFRESH_LIMIT", "10"))
+# Marge d'ids de réservation relue à chaque réconciliation (réservations commitées dans le désordre)
+DIRTY_BOOKING_ID_LAG = int(os.getenv("DIRTY_BOOKING_ID_LAG", "1000"))
+
+# Raisons de marquage (compteurs exposés dans les statistiques)
+REASON_BOOKING = "booking"
+REASON_FLIGHT = "flight"
+REASON_PREFERENCES = "preferences"
+REASON_RETRY = "retry"
+
+ComputeRecommendations = Callable[[Session, Passenger, int], Awaitable[List[Dict]]]
+
+
+class DirtyPassengerTracker:
+    """Ensemble ordonné des passagers à recalculer, avec réconciliation et rafraîchissement par lots"""
+
+    def __init__(self, batch_size: int = DIRTY_REFRESH_BATCH_SIZE, booking_id_lag: int = DIRTY_BOOKING_ID_LAG):
+        self.batch_size = batch_size
+        self.booking_id_lag = booking_id_lag
+        self._lock = threading.Lock()
+        # passenger_id -> instant du premier marquage (ordre d'insertion = ordre de traitement)
+        self._dirty: Dict[int, float] = {}
+        self._preferences: Dict[int, Tuple[str, ...]] = {}
+        self.last_booking_id: Optional[int] = None
+        # Réservations de la marge déjà prises en compte, ignorées à la relecture
+        self._seen_booking_ids: Set[int] = set()
+        self.flight_watermark: Optional[datetime] = None
+        self.passenger_watermark: Optional[datetime] = None
+        self.marked = Counter()
+        self.refreshed = 0
+        self.failed = 0
+        self.last_batch_seconds: Optional[float] = None
+
+    # === MARQUAGE ===
+
+    def mark(self, passenger_id: int, reason: str) -> None:
+        self.mark_many([passenger_id], reason)
+
+    def mark_many(self, passenger_ids: Iterable[int], reason: str) -> int:
+        now = time.monotonic()
+        added = 0
+        with self._lock:
+            for passenger_id in passenger_ids:
+                if passenger_id not in self._dirty:
+                    self._dirty[passenger_id] = now
+                    added += 1
+            self.marked[reason] += added
+        return added
+
+    def mark_flight(self, db: Session, flight_id: int) -> int:
+        """Marquer les passagers à qui un vol (devenu fermé ou complet) est recommandé"""
+        passenger_ids = db.query(Recommendation.passenger_id).filter(
+            Recommendation.flight_id == flight_id
+        ).distinct().all()
+        return self.mark_many((row[0] for row in passenger_ids), REASON_FLIGHT)
+
+    def mark_preferences(self, passenger: Passenger) -> None:
+        """Marquer un passager si ses destinations préférées ont changé"""
+        preferences = tuple(sorted(passenger.preferred_destinations or []))
+        with self._lock:
+            changed = self._preferences.get(passenger.id) != preferences
+            self._preferences[passenger.id] = preferences
+        if changed:
+            self.mark(passenger.id, REASON_PREFERENCES)
+
+    def take(self, n: int) -> List[int]:
+        """Retirer les n passagers marqués depuis le plus longtemps"""
+        with self._lock:
+            batch = []
+            for passenger_id in self._dirty:
+                if len(batch) >= n:
+                    break
+                batch.append(passenger_id)
+            for passenger_id in batch:
+                del self._dirty[passenger_id]
+            return batch
+
+    def __len__(self) -> int:
+        return len(self._dirty)
+
+    # === RÉCONCILIATION (écritures directes en base) ===
+
+    def reconcile(self, db: Session) -> int:
+        """Marquer les passagers touchés par les écritures faites hors API depuis le dernier passage"""
+        if self.last_booking_id is None:
+            self._initialize(db)
+            return 0
+
+        marked = 0
+
+        # Nouvelles réservations, relues avec une marge: un id attribué avant le dernier vu peut être commité après
+        rows = db.query(Booking.passenger_id, Booking.id).filter(
+            Booking.id > self.last_booking_id - self.booking_id_lag
+        ).all()
+        new_rows = [(passenger_id, booking_id) for passenger_id, booking_id in rows
+                    if booking_id not in self._seen_booking_ids]
+        if new_rows:
+            marked += self.mark_many({passenger_id for passenger_id, _ in new_rows}, REASON_BOOKING)
+            self.last_booking_id = max(self.last_booking_id, max(booking_id for _, booking_id in new_rows))
+        floor = self.last_booking_id - self.booking_id_lag
+        self._seen_booking_ids = {booking_id for _, booking_id in rows if booking_id > floor}
+
+        # Vols recommandés devenus non réservables (>= : relecture idempotente du dernier instant)
+        latest_flight = db.query(func.max(Flight.updated_at)).scalar()
+        flight_query = db.query(Flight.id, Flight.updated_at)
+        if self.flight_watermark is not None:
+            flight_query = flight_query.filter(Flight.updated_at >= self.flight_watermark)
+        changed_flights = flight_query.filter(or_(
+            Flight.status != "SCHEDULED",
+            Flight.occupied_seats >= Flight.capacity,
+            Flight.departure_time <= datetime.now()
+        )).all()
+        if changed_flights:
+            flight_ids = [flight_id for flight_id, _ in changed_flights]
+            passengers = db.query(Recommendation.passenger_id).filter(
+                Recommendation.flight_id.in_(flight_ids)
+            ).distinct().all()
+            marked += self.mark_many((row[0] for row in passengers), REASON_FLIGHT)
+        if latest_flight is not None:
+            self.flight_watermark = latest_flight
+
+        # Destinations préférées modifiées
+        passenger_query = db.query(Passenger.id, Passenger.preferred_destinations, Passenger.updated_at)
+        if self.passenger_watermark is not None:
+            passenger_query = passenger_query.filter(Passenger.updated_at >= self.passenger_watermark)
+        for passenger_id, preferred, updated_at in passenger_query.all():
+            preferences = tuple(sorted(preferred or []))
+            with self._lock:
+                previous = self._preferences.get(passenger_id)
+                self._preferences[passenger_id] = preferences
+            if previous is not None and previous != preferences:
+                marked += self.mark_many([passenger_id], REASON_PREFERENCES)
+            if updated_at and (self.passenger_watermark is None or updated_at > self.passenger_watermark):
+                self.passenger_watermark = updated_at
+
+        if marked:
+            logger.info(f"🏷️ {marked} passagers marqués à recalculer ({len(self)} en attente)")
+        return marked
+
+    def _initialize(self, db: Session) -> None:
+        """Premier passage: mémoriser l'état courant sans rien marquer"""
+        self.last_booking_id = db.query(func.max(Booking.id)).scalar() or 0
+        self._seen_booking_ids = {
+            booking_id for (booking_id,) in db.query(Booking.id).filter(
+                Booking.id > self.last_booking_id - self.booking_id_lag
+            )
+        }
+        self.flight_watermark = db.query(func.max(Flight.updated_at)).scalar()
+        rows = db.query(Passenger.id, Passenger.preferred_destinations, Passenger.updated_at).all()
+        with self._lock:
+            self._preferences = {passenger_id: tuple(sorted(preferred or [])) for passenger_id, preferred, _ in rows}
+        self.passenger_watermark = max((updated_at for _, _, updated_at in rows if updated_at), default=None)
+        logger.info(f"🏷️ Suivi des recommandations à recalculer initialisé ({len(rows)} passagers)")
+
+    # === RAFRAÎCHISSEMENT ===
+
+    def refresh_batch(self, db: Session, compute: ComputeRecommendations, limit: int = DIRTY_REFRESH_LIMIT) -> int:
+        """Recalculer un lot de passagers sales et réécrire leurs recommandations"""
+        batch = self.take(self.batch_size)
+        if not batch:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            passengers = db.query(Passenger).filter(Passenger.id.in_(batch)).all()
+            computed, rows = asyncio.run(self._compute_rows(db, passengers, compute, limit))
+            # Un passager sans résultat (étapes en timeout) garde ses recommandations actuelles
+            if computed:
+                recommendation_store.replace_passengers(db, computed, rows)
+        except Exception as e:
+            logger.error(f"❌ Erreur rafraîchissement incrémental des recommandations: {e}")
+            self.mark_many(batch, REASON_RETRY)
+            self.failed += len(batch)
+            return 0
+
+        for passenger_id in computed:
+            recommendation_cache.invalidate_group(passenger_id)
+        self.refreshed += len(computed)
+        self.last_batch_seconds = time.perf_counter() - started
+        logger.info(
+            f"♻️ {len(computed)}/{len(batch)} passagers recalculés en {self.last_batch_seconds:.2f}s "
+            f"({len(self)} en attente)"
+        )
+        return len(computed)
+
+    async def _compute_rows(self, db: Session, passengers: List[Passenger],
+                            compute: ComputeRecommendations, limit: int) -> Tuple[List[int], List[Dict]]:
+        computed, rows = [], []
+        created_at = datetime.now()
+        for passenger in passengers:
+            try:
+                recommendations = await compute(db, passenger, limit)
+            except Exception as e:
+                logger.error(f"❌ Erreur recommandations passager {passenger.id}: {e}")
+                # Remis en file pour le prochain lot, comme un lot en échec
+                self.mark_many([passenger.id], REASON_RETRY)
+                self.failed += 1
+                continue
+            if not recommendations:
+                continue
+
+            computed.append(passenger.id)
+            rows.extend({
+                "passenger_id": passenger.id,
+                "flight_id": rec["flight_id"],
+                "recommendation_type": rec["type"],
+                "score": rec["score"],
+                "reason": rec["reason"],
+                "created_at": created_at
+            } for rec in recommendations)
+        return computed, rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = next(iter(self._dirty.values()), None)
+            return {
+                "backlog": len(self._dirty),
+                "oldest_seconds": round(time.monotonic() - oldest, 1) if oldest is not None else 0.0,
+                "marked": dict(self.marked),
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "batch_size": self.batch_size,
+                "last_batch_seconds": round(self.last_batch_seconds, 3) if self.last_batch_seconds is not None else None
+            }
+
+
+# Instance partagée par l'API
+dirty_passengers = DirtyPassengerTracker()
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, Optional
 import logging
 import os
@@ -18,7 +18,7 @@ class EmailService:
     
     async def generate_travel_email(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         passenger_id: int, 
         flight_id: int, 
         email_type: str = "travel_suggestion"
@@ -54,7 +54,7 @@ class EmailService:
     
     async def generate_marketing_email(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         passenger_id: int, 
         campaign_type: str = "destination_promotion"
     ) -> Dict[str, Any]:
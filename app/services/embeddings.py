@@ -0,0 +1,156 @@
+"""
+Embeddings passagers / destinations par factorisation de matrice.
+
+Hors ligne (train.py), la matrice d'interactions passager x destination
+(vols partis) est pondérée en confiance implicite log(1 + alpha * visites)
+puis factorisée par SVD tronquée : U·sqrt(S) donne les vecteurs passagers,
+V·sqrt(S) ceux des destinations. Les tableaux sont publiés en `.npy` avec
+les autres modèles. Au service, toutes les destinations d'un passager sont
+scorées par un seul produit matrice-vecteur suivi d'un tri partiel top-K.
+Un passager absent de l'entraînement est projeté (fold-in) à partir de sa
+ligne courante de la matrice d'interactions.
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+from services.interaction_matrix import InteractionMatrix, interaction_matrix
+from services.model_registry import ModelRegistry, model_registry
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_FACTORS = int(os.getenv("EMBEDDING_FACTORS", "32"))
+# Poids de confiance des visites répétées (feedback implicite)
+EMBEDDING_ALPHA = float(os.getenv("EMBEDDING_ALPHA", "10"))
+
+
+def fit_embeddings(matrix: sparse.csr_matrix, passenger_ids: Sequence[int], destinations: Sequence[str],
+                   factors: int = EMBEDDING_FACTORS, alpha: float = EMBEDDING_ALPHA) -> Optional[Dict[str, np.ndarray]]:
+    """Factoriser la matrice d'interactions ; None si elle est trop petite"""
+    # Rang borné à la moitié du nombre de destinations: au-delà, la SVD reconstruit l'historique
+    # au lieu de généraliser
+    rank = min(factors, min(matrix.shape) // 2)
+    if rank < 1 or matrix.nnz == 0:
+        return None
+
+    confidence = matrix.astype(np.float64).tocsr(copy=True)
+    confidence.data = np.log1p(alpha * confidence.data)
+
+    u, s, vt = svds(confidence, k=rank, random_state=42)
+    scale = np.sqrt(s)
+    return {
+        "passenger_embeddings": (u * scale).astype(np.float32),
+        "destination_embeddings": (vt.T * scale).astype(np.float32),
+        "embedding_passenger_ids": np.asarray(passenger_ids, dtype=np.int64),
+        "embedding_destinations": np.asarray(destinations, dtype=str)
+    }
+
+
+class EmbeddingState(NamedTuple):
+    """Embeddings d'une version et index dérivés, remplacés d'un bloc au rechargement"""
+    version: Optional[str]
+    passengers: np.ndarray
+    destinations: np.ndarray
+    passenger_ids: np.ndarray
+    destination_index: Dict[str, int]
+    names: List[str]
+    fold_in: np.ndarray
+    destination_norms: np.ndarray
+
+
+class EmbeddingRecommender:
+    """Top-K destinations d'un passager par produit scalaire avec les embeddings publiés"""
+
+    def __init__(self, registry: ModelRegistry, matrix: InteractionMatrix):
+        self.registry = registry
+        self.matrix = matrix
+        self._lock = threading.Lock()
+        self._state: Optional[EmbeddingState] = None
+
+    def _arrays(self) -> Optional[EmbeddingState]:
+        """Embeddings de la version servie (index reconstruits au changement de version)"""
+        self.registry.maybe_reload()
+        # Tableaux et version lus sous le verrou du registre: jamais l'index d'une version
+        # avec les embeddings d'une autre
+        version, arrays = self.registry.get_arrays(
+            "passenger_embeddings", "destination_embeddings", "embedding_passenger_ids", "embedding_destinations"
+        )
+        passengers, destinations = arrays["passenger_embeddings"], arrays["destination_embeddings"]
+        if passengers is None or destinations is None:
+            return None
+
+        with self._lock:
+            if self._state is None or self._state.version != version:
+                destination_index = {str(name): j for j, name in enumerate(arrays["embedding_destinations"])}
+                self._state = EmbeddingState(
+                    version=version,
+                    passengers=passengers,
+                    destinations=destinations,
+                    # Identifiants triés (matrice d'interactions): recherche dichotomique sur le tableau projeté
+                    passenger_ids=arrays["embedding_passenger_ids"],
+                    destination_index=destination_index,
+                    names=list(destination_index),
+                    # Projection d'une ligne de visites dans l'espace latent: r · D · (DᵀD)⁻¹
+                    fold_in=destinations @ np.linalg.pinv(destinations.T @ destinations),
+                    destination_norms=np.linalg.norm(destinations, axis=1)
+                )
+            return self._state
+
+    def passenger_vector(self, passenger_id: int) -> Optional[np.ndarray]:
+        state = self._arrays()
+        if state is None:
+            return None
+        return self._passenger_vector(state, passenger_id)
+
+    def _passenger_vector(self, state: EmbeddingState, passenger_id: int) -> Optional[np.ndarray]:
+        row = int(np.searchsorted(state.passenger_ids, passenger_id))
+        if row < len(state.passenger_ids) and state.passenger_ids[row] == passenger_id:
+            return state.passengers[row]
+
+        # Fold-in des passagers arrivés après l'entraînement
+        visits = self.matrix.row(passenger_id)
+        if visits is None or visits.nnz == 0:
+            return None
+        aligned = np.zeros(len(state.destination_index), dtype=np.float64)
+        for column, count in zip(visits.indices, visits.data):
+            index = state.destination_index.get(self.matrix.destinations[column])
+            if index is not None:
+                aligned[index] = np.log1p(EMBEDDING_ALPHA * count)
+        if not aligned.any():
+            return None
+        return (aligned @ state.fold_in).astype(np.float32)
+
+    def top_destinations(self, passenger_id: int, k: int = 5,
+                         exclude: Sequence[str] = ()) -> List[Tuple[str, float]]:
+        """(destination, similarité cosinus) des k meilleures destinations"""
+        state = self._arrays()
+        if state is None:
+            return []
+        vector = self._passenger_vector(state, passenger_id)
+        if vector is None:
+            return []
+
+        scores = state.destinations @ vector
+        for name in exclude:
+            index = state.destination_index.get(name)
+            if index is not None:
+                scores[index] = -np.inf
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        norms = state.destination_norms[top] * max(float(np.linalg.norm(vector)), 1e-9)
+        cosines = scores[top] / np.maximum(norms, 1e-9)
+        return [(state.names[i], float(cosine)) for i, cosine in zip(top, cosines) if np.isfinite(scores[i])]
+
+
+# Instance partagée par l'API
+embedding_recommender = EmbeddingRecommender(model_registry, interaction_matrix)
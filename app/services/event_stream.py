@@ -0,0 +1,227 @@
+"""
+Diffusion des événements aéroport en Server-Sent Events.
+
+Un trigger PostgreSQL sur `events` envoie `NOTIFY airport_events, '<id>'`
+à chaque insertion (API ou générateur). Une seule connexion asyncpg par
+processus écoute ce canal ; les identifiants reçus sont regroupés, relus
+en une requête (jointure avec le vol) et diffusés à tous les abonnés
+(une file asyncio par client SSE). Les derniers événements sont gardés
+dans un tampon circulaire : un client qui se reconnecte avec
+`Last-Event-ID` rattrape ce qu'il a manqué depuis le tampon, ou depuis la
+base si son dernier événement est plus ancien. Un client trop lent pour
+sa file est déconnecté et rattrapera à sa reconnexion.
+"""
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set
+from collections import deque
+import asyncio
+import json
+import logging
+import os
+
+from models import Event, Flight
+
+logger = logging.getLogger(__name__)
+
+# Notifié par le trigger notify_events_insert (database/init.sql, migration 002)
+EVENT_CHANNEL = "airport_events"
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", "1000"))
+SSE_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SSE_SUBSCRIBER_QUEUE_SIZE", "256"))
+SSE_CATCHUP_LIMIT = int(os.getenv("SSE_CATCHUP_LIMIT", "500"))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "3000"))
+SSE_LISTENER_RECONNECT_DELAY = float(os.getenv("SSE_LISTENER_RECONNECT_DELAY", "5"))
+
+EVENT_EMOJIS = {
+    "BOARDING_STARTED": "🛫",
+    "GATE_CHANGE": "🚪",
+    "FLIGHT_DELAYED": "⏰",
+    "WEATHER_DELAY": "🌧️",
+    "TECHNICAL_ISSUE": "🔧",
+    "SECURITY_ALERT": "🚨",
+    "FLIGHT_DEPARTED": "🚀"
+}
+HIGH_URGENCY_EVENTS = {"SECURITY_ALERT", "TECHNICAL_ISSUE"}
+
+_EVENT_COLUMNS = (
+    Event.id, Event.event_type, Event.description, Event.timestamp,
+    Event.flight_id, Flight.flight_number, Flight.destination
+)
+
+
+def format_event(event_id: int, event_type: str, description: Optional[str], timestamp, flight_id: Optional[int],
+                 flight_number: Optional[str], destination: Optional[str]) -> Dict[str, Any]:
+    return {
+        "id": event_id,
+        "type": event_type,
+        "emoji": EVENT_EMOJIS.get(event_type, "📢"),
+        "description": description,
+        "flight_id": flight_id,
+        "flight_number": flight_number,
+        "destination": destination,
+        "timestamp": timestamp.isoformat() if timestamp is not None else None,
+        "urgency": "high" if event_type in HIGH_URGENCY_EVENTS else "normal"
+    }
+
+
+def sse_message(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: airport_event\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class EventBroadcaster:
+    """Écoute unique du canal NOTIFY et diffusion en mémoire vers les clients SSE"""
+
+    def __init__(self, buffer_size: int = SSE_BUFFER_SIZE, queue_size: int = SSE_SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._pending: Optional[asyncio.Queue] = None
+        self.listening = False
+        self.notifications = 0
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    # === ÉCOUTE (une connexion par processus) ===
+
+    async def run(self, database_url: str, session_factory: async_sessionmaker) -> None:
+        """Écouter le canal et diffuser, en se reconnectant si la connexion tombe"""
+        url = make_url(database_url)
+        if url.get_backend_name() != "postgresql":
+            logger.warning(f"⚠️ Flux SSE sans LISTEN/NOTIFY (base {url.get_backend_name()})")
+            return
+
+        import asyncpg
+        dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self._pending = asyncio.Queue()
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(EVENT_CHANNEL, self._on_notify)
+                self.listening = True
+                logger.info(f"📡 Écoute du canal {EVENT_CHANNEL} ({len(self._subscribers)} abonnés)")
+                # Rattraper ce qui a été inséré pendant une coupure de l'écoute
+                if self._buffer:
+                    async with session_factory() as db:
+                        self.publish(await self.fetch_after(db, self._buffer[-1]["id"]))
+                await self._dispatch(connection, session_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erreur écoute des événements: {e}")
+            finally:
+                self.listening = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(SSE_LISTENER_RECONNECT_DELAY)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        self.notifications += 1
+        self._pending.put_nowait(int(payload))
+
+    async def _dispatch(self, connection, session_factory: async_sessionmaker) -> None:
+        """Relire par lots les événements notifiés puis les diffuser"""
+        while not connection.is_closed():
+            try:
+                event_ids = [await asyncio.wait_for(self._pending.get(), timeout=SSE_HEARTBEAT_INTERVAL)]
+            except asyncio.TimeoutError:
+                continue
+            while not self._pending.empty():
+                event_ids.append(self._pending.get_nowait())
+            async with session_factory() as db:
+                self.publish(await self.fetch_ids(db, event_ids))
+
+    # === LECTURE ===
+
+    async def fetch_ids(self, db: AsyncSession, event_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        rows = await db.execute(
+            select(*_EVENT_COLUMNS).outerjoin(Flight, Event.flight_id == Flight.id)
+            .where(Event.id.in_(list(event_ids))).order_by(Event.id)
+        )
+        return [format_event(*row) for row in rows]
+
+    async def fetch_after(self, db: AsyncSession, last_event_id: int, limit: int = SSE_CATCHUP_LIMIT) -> List[Dict[str, Any]]:
+        rows = await db.execute(
+            select(*_EVENT_COLUMNS).outerjoin(Flight, Event.flight_id == Flight.id)
+            .where(Event.id > last_event_id).order_by(Event.id).limit(limit)
+        )
+        return [format_event(*row) for row in rows]
+
+    async def catch_up(self, db: AsyncSession, last_event_id: int) -> List[Dict[str, Any]]:
+        """Événements postérieurs à `last_event_id`: tampon si possible, sinon base"""
+        buffered = list(self._buffer)
+        if buffered and buffered[0]["id"] <= last_event_id + 1:
+            return [event for event in buffered if event["id"] > last_event_id][:SSE_CATCHUP_LIMIT]
+        return await self.fetch_after(db, last_event_id)
+
+    # === DIFFUSION ===
+
+    def publish(self, events: List[Dict[str, Any]]) -> None:
+        """Ajouter au tampon et pousser à chaque abonné (déconnecter ceux dont la file est pleine)"""
+        if not events:
+            return
+        self._buffer.extend(events)
+        self.published += len(events)
+        for queue in list(self._subscribers):
+            try:
+                for event in events:
+                    queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+                self.dropped_subscribers += 1
+                # Sentinelle: le flux de ce client se termine, il rattrapera via Last-Event-ID
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    async def stream(self, db: AsyncSession, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """Messages SSE d'un client: rattrapage éventuel, puis flux en direct avec battements"""
+        # S'abonner avant le rattrapage pour ne rien perdre entre les deux
+        queue = self.subscribe()
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            sent: Set[int] = set()
+            if last_event_id is not None:
+                for event in await self.catch_up(db, last_event_id):
+                    sent.add(event["id"])
+                    yield sse_message(event)
+            # La session du rattrapage n'est plus utile: rendre la connexion au pool
+            await db.close()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                if event["id"] in sent:
+                    continue
+                yield sse_message(event)
+        finally:
+            self.unsubscribe(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "listening": self.listening,
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._buffer),
+            "last_event_id": self._buffer[-1]["id"] if self._buffer else None,
+            "notifications": self.notifications,
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers
+        }
+
+
+# Instance partagée par l'API
+event_broadcaster = EventBroadcaster()
@@ -0,0 +1,193 @@
+"""
+Feature store des passagers pour le clustering.
+
+Une seule requête agrégée (passagers LEFT JOIN réservations) produit la
+matrice NumPy de caractéristiques de tous les passagers. Le résultat est
+gardé en cache et rafraîchi de façon incrémentale : seuls les passagers
+modifiés depuis le dernier `updated_at` ou ayant reçu une nouvelle
+réservation sont relus. Filigrane et dernier id de réservation sont relus
+avec une marge (transactions commitées en retard) : la relecture est
+idempotente et seuls les passagers réellement modifiés sont notifiés. Les
+suppressions faites directement en base sont trouvées par un balayage
+périodique des identifiants.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_, select
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from models import Passenger, Booking
+
+logger = logging.getLogger(__name__)
+
+# Caractéristiques passager utilisées par le clustering et le prédicteur de préférences
+PASSENGER_FEATURES = ["booking_count", "preferred_destinations_count", "travel_class", "nationality"]
+
+# Marges de relecture: secondes sous le filigrane updated_at, ids sous la dernière réservation vue
+FEATURE_STORE_WATERMARK_LAG = float(os.getenv("FEATURE_STORE_WATERMARK_LAG", "5"))
+FEATURE_STORE_BOOKING_ID_LAG = int(os.getenv("FEATURE_STORE_BOOKING_ID_LAG", "1000"))
+FEATURE_STORE_DELETE_SWEEP_INTERVAL = float(os.getenv("FEATURE_STORE_DELETE_SWEEP_INTERVAL", "60"))
+
+
+class PassengerFeatureStore:
+    """Matrice de caractéristiques passagers en cache, rafraîchie incrémentalement"""
+
+    def __init__(self, max_age: float = 30.0, lag: float = FEATURE_STORE_WATERMARK_LAG,
+                 booking_id_lag: int = FEATURE_STORE_BOOKING_ID_LAG,
+                 sweep_interval: float = FEATURE_STORE_DELETE_SWEEP_INTERVAL):
+        self.max_age = max_age
+        self.lag = timedelta(seconds=lag)
+        self.booking_id_lag = booking_id_lag
+        self.sweep_interval = sweep_interval
+        self._lock = threading.RLock()
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.features = np.zeros((0, len(PASSENGER_FEATURES)), dtype=np.float64)
+        self.row_of: Dict[int, int] = {}
+        # Vocabulaires append-only: les codes restent stables entre rafraîchissements
+        self.vocabularies: Dict[str, List[str]] = {"travel_class": [], "nationality": []}
+        self._codes: Dict[str, Dict[str, int]] = {"travel_class": {}, "nationality": {}}
+        self.watermark: Optional[datetime] = None
+        self.last_booking_id = 0
+        self.refreshed_at: Optional[float] = None
+        self.last_sweep: Optional[float] = None
+        self._listeners: List[Callable[[List[int]], None]] = []
+        self._removal_listeners: List[Callable[[List[int]], None]] = []
+
+    def encode(self, field: str, value: Optional[str]) -> int:
+        """Code stable d'une valeur catégorielle (-1 si absente)"""
+        if not value:
+            return -1
+        codes = self._codes[field]
+        if value not in codes:
+            codes[value] = len(self.vocabularies[field])
+            self.vocabularies[field].append(value)
+        return codes[value]
+
+    def refresh(self, db: Session) -> int:
+        """Relire (en une requête) les passagers nouveaux ou modifiés"""
+        query = db.query(
+            Passenger.id,
+            Passenger.updated_at,
+            Passenger.preferred_destinations,
+            Passenger.travel_class_preference,
+            Passenger.nationality,
+            func.count(Booking.id),
+            func.max(Booking.id)
+        ).outerjoin(Booking, Booking.passenger_id == Passenger.id).group_by(Passenger.id)
+
+        if self.refreshed_at is not None:
+            # Modifiés via l'API (updated_at) ou nouvelles réservations insérées directement en base,
+            # relus avec une marge: une transaction commitée en retard a un updated_at / id déjà dépassé
+            new_bookings = db.query(Booking.passenger_id).filter(
+                Booking.id > self.last_booking_id - self.booking_id_lag
+            )
+            conditions = [Passenger.id.in_(new_bookings)]
+            if self.watermark is not None:
+                conditions.append(Passenger.updated_at >= self.watermark - self.lag)
+            query = query.filter(or_(*conditions))
+
+        rows = query.all()
+        sweep = self.last_sweep is None or time.monotonic() - self.last_sweep >= self.sweep_interval
+        existing = set(db.scalars(select(Passenger.id))) if sweep and self.refreshed_at is not None else None
+
+        with self._lock:
+            new_ids = [row[0] for row in rows if row[0] not in self.row_of]
+            if new_ids:
+                self.ids = np.concatenate([self.ids, np.asarray(new_ids, dtype=np.int64)])
+                self.features = np.vstack([self.features, np.zeros((len(new_ids), len(PASSENGER_FEATURES)))])
+                for offset, passenger_id in enumerate(new_ids, start=len(self.row_of)):
+                    self.row_of[passenger_id] = offset
+
+            changed = list(new_ids)
+            new_id_set = set(new_ids)
+            for passenger_id, updated_at, preferred, travel_class, nationality, booking_count, max_booking_id in rows:
+                row = self.row_of[passenger_id]
+                features = [
+                    booking_count,
+                    len(preferred or []),
+                    self.encode("travel_class", travel_class),
+                    self.encode("nationality", nationality)
+                ]
+                if passenger_id not in new_id_set and self.features[row].tolist() != features:
+                    changed.append(passenger_id)
+                self.features[row] = features
+                if updated_at and (self.watermark is None or updated_at > self.watermark):
+                    self.watermark = updated_at
+                if max_booking_id and max_booking_id > self.last_booking_id:
+                    self.last_booking_id = max_booking_id
+
+            deleted = [] if existing is None else [pid for pid in self.row_of if pid not in existing]
+            self._delete_rows(deleted)
+            if sweep:
+                self.last_sweep = time.monotonic()
+            self.refreshed_at = time.monotonic()
+
+        logger.info(
+            f"🗃️ Feature store passagers: {len(rows)} lignes relues, {len(changed)} modifiées, "
+            f"{len(deleted)} supprimées ({len(self.row_of)} au total)"
+        )
+        if changed:
+            self._notify(self._listeners, changed)
+        if deleted:
+            self._notify(self._removal_listeners, deleted)
+        return len(changed)
+
+    def get_matrix(self, db: Session) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, matrice) à jour, rafraîchie si le cache a expiré"""
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.max_age:
+            self.refresh(db)
+        with self._lock:
+            return self.ids.copy(), self.features.copy()
+
+    def features_for(self, passenger_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self.row_of.get(passenger_id)
+            return None if row is None else self.features[row].copy()
+
+    def features_many(self, passenger_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids présents, matrice) des passagers demandés, lus sous un seul verrou"""
+        with self._lock:
+            found = [pid for pid in passenger_ids if pid in self.row_of]
+            rows = [self.row_of[pid] for pid in found]
+            return np.asarray(found, dtype=np.int64), self.features[rows].copy()
+
+    def add_listener(self, callback: Callable[[List[int]], None]) -> None:
+        """Être notifié des passagers dont les caractéristiques ont changé"""
+        self._listeners.append(callback)
+
+    def add_removal_listener(self, callback: Callable[[List[int]], None]) -> None:
+        """Être notifié des passagers retirés (suppression via l'API ou trouvée par balayage)"""
+        self._removal_listeners.append(callback)
+
+    def _notify(self, listeners: List[Callable[[List[int]], None]], passenger_ids: List[int]) -> None:
+        for callback in listeners:
+            try:
+                callback(passenger_ids)
+            except Exception as e:
+                logger.error(f"❌ Erreur notification feature store: {e}")
+
+    def remove(self, passenger_id: int) -> None:
+        """Retirer un passager supprimé (compactage de la matrice)"""
+        with self._lock:
+            removed = passenger_id in self.row_of
+            self._delete_rows([passenger_id])
+        if removed:
+            self._notify(self._removal_listeners, [passenger_id])
+
+    def _delete_rows(self, passenger_ids: List[int]) -> None:
+        rows = [self.row_of.pop(pid) for pid in passenger_ids if pid in self.row_of]
+        if not rows:
+            return
+        self.ids = np.delete(self.ids, rows)
+        self.features = np.delete(self.features, rows, axis=0)
+        self.row_of = {int(pid): i for i, pid in enumerate(self.ids)}
+
+
+# Instance partagée par l'API
+passenger_feature_store = PassengerFeatureStore()
@@ -0,0 +1,172 @@
+"""
+Index en mémoire des vols réservables, par destination.
+
+Chaque destination garde ses vols futurs SCHEDULED avec des places libres
+dans deux listes triées (bisect) selon les critères de sélection du vol
+optimal : places libres décroissantes puis départ le plus proche, avec en
+plus les vols > 800 € en tête pour la classe BUSINESS. « Meilleur vol vers X
+pour la classe Y » revient à lire la tête d'une liste. L'index est alimenté
+par les services vols/réservations et réconcilié périodiquement sur
+`flights.updated_at` (écritures directes du générateur).
+"""
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left, insort
+from datetime import datetime
+import logging
+import threading
+
+from models import Flight
+
+logger = logging.getLogger(__name__)
+
+BUSINESS_PRICE_THRESHOLD = 800
+# Ordres maintenus par destination
+ORDER_DEFAULT = "default"
+ORDER_BUSINESS = "business"
+
+
+def is_bookable(flight: Flight, now: Optional[datetime] = None) -> bool:
+    """Vol futur, programmé et non complet"""
+    now = now or datetime.now()
+    return (
+        flight.status == "SCHEDULED"
+        and flight.departure_time is not None and flight.departure_time > now
+        and (flight.occupied_seats or 0) < (flight.capacity or 0)
+    )
+
+
+class BookableFlightIndex:
+    """Vols réservables triés par destination pour la sélection du vol optimal"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # flight_id -> (destination, clés de tri par ordre)
+        self._entries: Dict[int, Tuple[str, Dict[str, tuple]]] = {}
+        # destination -> ordre -> clés triées (la dernière composante est l'id du vol)
+        self._by_destination: Dict[str, Dict[str, List[tuple]]] = {}
+        self.watermark: Optional[datetime] = None
+        self.is_loaded = False
+
+    # === CONSTRUCTION ===
+
+    def build(self, db: Session) -> None:
+        """Charger tous les vols réservables (une requête)"""
+        now = datetime.now()
+        flights = db.query(Flight).filter(
+            Flight.status == "SCHEDULED",
+            Flight.departure_time > now,
+            Flight.occupied_seats < Flight.capacity
+        ).all()
+        watermark = db.query(Flight.updated_at).order_by(Flight.updated_at.desc()).limit(1).scalar()
+
+        with self._lock:
+            self._entries = {}
+            self._by_destination = {}
+            for flight in flights:
+                self._insert(flight)
+            for orders in self._by_destination.values():
+                for keys in orders.values():
+                    keys.sort()
+            self.watermark = watermark
+            self.is_loaded = True
+
+        logger.info(f"🛫 Index des vols réservables: {len(flights)} vols, {len(self._by_destination)} destinations")
+
+    def refresh(self, db: Session) -> int:
+        """Réappliquer les vols modifiés depuis le dernier passage (updated_at)"""
+        if not self.is_loaded:
+            self.build(db)
+            return len(self._entries)
+
+        query = db.query(Flight)
+        if self.watermark is not None:
+            query = query.filter(Flight.updated_at >= self.watermark)
+        flights = query.all()
+
+        with self._lock:
+            for flight in flights:
+                self.upsert_flight(flight)
+                if flight.updated_at and (self.watermark is None or flight.updated_at > self.watermark):
+                    self.watermark = flight.updated_at
+            # Vols dont l'heure de départ est passée sans changement de statut
+            now = datetime.now()
+            departed = [
+                flight_id for flight_id, (_, keys) in self._entries.items()
+                if keys[ORDER_DEFAULT][1] <= now
+            ]
+            for flight_id in departed:
+                self.remove_flight(flight_id)
+        return len(flights)
+
+    # === MISES À JOUR ===
+
+    def upsert_flight(self, flight: Flight) -> None:
+        """Indexer (ou retirer) un vol après création, modification ou changement d'occupation"""
+        with self._lock:
+            self.remove_flight(flight.id)
+            if is_bookable(flight):
+                self._insert(flight, keep_sorted=True)
+
+    def remove_flight(self, flight_id: int) -> None:
+        with self._lock:
+            entry = self._entries.pop(flight_id, None)
+            if entry is None:
+                return
+            destination, keys = entry
+            orders = self._by_destination[destination]
+            for order, key in keys.items():
+                sorted_keys = orders[order]
+                position = bisect_left(sorted_keys, key)
+                if position < len(sorted_keys) and sorted_keys[position] == key:
+                    del sorted_keys[position]
+            if not orders[ORDER_DEFAULT]:
+                del self._by_destination[destination]
+
+    # === LECTURE ===
+
+    def best(self, destination: str, travel_class: Optional[str] = None) -> Optional[int]:
+        """Identifiant du meilleur vol réservable vers une destination pour une classe"""
+        order = ORDER_BUSINESS if travel_class == "BUSINESS" else ORDER_DEFAULT
+        now = datetime.now()
+        with self._lock:
+            orders = self._by_destination.get(destination)
+            if not orders:
+                return None
+            for key in orders[order]:
+                departure_time, flight_id = key[-2], key[-1]
+                if departure_time > now:
+                    return flight_id
+            return None
+
+    def best_many(self, destinations: Iterable[str], travel_class: Optional[str] = None) -> Dict[str, int]:
+        """Meilleur vol de plusieurs destinations (destinations sans vol omises)"""
+        result = {}
+        for destination in destinations:
+            flight_id = self.best(destination, travel_class)
+            if flight_id is not None:
+                result[destination] = flight_id
+        return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # === INTERNES ===
+
+    def _insert(self, flight: Flight, keep_sorted: bool = False) -> None:
+        free_seats = (flight.capacity or 0) - (flight.occupied_seats or 0)
+        default_key = (-free_seats, flight.departure_time, flight.id)
+        premium = 1 if flight.price is not None and flight.price > BUSINESS_PRICE_THRESHOLD else 2
+        keys = {ORDER_DEFAULT: default_key, ORDER_BUSINESS: (premium,) + default_key}
+
+        orders = self._by_destination.setdefault(flight.destination, {ORDER_DEFAULT: [], ORDER_BUSINESS: []})
+        for order, key in keys.items():
+            if keep_sorted:
+                insort(orders[order], key)
+            else:
+                orders[order].append(key)
+        self._entries[flight.id] = (flight.destination, keys)
+
+
+# Instance partagée par l'API
+bookable_flight_index = BookableFlightIndex()
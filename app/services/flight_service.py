@@ -1,11 +1,17 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
 
 from models import Flight, Booking, Event
 from schemas import FlightCreate, FlightUpdate
+from services.pagination import Page, paginate
+from services.interaction_matrix import interaction_matrix
+from services.destination_features import destination_feature_store
+from services.flight_index import bookable_flight_index, is_bookable
+from services.content_vectors import destination_content_vectors
+from services.dirty_tracker import dirty_passengers
 
 logger = logging.getLogger(__name__)
 
@@ -13,32 +19,37 @@ class FlightService:
     
     async def get_flights(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
         status: Optional[str] = None,
-        destination: Optional[str] = None
-    ) -> List[Flight]:
-        """Récupérer les vols avec filtres optionnels"""
-        query = db.query(Flight)
+        destination: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort: str = "id"
+    ) -> Page:
+        """Récupérer les vols avec filtres optionnels (page par curseur ou skip historique)"""
+        query = select(Flight)
         
         if status:
-            query = query.filter(Flight.status == status)
+            query = query.where(Flight.status == status)
         if destination:
-            query = query.filter(Flight.destination.ilike(f"%{destination}%"))
+            query = query.where(Flight.destination.ilike(f"%{destination}%"))
             
-        return query.offset(skip).limit(limit).all()
+        return await paginate(db, query, Flight, limit, sort=sort, cursor=cursor, skip=skip)
     
-    async def get_flight(self, db: Session, flight_id: int) -> Optional[Flight]:
+    async def get_flight(self, db: AsyncSession, flight_id: int) -> Optional[Flight]:
         """Récupérer un vol par ID"""
-        return db.query(Flight).filter(Flight.id == flight_id).first()
+        return await db.get(Flight, flight_id)
     
-    async def create_flight(self, db: Session, flight_data: FlightCreate) -> Flight:
+    async def create_flight(self, db: AsyncSession, flight_data: FlightCreate) -> Flight:
         """Créer un nouveau vol"""
         db_flight = Flight(**flight_data.dict())
         db.add(db_flight)
-        db.commit()
-        db.refresh(db_flight)
+        await db.commit()
+        await db.refresh(db_flight)
+        destination_feature_store.mark_stale()
+        destination_content_vectors.mark_stale()
+        bookable_flight_index.upsert_flight(db_flight)
         
         # Créer un événement
         await self._create_flight_event(db, db_flight.id, "FLIGHT_CREATED", "Nouveau vol créé")
@@ -46,18 +57,31 @@ class FlightService:
         logger.info(f"Vol créé: {db_flight.flight_number}")
         return db_flight
     
-    async def update_flight(self, db: Session, flight_id: int, flight_update: FlightUpdate) -> Optional[Flight]:
+    async def update_flight(self, db: AsyncSession, flight_id: int, flight_update: FlightUpdate) -> Optional[Flight]:
         """Mettre à jour un vol"""
         db_flight = await self.get_flight(db, flight_id)
         if not db_flight:
             return None
             
+        previous_status = db_flight.status
+        previous_destination = db_flight.destination
+        
         update_data = flight_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_flight, field, value)
         
-        db.commit()
-        db.refresh(db_flight)
+        await db.commit()
+        await db.refresh(db_flight)
+        destination_feature_store.mark_stale()
+        bookable_flight_index.upsert_flight(db_flight)
+        if not is_bookable(db_flight):
+            await db.run_sync(dirty_passengers.mark_flight, flight_id)
+        
+        # Passage vers (ou depuis) DEPARTED: les réservations du vol comptent comme visites
+        if (previous_status == "DEPARTED") != (db_flight.status == "DEPARTED"):
+            delta = 1 if db_flight.status == "DEPARTED" else -1
+            destination = db_flight.destination if delta > 0 else previous_destination
+            await db.run_sync(interaction_matrix.record_flight_departure, flight_id, destination, delta=delta)
         
         # Créer un événement pour les changements importants
         if 'status' in update_data:
@@ -74,50 +98,54 @@ class FlightService:
         logger.info(f"Vol mis à jour: {db_flight.flight_number}")
         return db_flight
     
-    async def delete_flight(self, db: Session, flight_id: int) -> bool:
+    async def delete_flight(self, db: AsyncSession, flight_id: int) -> bool:
         """Supprimer un vol"""
         db_flight = await self.get_flight(db, flight_id)
         if not db_flight:
             return False
+        
+        if db_flight.status == "DEPARTED":
+            await db.run_sync(interaction_matrix.record_flight_departure, flight_id, db_flight.destination, delta=-1)
             
-        db.delete(db_flight)
-        db.commit()
+        await db.delete(db_flight)
+        await db.commit()
+        destination_feature_store.mark_stale()
+        bookable_flight_index.remove_flight(flight_id)
         
         logger.info(f"Vol supprimé: {db_flight.flight_number}")
         return True
     
-    async def get_dashboard_stats(self, db: Session) -> dict:
+    async def get_dashboard_stats(self, db: AsyncSession) -> dict:
         """Statistiques pour le dashboard"""
         today = datetime.now().date()
-        tomorrow = today + timedelta(days=1)
         
         # Vols du jour
-        daily_flights = db.query(Flight).filter(
-            func.date(Flight.departure_time) == today
-        ).count()
+        daily_flights = await db.scalar(
+            select(func.count(Flight.id)).where(func.date(Flight.departure_time) == today)
+        )
         
         # Vols par statut
-        status_counts = db.query(
-            Flight.status, func.count(Flight.id)
-        ).filter(
-            func.date(Flight.departure_time) == today
-        ).group_by(Flight.status).all()
+        status_counts = (await db.execute(
+            select(Flight.status, func.count(Flight.id)).where(
+                func.date(Flight.departure_time) == today
+            ).group_by(Flight.status)
+        )).all()
         
         # Taux d'occupation moyen
-        avg_occupation = db.query(
-            func.avg(Flight.occupied_seats * 100.0 / Flight.capacity)
-        ).filter(
-            func.date(Flight.departure_time) == today
-        ).scalar() or 0
+        avg_occupation = await db.scalar(
+            select(func.avg(Flight.occupied_seats * 100.0 / Flight.capacity)).where(
+                func.date(Flight.departure_time) == today
+            )
+        ) or 0
         
         # Destinations populaires
-        popular_destinations = db.query(
-            Flight.destination, func.count(Flight.id)
-        ).filter(
-            Flight.departure_time >= datetime.now()
-        ).group_by(Flight.destination).order_by(
-            func.count(Flight.id).desc()
-        ).limit(5).all()
+        popular_destinations = (await db.execute(
+            select(Flight.destination, func.count(Flight.id)).where(
+                Flight.departure_time >= datetime.now()
+            ).group_by(Flight.destination).order_by(
+                func.count(Flight.id).desc()
+            ).limit(5)
+        )).all()
         
         return {
             "daily_flights": daily_flights,
@@ -129,22 +157,26 @@ class FlightService:
             ]
         }
     
-    async def get_realtime_data(self, db: Session) -> dict:
+    async def get_realtime_data(self, db: AsyncSession) -> dict:
         """Données temps réel des vols"""
         now = datetime.now()
         
         # Vols des prochaines 24 heures
-        upcoming_flights = db.query(Flight).filter(
-            and_(
-                Flight.departure_time >= now,
-                Flight.departure_time <= now + timedelta(hours=24)
-            )
-        ).order_by(Flight.departure_time).limit(20).all()
+        upcoming_flights = await db.scalars(
+            select(Flight).where(
+                and_(
+                    Flight.departure_time >= now,
+                    Flight.departure_time <= now + timedelta(hours=24)
+                )
+            ).order_by(Flight.departure_time).limit(20)
+        )
         
         # Événements récents
-        recent_events = db.query(Event).filter(
-            Event.timestamp >= now - timedelta(hours=2)
-        ).order_by(Event.timestamp.desc()).limit(10).all()
+        recent_events = await db.scalars(
+            select(Event).where(
+                Event.timestamp >= now - timedelta(hours=2)
+            ).order_by(Event.timestamp.desc()).limit(10)
+        )
         
         return {
             "upcoming_flights": [
@@ -171,7 +203,7 @@ class FlightService:
             ]
         }
     
-    async def _create_flight_event(self, db: Session, flight_id: int, event_type: str, description: str):
+    async def _create_flight_event(self, db: AsyncSession, flight_id: int, event_type: str, description: str):
         """Créer un événement de vol"""
         event = Event(
             event_type=event_type,
@@ -179,4 +211,4 @@ class FlightService:
             description=description
         )
         db.add(event)
-        db.commit()
+        await db.commit()
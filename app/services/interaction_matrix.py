@@ -0,0 +1,315 @@
+"""
+Matrice d'interactions passager x destination maintenue en mémoire.
+
+La matrice (scipy.sparse CSR) compte les vols partis (status DEPARTED) de
+chaque passager vers chaque destination. Elle est construite une seule fois
+au démarrage (ou rechargée depuis un snapshot disque), puis mise à jour de
+façon incrémentale par les services de réservation et de vols. Le snapshot
+enregistre l'état de la base à sa construction (dernier id et nombre de
+réservations, dernier `flights.updated_at`) : s'il ne correspond plus à la
+base au chargement, la matrice est reconstruite plutôt que servie périmée.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des artefacts ML (snapshots, modèles, index)
+ML_DATA_DIR = os.getenv(
+    "ML_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+)
+
+
+class InteractionMatrix:
+    """Matrice creuse passager x destination avec index d'identifiants stables"""
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path or os.path.join(ML_DATA_DIR, "interaction_matrix.npz")
+        self._lock = threading.RLock()
+        self._base = sparse.csr_matrix((0, 0), dtype=np.float32)
+        # Deltas en attente, fusionnés dans la CSR à la prochaine lecture
+        self._pending: Dict[Tuple[int, int], float] = {}
+        self.passenger_index: Dict[int, int] = {}
+        self.passenger_ids: List[int] = []
+        self.destination_index: Dict[str, int] = {}
+        self.destinations: List[str] = []
+        self._listeners: List[Callable[[List[int]], None]] = []
+        self.is_loaded = False
+        self.built_at: Optional[datetime] = None
+        # État de la base à la construction (dernier id et nombre de réservations, dernier flights.updated_at)
+        self.watermark: Optional[Dict[str, str]] = None
+        self.version = 0
+
+    # === CONSTRUCTION ===
+
+    def build(self, db: Session) -> None:
+        """Construire la matrice complète avec une seule requête agrégée"""
+        # Lu avant l'agrégat: une écriture concurrente rend le snapshot périmé plutôt que de se perdre
+        watermark = self._read_watermark(db)
+        query = text("""
+            SELECT b.passenger_id, f.destination, COUNT(*) as visit_count
+            FROM bookings b
+            JOIN flights f ON b.flight_id = f.id
+            WHERE f.status = 'DEPARTED'
+            GROUP BY b.passenger_id, f.destination
+        """)
+        rows = db.execute(query).fetchall()
+
+        passenger_ids = sorted({row[0] for row in rows})
+        destinations = sorted({row[1] for row in rows})
+        passenger_index = {pid: i for i, pid in enumerate(passenger_ids)}
+        destination_index = {dest: j for j, dest in enumerate(destinations)}
+
+        data = np.fromiter((row[2] for row in rows), dtype=np.float32, count=len(rows))
+        row_idx = np.fromiter((passenger_index[row[0]] for row in rows), dtype=np.int32, count=len(rows))
+        col_idx = np.fromiter((destination_index[row[1]] for row in rows), dtype=np.int32, count=len(rows))
+        matrix = sparse.coo_matrix(
+            (data, (row_idx, col_idx)), shape=(len(passenger_ids), len(destinations))
+        ).tocsr()
+
+        with self._lock:
+            self._base = matrix
+            self._pending = {}
+            self.passenger_ids = passenger_ids
+            self.passenger_index = passenger_index
+            self.destinations = destinations
+            self.destination_index = destination_index
+            self.is_loaded = True
+            self.built_at = datetime.now()
+            self.watermark = watermark
+            self.version += 1
+
+        logger.info(f"📊 Matrice d'interactions construite: {matrix.shape[0]} passagers x {matrix.shape[1]} destinations")
+        self._notify(passenger_ids)
+
+    def initialize(self, db: Session) -> None:
+        """Charger le snapshot disque s'il est à jour, sinon construire depuis la base"""
+        if self.load_snapshot():
+            if self.watermark == self._read_watermark(db):
+                return
+            logger.info("📂 Snapshot matrice d'interactions périmé (réservations ou vols modifiés), reconstruction")
+        self.build(db)
+        self.save_snapshot()
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Construire la matrice à la demande si le démarrage ne l'a pas fait"""
+        if not self.is_loaded:
+            self.build(db)
+
+    # === SNAPSHOT DISQUE ===
+
+    def save_snapshot(self) -> bool:
+        """Écrire la matrice et les index sur disque (écriture atomique)"""
+        try:
+            with self._lock:
+                matrix = self.matrix
+                passenger_ids = np.asarray(self.passenger_ids, dtype=np.int64)
+                destinations = np.asarray(self.destinations, dtype=str)
+                built_at = (self.built_at or datetime.now()).isoformat()
+                watermark = json.dumps(self.watermark)
+
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                data=matrix.data,
+                indices=matrix.indices,
+                indptr=matrix.indptr,
+                shape=np.asarray(matrix.shape, dtype=np.int64),
+                passenger_ids=passenger_ids,
+                destinations=destinations,
+                built_at=np.asarray(built_at),
+                watermark=np.asarray(watermark)
+            )
+            os.replace(tmp_path, self.snapshot_path)
+            logger.info(f"💾 Snapshot matrice d'interactions écrit: {self.snapshot_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Erreur écriture snapshot matrice: {e}")
+            return False
+
+    def load_snapshot(self) -> bool:
+        """Recharger la matrice depuis le snapshot disque"""
+        if not os.path.exists(self.snapshot_path):
+            return False
+
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as snapshot:
+                matrix = sparse.csr_matrix(
+                    (snapshot["data"], snapshot["indices"], snapshot["indptr"]),
+                    shape=tuple(snapshot["shape"])
+                )
+                passenger_ids = [int(pid) for pid in snapshot["passenger_ids"]]
+                destinations = [str(dest) for dest in snapshot["destinations"]]
+                built_at = datetime.fromisoformat(str(snapshot["built_at"]))
+                # Snapshot antérieur au filigrane: considéré périmé
+                watermark = json.loads(str(snapshot["watermark"])) if "watermark" in snapshot else None
+
+            with self._lock:
+                self._base = matrix
+                self._pending = {}
+                self.passenger_ids = passenger_ids
+                self.passenger_index = {pid: i for i, pid in enumerate(passenger_ids)}
+                self.destinations = destinations
+                self.destination_index = {dest: j for j, dest in enumerate(destinations)}
+                self.is_loaded = True
+                self.built_at = built_at
+                self.watermark = watermark
+                self.version += 1
+
+            logger.info(f"📂 Snapshot matrice d'interactions chargé: {matrix.shape[0]} x {matrix.shape[1]}")
+            self._notify(passenger_ids)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Erreur lecture snapshot matrice: {e}")
+            return False
+
+    # === MISES À JOUR INCRÉMENTALES ===
+
+    def record_booking(self, passenger_id: int, destination: str, delta: float = 1.0) -> None:
+        """Ajouter (ou retirer) un vol parti pour un passager"""
+        if not self.is_loaded or not destination:
+            return
+
+        with self._lock:
+            self._apply(passenger_id, destination, delta)
+
+        self._notify([passenger_id])
+
+    def record_flight_departure(self, db: Session, flight_id: int, destination: str, delta: float = 1.0) -> None:
+        """Comptabiliser toutes les réservations d'un vol qui passe (ou quitte) le statut DEPARTED"""
+        if not self.is_loaded or not destination:
+            return
+
+        rows = db.execute(
+            text("SELECT passenger_id FROM bookings WHERE flight_id = :fid"),
+            {"fid": flight_id}
+        ).fetchall()
+        passenger_ids = [row[0] for row in rows]
+
+        with self._lock:
+            for passenger_id in passenger_ids:
+                self._apply(passenger_id, destination, delta)
+
+        if passenger_ids:
+            self._notify(passenger_ids)
+
+    def add_listener(self, callback: Callable[[List[int]], None]) -> None:
+        """Être notifié des passagers dont la ligne a changé"""
+        self._listeners.append(callback)
+
+    # === LECTURE ===
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """Matrice CSR à jour (les deltas en attente sont fusionnés)"""
+        with self._lock:
+            shape = (len(self.passenger_ids), len(self.destinations))
+            if self._base.shape != shape:
+                self._base = sparse.csr_matrix(
+                    (self._base.data, self._base.indices,
+                     np.pad(self._base.indptr, (0, shape[0] - self._base.shape[0]), mode="edge")),
+                    shape=shape
+                )
+            if self._pending:
+                keys = list(self._pending.keys())
+                delta = sparse.coo_matrix(
+                    (
+                        np.fromiter(self._pending.values(), dtype=np.float32, count=len(keys)),
+                        (np.fromiter((k[0] for k in keys), dtype=np.int32, count=len(keys)),
+                         np.fromiter((k[1] for k in keys), dtype=np.int32, count=len(keys)))
+                    ),
+                    shape=shape
+                ).tocsr()
+                merged = self._base + delta
+                merged.data = np.maximum(merged.data, 0)
+                merged.eliminate_zeros()
+                self._base = merged
+                self._pending = {}
+            return self._base
+
+    def row(self, passenger_id: int) -> Optional[sparse.csr_matrix]:
+        """Ligne d'un passager (None si aucun vol parti connu)"""
+        with self._lock:
+            index = self.passenger_index.get(passenger_id)
+            if index is None:
+                return None
+            return self.matrix.getrow(index)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self.passenger_ids), len(self.destinations))
+
+    def stats(self) -> Dict:
+        """Statistiques de la matrice pour le monitoring"""
+        matrix = self.matrix
+        return {
+            "passengers": matrix.shape[0],
+            "destinations": matrix.shape[1],
+            "non_zero": int(matrix.nnz),
+            "built_at": self.built_at,
+            "version": self.version
+        }
+
+    # === INTERNES ===
+
+    def _read_watermark(self, db: Session) -> Dict[str, str]:
+        bookings = db.execute(text("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM bookings")).one()
+        flights_updated_at = db.execute(text("SELECT MAX(updated_at) FROM flights")).scalar()
+        # Chaînes: comparables après aller-retour JSON dans le snapshot
+        return {
+            "last_booking_id": str(bookings[0]),
+            "booking_count": str(bookings[1]),
+            "flights_updated_at": str(flights_updated_at)
+        }
+
+    def _apply(self, passenger_id: int, destination: str, delta: float) -> None:
+        row = self._ensure_passenger(passenger_id)
+        col = self._ensure_destination(destination)
+        self._pending[(row, col)] = self._pending.get((row, col), 0.0) + delta
+        self.version += 1
+
+    def _ensure_passenger(self, passenger_id: int) -> int:
+        index = self.passenger_index.get(passenger_id)
+        if index is None:
+            index = len(self.passenger_ids)
+            self.passenger_ids.append(passenger_id)
+            self.passenger_index[passenger_id] = index
+        return index
+
+    def _ensure_destination(self, destination: str) -> int:
+        index = self.destination_index.get(destination)
+        if index is None:
+            # Nouvelle colonne: élargir la matrice de base avant la fusion
+            index = len(self.destinations)
+            self.destinations.append(destination)
+            self.destination_index[destination] = index
+            base = self._base.tocoo()
+            self._base = sparse.csr_matrix(
+                (base.data, (base.row, base.col)),
+                shape=(self._base.shape[0], index + 1)
+            )
+        return index
+
+    def _notify(self, passenger_ids: List[int]) -> None:
+        for callback in self._listeners:
+            try:
+                callback(passenger_ids)
+            except Exception as e:
+                logger.error(f"❌ Erreur notification matrice d'interactions: {e}")
+
+
+# Instance partagée par l'API (services de réservation, vols et recommandations)
+interaction_matrix = InteractionMatrix()
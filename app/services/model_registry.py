@@ -0,0 +1,220 @@
+"""
+Registre des artefacts ML versionnés.
+
+Les modèles sont entraînés hors ligne (train.py) et écrits dans un répertoire
+par version avec leurs métadonnées ; les tableaux NumPy (embeddings,
+affectations de clusters) y sont enregistrés à part en `.npy`. L'API charge
+la dernière version au démarrage puis la remplace à chaud dès qu'une nouvelle
+version est publiée. Les `.npy` sont projetés en mémoire en lecture seule :
+les workers uvicorn partagent les mêmes pages du cache disque au lieu d'en
+garder chacun une copie. Une version publiée n'est jamais modifiée (répertoire
+renommé atomiquement), une projection en cours reste donc valide.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+import resource
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+
+from services.interaction_matrix import ML_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(ML_DATA_DIR, "models"))
+LATEST_FILE = "LATEST"
+# Projeter les tableaux en mémoire (0: copie privée par worker)
+MODELS_MMAP = os.getenv("MODELS_MMAP", "1") == "1"
+
+
+def process_memory() -> Dict[str, float]:
+    """RSS du processus en Mo: total, anonyme (propre au worker) et projeté depuis des fichiers (partageable)"""
+    fields = {"VmRSS": "rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb"}
+    memory = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    memory[fields[name]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        # Hors Linux: pic de RSS uniquement (Ko)
+        memory["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+
+class RegistrySnapshot(NamedTuple):
+    """Modèles, tableaux et métadonnées d'une même version"""
+    version: Optional[str]
+    models: Dict[str, Any]
+    arrays: Dict[str, Optional[np.ndarray]]
+    metadata: Dict[str, Any]
+
+
+class ModelRegistry:
+    """Publication et chargement à chaud des modèles entraînés"""
+
+    def __init__(self, root: str = MODELS_DIR, mmap: bool = MODELS_MMAP):
+        self.root = root
+        self.mmap = mmap
+        self._lock = threading.RLock()
+        self.models: Dict[str, Any] = {}
+        self.metadata: Dict[str, Any] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.version: Optional[str] = None
+        self._latest_mtime: Optional[float] = None
+
+    # === PUBLICATION (entraînement hors ligne) ===
+
+    def publish(self, models: Dict[str, Any], metadata: Dict[str, Any], keep: int = 5,
+                arrays: Optional[Dict[str, np.ndarray]] = None) -> str:
+        """Écrire une nouvelle version puis basculer le pointeur LATEST (atomique)"""
+        # Microsecondes: deux publications dans la même seconde ont des répertoires distincts
+        version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        version_dir = os.path.join(self.root, version)
+        tmp_dir = f"{version_dir}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        with open(os.path.join(tmp_dir, "models.pkl"), "wb") as f:
+            pickle.dump(models, f, protocol=pickle.HIGHEST_PROTOCOL)
+        for name, array in (arrays or {}).items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array, allow_pickle=False)
+
+        metadata = {**metadata, "version": version, "created_at": datetime.now().isoformat()}
+        with open(os.path.join(tmp_dir, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2, default=str)
+
+        os.replace(tmp_dir, version_dir)
+        self._write_latest(version)
+        self._prune(keep)
+
+        logger.info(f"📦 Modèles publiés: version {version}")
+        return version
+
+    def _write_latest(self, version: str) -> None:
+        tmp_path = os.path.join(self.root, f"{LATEST_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, LATEST_FILE))
+
+    def _prune(self, keep: int) -> None:
+        """Supprimer les anciennes versions au-delà de `keep`"""
+        for version in self.list_versions()[:-keep]:
+            shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+
+    # === CHARGEMENT (API) ===
+
+    def list_versions(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name)) and not name.endswith(".tmp")
+        )
+
+    def latest_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, LATEST_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self, version: Optional[str] = None) -> bool:
+        """Charger une version (la dernière par défaut) et remplacer les modèles servis"""
+        version = version or self.latest_version()
+        if not version:
+            return False
+
+        version_dir = os.path.join(self.root, version)
+        rss_before = process_memory()
+        try:
+            with open(os.path.join(version_dir, "models.pkl"), "rb") as f:
+                models = pickle.load(f)
+            with open(os.path.join(version_dir, "metadata.json")) as f:
+                metadata = json.load(f)
+            # Projection en lecture seule, sans copie (pages partagées entre workers)
+            mmap_mode = "r" if self.mmap else None
+            arrays = {
+                name[:-len(".npy")]: np.load(os.path.join(version_dir, name), mmap_mode=mmap_mode, allow_pickle=False)
+                for name in os.listdir(version_dir) if name.endswith(".npy")
+            }
+        except Exception as e:
+            logger.error(f"❌ Erreur chargement modèles {version}: {e}")
+            return False
+
+        with self._lock:
+            self.models = models
+            self.metadata = metadata
+            self.arrays = arrays
+            self.version = version
+
+        rss_after = process_memory()
+        logger.info(
+            f"🧠 Modèles chargés: version {version}, {len(arrays)} tableaux{' projetés' if self.mmap else ''} "
+            f"(RSS {rss_before.get('rss_mb')} -> {rss_after.get('rss_mb')} Mo, pid {os.getpid()})"
+        )
+        return True
+
+    def maybe_reload(self) -> bool:
+        """Recharger à chaud si le pointeur LATEST a changé (un simple stat par appel)"""
+        try:
+            mtime = os.stat(os.path.join(self.root, LATEST_FILE)).st_mtime
+        except FileNotFoundError:
+            return False
+
+        # Vérifié et mis à jour sous verrou: un seul thread recharge une publication donnée
+        with self._lock:
+            if mtime == self._latest_mtime:
+                return False
+            self._latest_mtime = mtime
+
+        version = self.latest_version()
+        if version and version != self.version:
+            return self.load(version)
+        return False
+
+    def get(self, name: str) -> Optional[Any]:
+        with self._lock:
+            return self.models.get(name)
+
+    def get_array(self, name: str) -> Optional[np.ndarray]:
+        with self._lock:
+            return self.arrays.get(name)
+
+    def get_arrays(self, *names: str) -> Tuple[Optional[str], Dict[str, Optional[np.ndarray]]]:
+        """(version, tableaux) lus ensemble: un rechargement à chaud ne mélange pas deux versions"""
+        with self._lock:
+            return self.version, {name: self.arrays.get(name) for name in names}
+
+    def snapshot(self, models: Tuple[str, ...] = (), arrays: Tuple[str, ...] = ()) -> RegistrySnapshot:
+        """Modèles, tableaux et métadonnées lus ensemble sous le verrou (une seule version)"""
+        with self._lock:
+            return RegistrySnapshot(
+                self.version,
+                {name: self.models.get(name) for name in models},
+                {name: self.arrays.get(name) for name in arrays},
+                self.metadata
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Version servie, tableaux projetés et mémoire de ce worker"""
+        with self._lock:
+            arrays = {
+                name: {
+                    "shape": list(array.shape),
+                    "dtype": str(array.dtype),
+                    "mb": round(array.nbytes / 1024 ** 2, 2),
+                    "memory_mapped": isinstance(array, np.memmap)
+                }
+                for name, array in self.arrays.items()
+            }
+            return {"version": self.version, "pid": os.getpid(), "arrays": arrays, "memory": process_memory()}
+
+
+# Instance partagée par l'API
+model_registry = ModelRegistry()
@@ -0,0 +1,216 @@
+"""
+Clustering incrémental des passagers (MiniBatchKMeans).
+
+Le modèle est ajusté une fois sur toute la matrice du feature store, puis les
+passagers nouveaux ou modifiés (notifiés par le feature store) sont intégrés
+par micro-lots avec `partial_fit`. Chaque passager garde son cluster dans un
+index cluster -> passagers, ce qui rend « les passagers de mon cluster »
+immédiat : un échantillon aléatoire borné du cluster est classé par distance
+aux caractéristiques du passager. La distance moyenne des micro-lots à leur centroïde est suivie :
+quand elle dérive trop au-delà de celle mesurée au dernier ajustement
+complet, le modèle est réajusté de zéro.
+"""
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Set
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from services.feature_store import PassengerFeatureStore, passenger_feature_store
+
+logger = logging.getLogger(__name__)
+
+N_CLUSTERS = int(os.getenv("PASSENGER_CLUSTERS", "5"))
+MICRO_BATCH_SIZE = int(os.getenv("PASSENGER_CLUSTERS_BATCH_SIZE", "256"))
+# Réajustement complet quand la distance des micro-lots dépasse DRIFT_RATIO x la référence
+DRIFT_RATIO = float(os.getenv("PASSENGER_CLUSTERS_DRIFT_RATIO", "1.5"))
+# Poids des derniers micro-lots dans la moyenne glissante des distances
+DRIFT_SMOOTHING = 0.2
+# Membres du cluster tirés au hasard puis classés par distance au passager
+MEMBER_CANDIDATES = int(os.getenv("PASSENGER_CLUSTERS_MEMBER_CANDIDATES", "500"))
+
+
+def nearest_members(target: np.ndarray, passenger_ids: np.ndarray, features: np.ndarray, limit: int) -> List[int]:
+    """Les `limit` passagers dont les caractéristiques sont les plus proches de `target`"""
+    if len(passenger_ids) == 0:
+        return []
+    distances = ((np.asarray(features, dtype=np.float64) - np.asarray(target, dtype=np.float64)) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:limit]
+    return [int(pid) for pid in np.asarray(passenger_ids)[order]]
+
+
+class OnlinePassengerClusters:
+    """Clusters de passagers mis à jour en continu, avec index cluster -> passagers"""
+
+    def __init__(self, store: PassengerFeatureStore, n_clusters: int = N_CLUSTERS,
+                 batch_size: int = MICRO_BATCH_SIZE, drift_ratio: float = DRIFT_RATIO):
+        self.store = store
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.drift_ratio = drift_ratio
+        self._lock = threading.RLock()
+        self.model: Optional[MiniBatchKMeans] = None
+        self.cluster_of: Dict[int, int] = {}
+        self.members: List[Set[int]] = []
+        # Passagers relus par le feature store, en attente d'intégration
+        self._pending: Set[int] = set()
+        self.baseline_distance: Optional[float] = None
+        self.recent_distance: Optional[float] = None
+        self.fitted_at: Optional[float] = None
+        self.partial_fits = 0
+        self.refits = 0
+        self._rng = np.random.default_rng()
+        store.add_listener(self._on_features_changed)
+        store.add_removal_listener(self._on_passengers_removed)
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.model is not None
+
+    # === AJUSTEMENT ===
+
+    def fit(self, db: Session) -> bool:
+        """Ajustement complet sur tous les passagers du feature store"""
+        with self._lock:
+            self._pending.clear()
+        passenger_ids, features = self.store.get_matrix(db)
+        if len(passenger_ids) < self.n_clusters:
+            logger.warning("⚠️ Pas assez de passagers pour le clustering incrémental")
+            return False
+
+        model = MiniBatchKMeans(
+            n_clusters=self.n_clusters, batch_size=self.batch_size, n_init=3, random_state=42
+        )
+        labels = model.fit_predict(features)
+        baseline = float(model.inertia_) / len(passenger_ids)
+
+        members: List[Set[int]] = [set() for _ in range(self.n_clusters)]
+        for passenger_id, label in zip(passenger_ids.tolist(), labels.tolist()):
+            members[label].add(passenger_id)
+
+        with self._lock:
+            self.model = model
+            self.cluster_of = dict(zip(passenger_ids.tolist(), labels.tolist()))
+            self.members = members
+            self.baseline_distance = baseline
+            self.recent_distance = baseline
+            self.fitted_at = time.monotonic()
+            self.refits += 1
+
+        logger.info(f"🎯 Clustering passagers ajusté: {len(passenger_ids)} passagers, distance moyenne {baseline:.2f}")
+        return True
+
+    def update(self, db: Session) -> int:
+        """Relire les passagers modifiés, les intégrer par micro-lots et réajuster en cas de dérive"""
+        if not self.is_fitted:
+            self.fit(db)
+            return 0
+
+        self.store.refresh(db)
+        with self._lock:
+            pending, self._pending = list(self._pending), set()
+
+        integrated = 0
+        for start in range(0, len(pending), self.batch_size):
+            integrated += self._partial_fit(pending[start:start + self.batch_size])
+
+        if self.has_drifted():
+            logger.warning(
+                f"⚠️ Dérive du clustering ({self.recent_distance:.2f} vs {self.baseline_distance:.2f}), réajustement complet"
+            )
+            self.fit(db)
+        return integrated
+
+    def has_drifted(self) -> bool:
+        if self.baseline_distance is None or self.recent_distance is None:
+            return False
+        return self.recent_distance > self.drift_ratio * max(self.baseline_distance, 1e-9)
+
+    def _partial_fit(self, passenger_ids: List[int]) -> int:
+        rows = [(pid, self.store.features_for(pid)) for pid in passenger_ids]
+        rows = [(pid, features) for pid, features in rows if features is not None]
+        if not rows:
+            return 0
+
+        ids = [pid for pid, _ in rows]
+        batch = np.vstack([features for _, features in rows])
+
+        with self._lock:
+            self.model.partial_fit(batch)
+            distances = self.model.transform(batch)
+            labels = distances.argmin(axis=1)
+            batch_distance = float((distances.min(axis=1) ** 2).mean())
+            self.recent_distance = (
+                (1 - DRIFT_SMOOTHING) * self.recent_distance + DRIFT_SMOOTHING * batch_distance
+            )
+            for passenger_id, label in zip(ids, labels.tolist()):
+                self._assign(passenger_id, label)
+            self.partial_fits += 1
+        return len(ids)
+
+    # === INDEX CLUSTER -> PASSAGERS ===
+
+    def _on_features_changed(self, passenger_ids: List[int]) -> None:
+        with self._lock:
+            if self.model is not None:
+                self._pending.update(passenger_ids)
+
+    def _on_passengers_removed(self, passenger_ids: List[int]) -> None:
+        for passenger_id in passenger_ids:
+            self.remove(passenger_id)
+
+    def _assign(self, passenger_id: int, label: int) -> None:
+        previous = self.cluster_of.get(passenger_id)
+        if previous is not None:
+            self.members[previous].discard(passenger_id)
+        self.cluster_of[passenger_id] = label
+        self.members[label].add(passenger_id)
+
+    def remove(self, passenger_id: int) -> None:
+        with self._lock:
+            label = self.cluster_of.pop(passenger_id, None)
+            if label is not None:
+                self.members[label].discard(passenger_id)
+            self._pending.discard(passenger_id)
+
+    def cluster_for(self, passenger_id: int) -> Optional[int]:
+        with self._lock:
+            return self.cluster_of.get(passenger_id)
+
+    def cluster_members(self, passenger_id: int, limit: int = 10) -> List[int]:
+        """Passagers du même cluster les plus proches (parmi un échantillon aléatoire borné du cluster)"""
+        with self._lock:
+            label = self.cluster_of.get(passenger_id)
+            if label is None:
+                return []
+            candidates = list(self.members[label] - {passenger_id})
+            if len(candidates) > MEMBER_CANDIDATES:
+                picked = self._rng.choice(len(candidates), size=MEMBER_CANDIDATES, replace=False)
+                candidates = [candidates[i] for i in picked]
+
+        target = self.store.features_for(passenger_id)
+        if target is None:
+            return [candidates[i] for i in self._rng.permutation(len(candidates))[:limit]]
+        passenger_ids, features = self.store.features_many(candidates)
+        return nearest_members(target, passenger_ids, features, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "fitted": self.is_fitted,
+                "passengers": len(self.cluster_of),
+                "cluster_sizes": [len(members) for members in self.members],
+                "pending": len(self._pending),
+                "baseline_distance": self.baseline_distance,
+                "recent_distance": self.recent_distance,
+                "partial_fits": self.partial_fits,
+                "refits": self.refits
+            }
+
+
+# Instance partagée par l'API
+passenger_clusters = OnlinePassengerClusters(passenger_feature_store)
@@ -0,0 +1,100 @@
+"""
+Pagination par clé (keyset) des listes de l'API.
+
+Une page est lue avec `WHERE (colonne_de_tri, id) > (valeur, id)` puis
+`ORDER BY colonne_de_tri, id LIMIT n` : le coût ne dépend pas de la
+profondeur de la page (l'index sert à la fois au filtre et au tri), et une
+ligne insérée pendant le parcours ne décale pas les pages suivantes. Le
+curseur `next_cursor` est opaque pour le client : il encode le tri et la
+clé de la dernière ligne renvoyée. Les colonnes de tri proposées sont non
+nulles, l'`id` départageant les égalités. L'ancien `skip` reste accepté
+(OFFSET sur le même ordre stable).
+"""
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+import base64
+import binascii
+import json
+
+from models import Booking, Flight, Passenger, Service
+
+# Colonnes de tri par modèle (non nulles ; indexées avec l'id dans init.sql)
+SORT_KEYS = {
+    Flight: ("id", "departure_time", "flight_number"),
+    Passenger: ("id", "last_name"),
+    Service: ("id", "name"),
+    Booking: ("id", "booking_reference")
+}
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def _encode_value(value: Any) -> Any:
+    return {"dt": value.isoformat()} if isinstance(value, datetime) else value
+
+
+def _decode_value(value: Any) -> Any:
+    return datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+
+
+def encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    payload = json.dumps({"s": sort, "v": _encode_value(value), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any, int]:
+    """(tri, valeur, id) d'un curseur ; ValueError s'il est illisible"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return payload["s"], _decode_value(payload["v"]), int(payload["id"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise ValueError("Curseur invalide")
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    model,
+    limit: int,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Page:
+    """Page de `query` (déjà filtrée) triée par (sort, id), après le curseur ou à l'offset `skip`"""
+    if cursor:
+        if skip:
+            raise ValueError("skip et cursor sont exclusifs")
+        # Le tri du curseur prime: une suite de pages garde l'ordre de la première
+        sort, value, last_id = decode_cursor(cursor)
+    if sort not in SORT_KEYS[model]:
+        raise ValueError(f"Tri non supporté: {sort} (valeurs: {', '.join(SORT_KEYS[model])})")
+
+    column = getattr(model, sort)
+    if sort == "id":
+        query = query.order_by(model.id)
+        if cursor:
+            query = query.where(model.id > last_id)
+    else:
+        query = query.order_by(column, model.id)
+        if cursor:
+            query = query.where(tuple_(column, model.id) > tuple_(value, last_id))
+    if skip:
+        query = query.offset(skip)
+
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    rows = list(await db.scalars(query.limit(limit + 1)))
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and items:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort), last.id)
+    return Page(items, next_cursor)
+
+
+def page_payload(page: Page) -> Dict[str, Any]:
+    return {"items": page.items, "next_cursor": page.next_cursor}
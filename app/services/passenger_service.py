@@ -1,5 +1,5 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from typing import List, Optional
 import logging
 import random
@@ -7,6 +7,11 @@ import string
 
 from models import Passenger, Booking, Flight
 from schemas import PassengerCreate, PassengerUpdate
+from services.pagination import Page, paginate
+from services.feature_store import passenger_feature_store
+from services.cache import recommendation_cache
+from services.dirty_tracker import dirty_passengers
+from services.similarity import passenger_similarity_engine
 
 logger = logging.getLogger(__name__)
 
@@ -14,28 +19,30 @@ class PassengerService:
     
     async def get_passengers(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
-        nationality: Optional[str] = None
-    ) -> List[Passenger]:
-        """Récupérer les passagers avec filtres optionnels"""
-        query = db.query(Passenger)
+        nationality: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort: str = "id"
+    ) -> Page:
+        """Récupérer les passagers avec filtres optionnels (page par curseur ou skip historique)"""
+        query = select(Passenger)
         
         if nationality:
-            query = query.filter(Passenger.nationality.ilike(f"%{nationality}%"))
+            query = query.where(Passenger.nationality.ilike(f"%{nationality}%"))
             
-        return query.offset(skip).limit(limit).all()
+        return await paginate(db, query, Passenger, limit, sort=sort, cursor=cursor, skip=skip)
     
-    async def get_passenger(self, db: Session, passenger_id: int) -> Optional[Passenger]:
+    async def get_passenger(self, db: AsyncSession, passenger_id: int) -> Optional[Passenger]:
         """Récupérer un passager par ID"""
-        return db.query(Passenger).filter(Passenger.id == passenger_id).first()
+        return await db.get(Passenger, passenger_id)
     
-    async def get_passenger_by_email(self, db: Session, email: str) -> Optional[Passenger]:
+    async def get_passenger_by_email(self, db: AsyncSession, email: str) -> Optional[Passenger]:
         """Récupérer un passager par email"""
-        return db.query(Passenger).filter(Passenger.email == email).first()
+        return await db.scalar(select(Passenger).where(Passenger.email == email).limit(1))
     
-    async def create_passenger(self, db: Session, passenger_data: PassengerCreate) -> Passenger:
+    async def create_passenger(self, db: AsyncSession, passenger_data: PassengerCreate) -> Passenger:
         """Créer un nouveau passager"""
         # Vérifier si l'email existe déjà
         existing = await self.get_passenger_by_email(db, passenger_data.email)
@@ -48,13 +55,14 @@ class PassengerService:
             
         db_passenger = Passenger(**passenger_data.dict())
         db.add(db_passenger)
-        db.commit()
-        db.refresh(db_passenger)
+        await db.commit()
+        await db.refresh(db_passenger)
+        passenger_similarity_engine.upsert_passenger(db_passenger, ())
         
         logger.info(f"Passager créé: {db_passenger.email}")
         return db_passenger
     
-    async def update_passenger(self, db: Session, passenger_id: int, passenger_update: PassengerUpdate) -> Optional[Passenger]:
+    async def update_passenger(self, db: AsyncSession, passenger_id: int, passenger_update: PassengerUpdate) -> Optional[Passenger]:
         """Mettre à jour un passager"""
         db_passenger = await self.get_passenger(db, passenger_id)
         if not db_passenger:
@@ -71,37 +79,45 @@ class PassengerService:
         for field, value in update_data.items():
             setattr(db_passenger, field, value)
         
-        db.commit()
-        db.refresh(db_passenger)
+        await db.commit()
+        await db.refresh(db_passenger)
+        if 'preferred_destinations' in update_data:
+            dirty_passengers.mark_preferences(db_passenger)
+        passenger_similarity_engine.upsert_passenger(db_passenger)
         
         logger.info(f"Passager mis à jour: {db_passenger.email}")
         return db_passenger
     
-    async def delete_passenger(self, db: Session, passenger_id: int) -> bool:
+    async def delete_passenger(self, db: AsyncSession, passenger_id: int) -> bool:
         """Supprimer un passager"""
         db_passenger = await self.get_passenger(db, passenger_id)
         if not db_passenger:
             return False
             
-        db.delete(db_passenger)
-        db.commit()
+        await db.delete(db_passenger)
+        await db.commit()
+        passenger_feature_store.remove(passenger_id)
+        passenger_similarity_engine.remove_passenger(passenger_id)
+        recommendation_cache.invalidate_group(passenger_id)
         
         logger.info(f"Passager supprimé: {db_passenger.email}")
         return True
     
-    async def get_passenger_profile(self, db: Session, passenger_id: int) -> dict:
+    async def get_passenger_profile(self, db: AsyncSession, passenger_id: int) -> dict:
         """Obtenir le profil complet d'un passager"""
         passenger = await self.get_passenger(db, passenger_id)
         if not passenger:
             return None
             
         # Historique des vols
-        bookings = db.query(Booking).filter(Booking.passenger_id == passenger_id).all()
+        bookings = list(await db.scalars(select(Booking).where(Booking.passenger_id == passenger_id)))
         
         # Destinations visitées
-        visited_destinations = db.query(Flight.destination).join(Booking).filter(
-            Booking.passenger_id == passenger_id
-        ).distinct().all()
+        visited_destinations = (await db.execute(
+            select(Flight.destination).join(Booking).where(
+                Booking.passenger_id == passenger_id
+            ).distinct()
+        )).all()
         
         # Statistiques
         total_bookings = len(bookings)
@@ -115,17 +131,19 @@ class PassengerService:
             "recent_bookings": bookings[-5:] if bookings else []
         }
     
-    async def update_flight_count(self, db: Session, passenger_id: int):
+    async def update_flight_count(self, db: AsyncSession, passenger_id: int):
         """Mettre à jour le nombre de vols d'un passager"""
         passenger = await self.get_passenger(db, passenger_id)
         if passenger:
-            flight_count = db.query(Booking).filter(
-                Booking.passenger_id == passenger_id,
-                Booking.status == "CONFIRMED"
-            ).count()
+            flight_count = await db.scalar(
+                select(func.count(Booking.id)).where(
+                    Booking.passenger_id == passenger_id,
+                    Booking.status == "CONFIRMED"
+                )
+            )
             
             passenger.total_flights = flight_count
-            db.commit()
+            await db.commit()
     
     def _generate_frequent_flyer_id(self) -> str:
         """Générer un ID frequent flyer unique"""
@@ -0,0 +1,219 @@
+"""
+Statistiques des pools de connexions et détection des sessions oubliées.
+
+Les pools des moteurs (synchrone et asynchrone) sont créés avec une classe
+de pool instrumentée : le temps d'attente d'une connexion est mesuré autour
+de `Pool.connect()`. Les événements checkout/checkin du pool gardent, pour
+chaque connexion sortie, l'instant et l'emplacement du code applicatif qui
+l'a demandée (premier cadre hors SQLAlchemy, y compris à travers le
+greenlet d'une AsyncSession). Une connexion gardée au-delà du seuil est
+signalée une fois dans les logs avec cet emplacement.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Type
+from collections import deque
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+DB_LEAK_THRESHOLD = float(os.getenv("DB_LEAK_THRESHOLD", "30"))
+DB_POOL_WAIT_SAMPLES = int(os.getenv("DB_POOL_WAIT_SAMPLES", "1000"))
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cadres ignorés pour situer l'appelant: ce module et la fabrique de sessions
+_INTERNAL_FILES = {os.path.abspath(__file__), os.path.join(APP_DIR, "database.py")}
+
+
+def _frames(frame) -> Iterator[Tuple[Any, int]]:
+    """Cadres de la pile courante, du plus récent au plus ancien, puis ceux du greenlet parent"""
+    yield from traceback.walk_stack(frame)
+    # Sous AsyncSession, le checkout a lieu dans un greenlet fils: la coroutine appelante est dans le parent
+    greenlet = sys.modules.get("greenlet")
+    if greenlet is not None:
+        parent = greenlet.getcurrent().parent
+        if parent is not None and parent.gr_frame is not None:
+            yield from traceback.walk_stack(parent.gr_frame)
+
+
+def caller_location() -> str:
+    """Premier cadre du code applicatif dans la pile courante (fichier:ligne fonction)"""
+    # Parcours paresseux arrêté au premier cadre applicatif, sans lecture des sources
+    # (linecache): appelé à chaque checkout
+    for frame, lineno in _frames(sys._getframe(1)):
+        filename = frame.f_code.co_filename
+        if filename.startswith("<"):
+            # Code généré par SQLAlchemy (<string>)
+            continue
+        filename = os.path.abspath(filename)
+        if filename.startswith(APP_DIR) and filename not in _INTERNAL_FILES and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, APP_DIR)}:{lineno} {frame.f_code.co_name}"
+    return "inconnu"
+
+
+class _PoolStats:
+    """Compteurs d'un pool (attente, durée de détention, connexions sorties)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.engine: Optional[Engine] = None
+        self.waits: Deque[float] = deque(maxlen=DB_POOL_WAIT_SAMPLES)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.checkouts = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        # id(connection_record) -> [instant du checkout, emplacement, déjà signalée]
+        self.held: Dict[int, List[Any]] = {}
+
+
+class PoolMonitor:
+    """Instrumentation des pools de connexions des moteurs SQLAlchemy"""
+
+    def __init__(self, leak_threshold: float = DB_LEAK_THRESHOLD):
+        self.leak_threshold = leak_threshold
+        self._lock = threading.Lock()
+        self._pools: Dict[str, _PoolStats] = {}
+        self.leaks_reported = 0
+
+    def _stats(self, name: str) -> _PoolStats:
+        with self._lock:
+            if name not in self._pools:
+                self._pools[name] = _PoolStats(name)
+            return self._pools[name]
+
+    def pool_class(self, base: Type[Pool], name: str) -> Type[Pool]:
+        """Classe de pool qui mesure l'attente d'une connexion (à passer en `poolclass`)"""
+        monitor = self
+
+        class MonitoredPool(base):
+            def connect(self):
+                started = time.perf_counter()
+                try:
+                    return super().connect()
+                except PoolTimeoutError:
+                    monitor._record_timeout(name)
+                    raise
+                finally:
+                    monitor._record_wait(name, time.perf_counter() - started)
+
+        MonitoredPool.__name__ = f"Monitored{base.__name__}"
+        return MonitoredPool
+
+    def attach(self, engine: Engine, name: str) -> None:
+        """Suivre les checkouts/checkins du pool d'un moteur (async: `async_engine.sync_engine`)"""
+        stats = self._stats(name)
+        stats.engine = engine
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            location = caller_location()
+            with self._lock:
+                stats.checkouts += 1
+                stats.held[id(connection_record)] = [time.monotonic(), location, False]
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            with self._lock:
+                entry = stats.held.pop(id(connection_record), None)
+                if entry is None:
+                    return
+                held = time.monotonic() - entry[0]
+                stats.hold_total += held
+                stats.hold_max = max(stats.hold_max, held)
+            if entry[2]:
+                logger.info(f"🔌 Connexion {name} rendue après {held:.1f}s ({entry[1]})")
+
+    def _record_wait(self, name: str, seconds: float) -> None:
+        stats = self._stats(name)
+        with self._lock:
+            stats.waits.append(seconds)
+            stats.wait_count += 1
+            stats.wait_total += seconds
+            stats.wait_max = max(stats.wait_max, seconds)
+
+    def _record_timeout(self, name: str) -> None:
+        stats = self._stats(name)
+        with self._lock:
+            stats.timeouts += 1
+        logger.error(f"❌ Pool {name} épuisé: délai d'attente d'une connexion dépassé")
+
+    def held_connections(self, min_seconds: float = 0.0) -> List[Dict[str, Any]]:
+        """Connexions sorties depuis au moins `min_seconds`, les plus anciennes d'abord"""
+        now = time.monotonic()
+        with self._lock:
+            held = [
+                {"pool": stats.name, "held_seconds": round(now - since, 1), "location": location}
+                for stats in self._pools.values()
+                for since, location, _ in stats.held.values()
+                if now - since >= min_seconds
+            ]
+        return sorted(held, key=lambda entry: -entry["held_seconds"])
+
+    def check_leaks(self) -> int:
+        """Signaler (une fois) les connexions gardées au-delà du seuil"""
+        now = time.monotonic()
+        leaks = []
+        with self._lock:
+            for stats in self._pools.values():
+                for entry in stats.held.values():
+                    if not entry[2] and now - entry[0] >= self.leak_threshold:
+                        entry[2] = True
+                        leaks.append((stats.name, now - entry[0], entry[1]))
+            self.leaks_reported += len(leaks)
+        for name, held, location in leaks:
+            logger.warning(f"⚠️ Session {name} gardée depuis {held:.0f}s sans être fermée, ouverte par {location}")
+        return len(leaks)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = {}
+            for name, stats in self._pools.items():
+                waits = sorted(stats.waits)
+                pools[name] = {
+                    **self._pool_state(stats.engine.pool if stats.engine is not None else None),
+                    "checkouts": stats.checkouts,
+                    "wait": {
+                        "count": stats.wait_count,
+                        "avg_ms": round(stats.wait_total / stats.wait_count * 1000, 3) if stats.wait_count else 0.0,
+                        "p95_ms": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 3) if waits else 0.0,
+                        "max_ms": round(stats.wait_max * 1000, 3),
+                        "timeouts": stats.timeouts
+                    },
+                    "hold": {
+                        "avg_ms": round(stats.hold_total / stats.checkouts * 1000, 3) if stats.checkouts else 0.0,
+                        "max_ms": round(stats.hold_max * 1000, 3)
+                    }
+                }
+        return {
+            "pools": pools,
+            "leak_threshold_seconds": self.leak_threshold,
+            "leaks_reported": self.leaks_reported,
+            "held_past_threshold": self.held_connections(self.leak_threshold)
+        }
+
+    @staticmethod
+    def _pool_state(pool: Optional[Pool]) -> Dict[str, Any]:
+        if not isinstance(pool, QueuePool):
+            return {"pool_class": type(pool).__name__ if pool is not None else None}
+        return {
+            "pool_class": type(pool).__name__,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # overflow() est négatif tant que le pool n'a pas atteint sa taille
+            "overflow": max(0, pool.overflow())
+        }
+
+
+# Instance partagée par l'API
+pool_monitor = PoolMonitor()
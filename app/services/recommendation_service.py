@@ -1,71 +1,81 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, not_, text
-from typing import List, Dict, Any, Tuple
+from sqlalchemy.orm import Session, contains_eager
+from typing import Awaitable, Callable, List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
 from datetime import datetime, timedelta
 import numpy as np
 from collections import Counter
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.cluster import KMeans
-import pickle
+import math
 import os
+import time
 
 from models import Passenger, Flight, Booking, Recommendation
-from services.passenger_service import PassengerService
+from services.model_registry import model_registry
+from services.online_clustering import MEMBER_CANDIDATES, nearest_members, passenger_clusters
+from services.flight_index import bookable_flight_index, is_bookable
+from services.embeddings import embedding_recommender
+from services.content_vectors import destination_content_vectors
+from services.destination_features import COMPOSITE_WEIGHTS, destination_feature_store
+from services.feature_store import passenger_feature_store
+from services.scoring import hybrid_scores, top_k_order
+from services.batch_loader import get_loaders, pipeline_loaders
+from services.trending import trending_destinations
+from services.cache import recommendation_cache
+from services.recommendation_store import recommendation_store
+from services.similarity import passenger_similarity_engine
+from schemas import RecommendationResponse
 
 logger = logging.getLogger(__name__)
 
+# Branches indépendantes du pipeline exécutées en parallèle, chacune bornée dans le temps (None: sans délai)
+STAGE_TIMEOUTS: Dict[str, Optional[float]] = {
+    "ml": float(os.getenv("RECOMMENDATION_ML_STAGE_TIMEOUT", "2.0")),
+    "realtime": float(os.getenv("RECOMMENDATION_REALTIME_STAGE_TIMEOUT", "1.0"))
+}
+# Une connexion du pool par branche en cours: au plus DB_POOL_SIZE branches à la fois,
+# le débordement du pool reste disponible pour les sessions des requêtes
+_stage_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RECOMMENDATION_STAGE_WORKERS", os.getenv("DB_POOL_SIZE", "5"))),
+    thread_name_prefix="recommendation-stage"
+)
+
+def encode_category(value: str, vocabulary: List[str]) -> int:
+    """Encoder une valeur catégorielle selon le vocabulaire d'entraînement (-1 si inconnue)"""
+    try:
+        return vocabulary.index(value)
+    except ValueError:
+        return -1
+
 class AdvancedRecommendationService:
     """Service de recommandation avancé avec modèles ML et optimisations temps réel"""
     
-    def __init__(self):
-        self.passenger_service = PassengerService()
-        self.scaler = StandardScaler()
-        self.tfidf_vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
-        self.model_cache = {}
-        self.ml_models = {}
-        self._initialize_ml_models()
+    def __init__(self, stage_timeouts: Optional[Dict[str, Optional[float]]] = None):
+        # Délais des branches: ceux de l'API par défaut, levés par les traitements hors ligne
+        self.stage_timeouts = {**STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        self._rng = np.random.default_rng()
         logger.info("🤖 Service de recommandation avancé avec ML initialisé")
     
-    def _initialize_ml_models(self):
-        """Initialiser les modèles ML pour les recommandations"""
-        try:
-            # Modèle de clustering des passagers
-            self.ml_models['passenger_clusters'] = KMeans(n_clusters=5, random_state=42)
-            
-            # Modèle de prédiction de préférences
-            self.ml_models['preference_predictor'] = RandomForestClassifier(
-                n_estimators=100, 
-                random_state=42,
-                max_depth=10
-            )
-            
-            logger.info("🧠 Modèles ML initialisés avec succès")
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur initialisation ML: {e}")
-    
-    async def get_recommendations_for_passenger(self, db: Session, passenger_id: int) -> List[Recommendation]:
+    async def get_recommendations_for_passenger(self, db: Session, passenger_id: int, limit: int = 10) -> List[RecommendationResponse]:
         """Récupérer les recommandations existantes pour un passager avec optimisation"""
         try:
-            # Requête optimisée avec jointure et cache
-            cache_key = f"recommendations_{passenger_id}"
-            
-            if cache_key in self.model_cache:
-                cached_time, cached_data = self.model_cache[cache_key]
-                if (datetime.now() - cached_time).seconds < 30:  # Cache 30 secondes
-                    return cached_data
-            
-            recommendations = db.query(Recommendation).filter(
-                Recommendation.passenger_id == passenger_id
-            ).order_by(Recommendation.score.desc(), Recommendation.created_at.desc()).all()
+            cache_key = ("recommendations", passenger_id, limit)
+            cached = recommendation_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+            
+            # Top-K servi par l'index (passenger_id, score DESC), vols chargés dans la même requête,
+            # sans les vols partis depuis la dernière passe de rétention
+            rows = db.query(Recommendation).join(Recommendation.flight).options(
+                contains_eager(Recommendation.flight)
+            ).filter(
+                Recommendation.passenger_id == passenger_id,
+                Flight.departure_time > datetime.now()
+            ).order_by(Recommendation.score.desc(), Recommendation.created_at.desc()).limit(limit).all()
             
-            # Mettre en cache
-            self.model_cache[cache_key] = (datetime.now(), recommendations)
+            # Mettre en cache des DTO détachés de la session
+            recommendations = [RecommendationResponse.model_validate(row) for row in rows]
+            recommendation_cache.set(cache_key, tuple(recommendations), group=passenger_id)
             
             logger.info(f"📋 {len(recommendations)} recommandations trouvées pour le passager {passenger_id}")
             return recommendations
@@ -74,46 +84,39 @@ class AdvancedRecommendationService:
             logger.error(f"❌ Erreur lors de la récupération des recommandations: {e}")
             return []
     
-    async def generate_recommendations(self, db: Session, passenger_id: int, limit: int = 5) -> List[Recommendation]:
+    async def generate_recommendations(
+        self,
+        db: Session,
+        passenger_id: int,
+        limit: int = 5,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Recommendation]:
         """Générer de nouvelles recommandations avec modèles ML avancés et temps réel"""
         try:
-            passenger = await self.passenger_service.get_passenger(db, passenger_id)
+            passenger = db.get(Passenger, passenger_id)
             if not passenger:
                 raise ValueError(f"Passager {passenger_id} non trouvé")
             
-            logger.info(f"🤖 Génération de recommandations ML pour {passenger.first_name} {passenger.last_name}")
-            
-            # 1. Analyser le profil passager avec ML
-            passenger_profile = await self._build_ml_passenger_profile(db, passenger)
-            
-            # 2. Clustering des passagers similaires
-            similar_passengers = await self._find_similar_passengers_ml(db, passenger, passenger_profile)
-            
-            # 3. Recommandations basées sur le ML
-            ml_recommendations = await self._generate_ml_recommendations(db, passenger, similar_passengers)
-            
-            # 4. Recommandations temps réel (tendances actuelles)
-            realtime_recommendations = await self._generate_realtime_recommendations(db, passenger)
-            
-            # 5. Combiner et scorer avec algorithme hybride
-            all_recommendations = ml_recommendations + realtime_recommendations
-            scored_recommendations = await self._score_recommendations_hybrid(db, passenger, all_recommendations)
-            
-            # 6. Sauvegarder les meilleures recommandations
-            saved_recommendations = []
-            for rec_data in scored_recommendations[:limit]:
-                recommendation = Recommendation(
-                    passenger_id=passenger_id,
-                    flight_id=rec_data['flight_id'],
-                    recommendation_type=rec_data['type'],
-                    score=rec_data['score'],
-                    reason=rec_data['reason'],
-                    created_at=datetime.now()
-                )
-                db.add(recommendation)
-                saved_recommendations.append(recommendation)
+            scored_recommendations = await self.compute_recommendations(db, passenger, limit, timings)
+            started = time.perf_counter()
+            
+            # Sauvegarder les meilleures recommandations (upsert sur passager/vol/type)
+            created_at = datetime.now()
+            saved_recommendations = recommendation_store.upsert(db, [
+                {
+                    "passenger_id": passenger_id,
+                    "flight_id": rec_data['flight_id'],
+                    "recommendation_type": rec_data['type'],
+                    "score": rec_data['score'],
+                    "reason": rec_data['reason'],
+                    "created_at": created_at
+                }
+                for rec_data in scored_recommendations
+            ])
             
             db.commit()
+            recommendation_cache.invalidate_group(passenger_id)
+            self._record_stage(timings, "persistence", started)
             
             logger.info(f"✅ {len(saved_recommendations)} recommandations ML générées et sauvegardées")
             return saved_recommendations
@@ -122,670 +125,205 @@ class AdvancedRecommendationService:
             logger.error(f"❌ Erreur génération recommandations ML: {e}")
             db.rollback()
             return []
-            
-            logger.info(f"🎯 Génération de recommandations ML pour {passenger.first_name} {passenger.last_name}")
-            
-            # Supprimer les anciennes recommandations (optimisé)
-            db.execute(text("DELETE FROM recommendations WHERE passenger_id = :pid"), {"pid": passenger_id})
-            
-            recommendations = []
-            
-            # 1. Recommandations basées sur ML - Collaborative Filtering
-            ml_recommendations = await self._ml_collaborative_filtering(db, passenger, limit=2)
-            recommendations.extend(ml_recommendations)
-            
-            # 2. Recommandations basées sur les préférences avec scoring avancé
-            dest_recommendations = await self._advanced_destination_scoring(db, passenger, limit=2)
-            recommendations.extend(dest_recommendations)
-            
-            # 3. Recommandations basées sur l'analyse prédictive des tendances
-            trend_recommendations = await self._predictive_trend_analysis(db, passenger, limit=1)
-            recommendations.extend(trend_recommendations)
-            
-            # Sauvegarder avec gestion d'erreur
-            saved_recommendations = []
-            for rec_data in recommendations[:limit]:
-                try:
-                    recommendation = Recommendation(**rec_data)
-                    db.add(recommendation)
-                    db.flush()
-                    saved_recommendations.append(recommendation)
-                except Exception as e:
-                    logger.error(f"❌ Erreur sauvegarde recommandation: {e}")
-                    continue
-            
-            db.commit()
-            logger.info(f"✅ {len(saved_recommendations)} recommandations ML générées et sauvegardées")
-            return saved_recommendations
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur génération recommandations: {e}")
-            db.rollback()
-            return []
     
-    async def _ml_collaborative_filtering(self, db: Session, passenger: Passenger, limit: int = 2) -> List[Dict]:
-        """Filtrage collaboratif basé sur l'apprentissage automatique"""
-        try:
-            # Construire la matrice passager-destination
-            passenger_destination_matrix = await self._build_passenger_destination_matrix(db)
-            
-            if passenger_destination_matrix.empty:
-                logger.warning("⚠️ Matrice passager-destination vide, utilisation fallback")
-                return await self._fallback_recommendations(db, passenger, limit)
-            
-            # Calculer la similarité cosinus entre passagers
-            similarity_matrix = await self._calculate_passenger_similarity(passenger_destination_matrix)
-            
-            # Trouver les passagers similaires
-            similar_passengers = await self._find_similar_passengers(db, passenger, similarity_matrix, top_k=10)
+    async def compute_recommendations(
+        self,
+        db: Session,
+        passenger: Passenger,
+        limit: int = 5,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
+        """Calculer (sans les sauvegarder) les meilleures recommandations d'un passager
+        
+        Si `timings` est fourni, la durée de chaque étape (secondes) y est enregistrée.
+        """
+        logger.info(f"🤖 Génération de recommandations ML pour {passenger.first_name} {passenger.last_name}")
+        
+        # 1-3. Profil, clustering et recommandations ML / 4. Tendances temps réel :
+        # deux branches indépendantes, en parallèle sur le pool, chacune avec sa session
+        ml_recommendations, realtime_recommendations = await asyncio.gather(
+            self._run_stage(db, passenger.id, "ml", self._ml_stage, timings),
+            self._run_stage(db, passenger.id, "realtime", self._realtime_stage, timings)
+        )
+        
+        # Vols et passagers chargés au plus une fois pour le scoring
+        with pipeline_loaders(db) as loaders:
+            loaders.passengers.prime(passenger)
+            started = time.perf_counter()
             
-            # Recommander des destinations basées sur les passagers similaires
-            recommendations = []
-            for similar_passenger_id, similarity_score in similar_passengers:
-                similar_destinations = await self._get_passenger_popular_destinations(db, similar_passenger_id)
-                
-                for dest, frequency in similar_destinations[:limit]:
-                    if dest not in (passenger.preferred_destinations or []):
-                        # Trouver un vol vers cette destination
-                        flight = await self._find_optimal_flight_to_destination(db, dest, passenger)
-                        
-                        if flight:
-                            score = min(0.95, similarity_score * frequency * 0.1)
-                            recommendations.append({
-                                "passenger_id": passenger.id,
-                                "flight_id": flight.id,
-                                "recommendation_type": "ML_COLLABORATIVE",
-                                "score": round(score, 2),
-                                "reason": f"Recommandé par ML - Passagers similaires visitent {dest} (score: {score:.2f})"
-                            })
-                            
-                            if len(recommendations) >= limit:
-                                break
-                
-                if len(recommendations) >= limit:
-                    break
-            
-            logger.info(f"🤖 {len(recommendations)} recommandations ML collaborative générées")
-            return recommendations
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur filtrage collaboratif: {e}")
-            return await self._fallback_recommendations(db, passenger, limit)
-    
-    async def _build_passenger_destination_matrix(self, db: Session) -> pd.DataFrame:
-        """Construire la matrice passager-destination pour ML"""
-        try:
-            # Requête optimisée pour récupérer les données
-            query = text("""
-                SELECT p.id as passenger_id, f.destination, COUNT(*) as visit_count
-                FROM passengers p
-                JOIN bookings b ON p.id = b.passenger_id
-                JOIN flights f ON b.flight_id = f.id
-                WHERE f.status = 'DEPARTED'
-                GROUP BY p.id, f.destination
-                HAVING COUNT(*) > 0
-            """)
-            
-            result = db.execute(query).fetchall()
-            
-            if not result:
-                return pd.DataFrame()
-            
-            # Créer le DataFrame
-            data = [{"passenger_id": row[0], "destination": row[1], "visit_count": row[2]} for row in result]
-            df = pd.DataFrame(data)
-            
-            # Pivoter pour créer la matrice
-            matrix = df.pivot(index='passenger_id', columns='destination', values='visit_count').fillna(0)
-            
-            logger.info(f"📊 Matrice ML construite: {matrix.shape[0]} passagers x {matrix.shape[1]} destinations")
-            return matrix
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur construction matrice: {e}")
-            return pd.DataFrame()
-    
-    async def _calculate_passenger_similarity(self, matrix: pd.DataFrame) -> np.ndarray:
-        """Calculer la similarité entre passagers avec optimisation"""
-        try:
-            if matrix.empty:
-                return np.array([])
-            
-            # Normaliser les données
-            normalized_matrix = self.scaler.fit_transform(matrix.values)
-            
-            # Calculer la similarité cosinus
-            similarity_matrix = cosine_similarity(normalized_matrix)
-            
-            logger.info(f"🔗 Matrice de similarité calculée: {similarity_matrix.shape}")
-            return similarity_matrix
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur calcul similarité: {e}")
-            return np.array([])
-    
-    async def _advanced_destination_scoring(self, db: Session, passenger: Passenger, limit: int = 2) -> List[Dict]:
-        """Scoring avancé des destinations avec facteurs multiples"""
-        try:
-            recommendations = []
-            preferred_destinations = passenger.preferred_destinations or []
-            
-            # Scoring multi-critères pour chaque destination préférée
-            for destination in preferred_destinations:
-                # Facteurs de scoring
-                seasonal_factor = await self._calculate_seasonal_factor(destination)
-                price_factor = await self._calculate_price_attractiveness(db, destination)
-                availability_factor = await self._calculate_availability_factor(db, destination)
-                popularity_factor = await self._calculate_destination_popularity(db, destination)
-                
-                # Score composite
-                composite_score = (
-                    seasonal_factor * 0.3 +
-                    price_factor * 0.25 +
-                    availability_factor * 0.25 +
-                    popularity_factor * 0.2
-                )
-                
-                # Trouver le meilleur vol
-                flight = await self._find_optimal_flight_to_destination(db, destination, passenger)
-                
-                if flight and composite_score > 0.6:  # Seuil de qualité
-                    recommendations.append({
-                        "passenger_id": passenger.id,
-                        "flight_id": flight.id,
-                        "recommendation_type": "ADVANCED_SCORING",
-                        "score": round(composite_score, 2),
-                        "reason": f"Destination optimale {destination} - Score composite: {composite_score:.2f} (saisonnier: {seasonal_factor:.2f}, prix: {price_factor:.2f})"
-                    })
-                    
-                    if len(recommendations) >= limit:
-                        break
-            
-            logger.info(f"📈 {len(recommendations)} recommandations avec scoring avancé générées")
-            return recommendations
+            # 5. Combiner et scorer avec algorithme hybride
+            all_recommendations = ml_recommendations + realtime_recommendations
+            scored_recommendations = await self._score_recommendations_hybrid(db, passenger, all_recommendations, limit)
+            self._record_stage(timings, "hybrid_scoring", started)
             
-        except Exception as e:
-            logger.error(f"❌ Erreur scoring avancé: {e}")
-            return []
+            logger.info(f"🗂️ Pipeline: {loaders.queries} requêtes de chargement groupé")
+        
+        return scored_recommendations[:limit]
     
-    async def _predictive_trend_analysis(self, db: Session, passenger: Passenger, limit: int = 1) -> List[Dict]:
-        """Analyse prédictive des tendances de voyage"""
-        try:
-            # Analyser les tendances récentes (30 derniers jours)
-            trend_query = text("""
-                SELECT f.destination, COUNT(*) as booking_count,
-                       AVG(EXTRACT(epoch FROM (f.departure_time - b.booking_date))/86400) as avg_booking_lead_time
-                FROM bookings b
-                JOIN flights f ON b.flight_id = f.id
-                WHERE b.booking_date >= NOW() - INTERVAL '30 days'
-                AND f.status IN ('SCHEDULED', 'DEPARTED')
-                GROUP BY f.destination
-                HAVING COUNT(*) >= 3
-                ORDER BY booking_count DESC, avg_booking_lead_time ASC
-                LIMIT 10
-            """)
-            
-            trends = db.execute(trend_query).fetchall()
-            
-            recommendations = []
-            for trend in trends:
-                destination, booking_count, avg_lead_time = trend
-                
-                # Calculer le score de tendance
-                trend_score = min(0.9, (booking_count / 20) * 0.8 + (1.0 / max(1, avg_lead_time)) * 0.2)
-                
-                # Éviter les destinations déjà visitées
-                if destination not in (passenger.preferred_destinations or []):
-                    flight = await self._find_optimal_flight_to_destination(db, destination, passenger)
-                    
-                    if flight and trend_score > 0.5:
-                        recommendations.append({
-                            "passenger_id": passenger.id,
-                            "flight_id": flight.id,
-                            "recommendation_type": "PREDICTIVE_TREND",
-                            "score": round(trend_score, 2),
-                            "reason": f"Tendance émergente: {destination} - {booking_count} réservations récentes, score: {trend_score:.2f}"
-                        })
-                        
-                        if len(recommendations) >= limit:
-                            break
-            
-            logger.info(f"📊 {len(recommendations)} recommandations prédictives générées")
+    async def _ml_stage(self, db: Session, passenger: Passenger, deadline: float,
+                        timings: Dict[str, float]) -> List[Dict]:
+        """Branche ML: profil, passagers similaires, recommandations collaboratives et par embeddings"""
+        started = time.perf_counter()
+        if self._is_cold_start(passenger):
+            # Sans historique: recommandations par contenu, sans lire les tables de réservations
+            recommendations = await self._generate_content_recommendations(db, passenger)
+            self._record_stage(timings, "content_recommendations", started)
             return recommendations
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur analyse prédictive: {e}")
-            return []
-            recommendation = Recommendation(**rec_data)
-            db.add(recommendation)
         
-        db.commit()
-        
-        # Récupérer les recommandations créées
-        created_recommendations = await self.get_recommendations_for_passenger(db, passenger_id)
-        
-        logger.info(f"Généré {len(created_recommendations)} recommandations pour le passager {passenger_id}")
-        return created_recommendations
-    
-    async def find_similar_passengers(self, db: Session, passenger_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Trouver des passagers similaires basés sur les préférences et l'historique"""
-        passenger = await self.passenger_service.get_passenger(db, passenger_id)
-        if not passenger:
+        # Délai dépassé entre deux étapes: s'arrêter pour rendre le thread et la connexion
+        passenger_profile = await self._build_ml_passenger_profile(db, passenger)
+        started = self._record_stage(timings, "profile", started)
+        if time.monotonic() >= deadline:
             return []
         
-        # Récupérer l'historique de voyage du passager
-        passenger_flights = db.query(Flight.destination).join(Booking).filter(
-            Booking.passenger_id == passenger_id
-        ).all()
-        passenger_destinations = set(dest[0] for dest in passenger_flights)
-        
-        # Trouver des passagers avec des destinations similaires
-        similar_passengers = []
-        
-        all_passengers = db.query(Passenger).filter(Passenger.id != passenger_id).all()
-        
-        for other_passenger in all_passengers:
-            similarity_score = await self._calculate_passenger_similarity(
-                db, passenger, other_passenger, passenger_destinations
-            )
-            
-            if similarity_score > 0.3:  # Seuil de similarité
-                similar_passengers.append({
-                    "passenger": other_passenger,
-                    "similarity_score": similarity_score
-                })
-        
-        # Trier par score de similarité
-        similar_passengers.sort(key=lambda x: x["similarity_score"], reverse=True)
-        
-        return similar_passengers[:limit]
-    
-    async def _recommend_by_preferred_destinations(self, db: Session, passenger: Passenger, limit: int) -> List[Dict[str, Any]]:
-        """Recommandations basées on les destinations préférées"""
-        recommendations = []
+        similar_passengers = await self._find_similar_passengers_ml(db, passenger, passenger_profile)
+        started = self._record_stage(timings, "clustering", started)
+        if time.monotonic() >= deadline:
+            return []
         
-        if not passenger.preferred_destinations:
+        recommendations = await self._generate_ml_recommendations(db, passenger, similar_passengers)
+        started = self._record_stage(timings, "ml_recommendations", started)
+        if time.monotonic() >= deadline:
             return recommendations
         
-        # Trouver des vols vers les destinations préférées
-        future_flights = db.query(Flight).filter(
-            and_(
-                Flight.destination.in_(passenger.preferred_destinations),
-                Flight.departure_time > datetime.now(),
-                # Exclure les vols déjà réservés
-                not_(Flight.id.in_(
-                    db.query(Booking.flight_id).filter(Booking.passenger_id == passenger.id)
-                ))
-            )
-        ).order_by(Flight.departure_time).limit(limit).all()
-        
-        for flight in future_flights:
-            recommendations.append({
-                "passenger_id": passenger.id,
-                "flight_id": flight.id,
-                "recommendation_type": "PREFERRED_DESTINATION",
-                "score": 0.9,
-                "reason": f"Destination préférée: {flight.destination}"
-            })
+        recommendations += await self._generate_embedding_recommendations(db, passenger)
+        started = self._record_stage(timings, "embedding_recommendations", started)
+        if time.monotonic() >= deadline:
+            return recommendations
         
+        recommendations += await self._generate_destination_recommendations(db, passenger)
+        self._record_stage(timings, "destination_scoring", started)
         return recommendations
     
-    async def _recommend_by_similar_passengers(self, db: Session, passenger: Passenger, limit: int) -> List[Dict[str, Any]]:
-        """Recommandations basées sur des passagers similaires"""
-        similar_passengers = await self.find_similar_passengers(db, passenger.id, limit=5)
+    async def _realtime_stage(self, db: Session, passenger: Passenger, deadline: float,
+                              timings: Dict[str, float]) -> List[Dict]:
+        """Branche temps réel: vols vers les destinations tendance"""
+        return await self._generate_realtime_recommendations(db, passenger, deadline)
+    
+    async def _run_stage(
+        self,
+        db: Session,
+        passenger_id: int,
+        name: str,
+        stage: Callable[[Session, Passenger, float, Dict[str, float]], Awaitable[List[Dict]]],
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
+        """Exécuter une branche sur le pool avec sa propre session ; [] si elle dépasse son délai"""
+        bind = db.get_bind()
+        timeout = self.stage_timeouts[name]
+        deadline = time.monotonic() + timeout if timeout is not None else math.inf
+        # Durées propres à la branche, reportées seulement si elle aboutit à temps
+        stage_timings: Dict[str, float] = {}
+        
+        async def run_in_session(stage_db: Session) -> List[Dict]:
+            with pipeline_loaders(stage_db) as loaders:
+                stage_passenger = loaders.passengers.prime(stage_db.get(Passenger, passenger_id))
+                if stage_passenger is None:
+                    return []
+                return await stage(stage_db, stage_passenger, deadline, stage_timings)
+        
+        def run() -> List[Dict]:
+            # Délai écoulé dans la file du pool: ne pas ouvrir de session pour un résultat ignoré
+            if time.monotonic() >= deadline:
+                return []
+            with Session(bind=bind, autoflush=False) as stage_db:
+                return asyncio.run(run_in_session(stage_db))
         
-        if not similar_passengers:
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            recommendations = await asyncio.wait_for(loop.run_in_executor(_stage_executor, run), timeout)
+            if timings is not None:
+                timings.update(stage_timings)
+            return recommendations
+        except asyncio.TimeoutError:
+            # La branche s'arrête à sa prochaine vérification du délai, son résultat est ignoré
+            logger.warning(f"⏱️ Étape {name} au-delà de {timeout}s, résultats partiels")
+            return []
+        except Exception as e:
+            logger.error(f"❌ Erreur étape {name}: {e}")
+            return []
+        finally:
+            # Durée vue par le pipeline (attente du pool et délai dépassé compris)
+            self._record_stage(timings, f"{name}_branch", started)
+    
+    @staticmethod
+    def _record_stage(timings: Optional[Dict[str, float]], stage: str, started: float) -> float:
+        """Noter la durée d'une étape du pipeline et renvoyer le nouvel instant de départ"""
+        now = time.perf_counter()
+        if timings is not None:
+            timings[stage] = now - started
+        return now
+    
+    async def find_similar_passengers(
+        self,
+        db: Session,
+        passenger_id: int,
+        limit: int = 10,
+        skip: int = 0,
+        min_score: float = 0.3,
+        method: str = "auto"
+    ) -> List[Dict[str, Any]]:
+        """Trouver des passagers similaires basés sur les préférences et l'historique (score vectorisé)"""
+        passenger = db.get(Passenger, passenger_id)
+        if not passenger:
             return []
         
-        # Récupérer les destinations populaires parmi les passagers similaires
-        popular_destinations = Counter()
-        
-        for sim_passenger in similar_passengers:
-            other_flights = db.query(Flight.destination).join(Booking).filter(
-                Booking.passenger_id == sim_passenger["passenger"].id
-            ).all()
-            
-            for dest in other_flights:
-                popular_destinations[dest[0]] += sim_passenger["similarity_score"]
-        
-        # Trouver des vols vers ces destinations populaires
-        recommendations = []
-        
-        for destination, popularity in popular_destinations.most_common(limit):
-            # Vérifier si le passager n'a pas déjà visité cette destination
-            already_visited = db.query(Booking).join(Flight).filter(
-                and_(
-                    Booking.passenger_id == passenger.id,
-                    Flight.destination == destination
-                )
-            ).first()
-            
-            if not already_visited:
-                future_flight = db.query(Flight).filter(
-                    and_(
-                        Flight.destination == destination,
-                        Flight.departure_time > datetime.now()
-                    )
-                ).first()
-                
-                if future_flight:
-                    recommendations.append({
-                        "passenger_id": passenger.id,
-                        "flight_id": future_flight.id,
-                        "recommendation_type": "SIMILAR_PASSENGERS",
-                        "score": min(0.8, popularity / 10),
-                        "reason": f"Destination populaire parmi les passagers similaires: {destination}"
-                    })
-        
-        return recommendations
-    
-    async def _recommend_by_trends(self, db: Session, passenger: Passenger, limit: int) -> List[Dict[str, Any]]:
-        """Recommandations basées sur les tendances et la saisonnalité"""
-        # Trouver les destinations en tendance (beaucoup de réservations récentes)
-        recent_bookings = db.query(
-            Flight.destination, func.count(Booking.id).label('booking_count')
-        ).join(Booking).filter(
-            Booking.booking_date >= datetime.now() - timedelta(days=30)
-        ).group_by(Flight.destination).order_by(
-            func.count(Booking.id).desc()
-        ).limit(limit).all()
-        
-        recommendations = []
-        
-        for destination, booking_count in recent_bookings:
-            # Vérifier si le passager n'a pas déjà visité
-            already_visited = db.query(Booking).join(Flight).filter(
-                and_(
-                    Booking.passenger_id == passenger.id,
-                    Flight.destination == destination
-                )
-            ).first()
-            
-            if not already_visited:
-                future_flight = db.query(Flight).filter(
-                    and_(
-                        Flight.destination == destination,
-                        Flight.departure_time > datetime.now()
-                    )
-                ).first()
-                
-                if future_flight:
-                    recommendations.append({
-                        "passenger_id": passenger.id,
-                        "flight_id": future_flight.id,
-                        "recommendation_type": "TRENDING_DESTINATION",
-                        "score": min(0.7, booking_count / 50),
-                        "reason": f"Destination tendance avec {booking_count} réservations récentes: {destination}"
-                    })
-        
-        return recommendations
-    
-    async def _calculate_passenger_similarity(
-        self, 
-        db: Session, 
-        passenger1: Passenger, 
-        passenger2: Passenger, 
-        passenger1_destinations: set
-    ) -> float:
-        """Calculer la similarité entre deux passagers"""
-        score = 0.0
-        
-        # Similarité de nationalité
-        if passenger1.nationality == passenger2.nationality:
-            score += 0.2
-        
-        # Similarité de classe de voyage préférée
-        if passenger1.travel_class_preference == passenger2.travel_class_preference:
-            score += 0.2
+        passenger_similarity_engine.ensure_fresh(db)
         
-        # Similarité des destinations préférées
-        if passenger1.preferred_destinations and passenger2.preferred_destinations:
-            common_prefs = set(passenger1.preferred_destinations) & set(passenger2.preferred_destinations)
-            if common_prefs:
-                score += 0.3 * (len(common_prefs) / max(len(passenger1.preferred_destinations), len(passenger2.preferred_destinations)))
+        # Historique du passager cible relu en base (peut être plus récent que le moteur)
+        visited = {
+            dest[0] for dest in db.query(Flight.destination).join(Booking).filter(
+                Booking.passenger_id == passenger_id
+            ).distinct().all()
+        }
         
-        # Similarité des destinations visitées
-        passenger2_flights = db.query(Flight.destination).join(Booking).filter(
-            Booking.passenger_id == passenger2.id
-        ).all()
-        passenger2_destinations = set(dest[0] for dest in passenger2_flights)
+        neighbours, total = passenger_similarity_engine.similar(
+            passenger, visited, min_score=min_score, skip=skip, limit=limit, method=method
+        )
+        if not neighbours:
+            return []
         
-        if passenger1_destinations and passenger2_destinations:
-            common_visited = passenger1_destinations & passenger2_destinations
-            if common_visited:
-                score += 0.3 * (len(common_visited) / len(passenger1_destinations | passenger2_destinations))
+        passengers = {
+            p.id: p for p in db.query(Passenger).filter(Passenger.id.in_([pid for pid, _ in neighbours])).all()
+        }
         
-        return min(1.0, score)
+        logger.info(f"👥 {total} passagers similaires (score > {min_score}), page {skip}-{skip + len(neighbours)}")
+        return [
+            {"passenger": passengers[pid], "similarity_score": round(score, 3)}
+            for pid, score in neighbours
+            if pid in passengers
+        ]
     
     # === MÉTHODES DE SUPPORT POUR ML ===
     
-    async def _find_similar_passengers(self, db: Session, passenger: Passenger, similarity_matrix: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
-        """Trouver les passagers les plus similaires"""
-        try:
-            # Obtenir l'index du passager dans la matrice
-            passenger_ids = db.execute(text("SELECT DISTINCT id FROM passengers ORDER BY id")).fetchall()
-            passenger_id_list = [pid[0] for pid in passenger_ids]
-            
-            if passenger.id not in passenger_id_list:
-                return []
-            
-            passenger_index = passenger_id_list.index(passenger.id)
-            
-            # Obtenir les scores de similarité
-            similarities = similarity_matrix[passenger_index]
-            
-            # Trier et retourner les top K (excluant le passager lui-même)
-            similar_indices = np.argsort(similarities)[::-1][1:top_k+1]
-            
-            similar_passengers = []
-            for idx in similar_indices:
-                if similarities[idx] > 0.1:  # Seuil de similarité minimum
-                    similar_passenger_id = passenger_id_list[idx]
-                    similar_passengers.append((similar_passenger_id, similarities[idx]))
-            
-            return similar_passengers
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur recherche passagers similaires: {e}")
-            return []
-    
-    async def _get_passenger_popular_destinations(self, db: Session, passenger_id: int) -> List[Tuple[str, int]]:
-        """Obtenir les destinations populaires d'un passager"""
-        try:
-            query = text("""
-                SELECT f.destination, COUNT(*) as frequency
-                FROM bookings b
-                JOIN flights f ON b.flight_id = f.id
-                WHERE b.passenger_id = :pid
-                AND f.status = 'DEPARTED'
-                GROUP BY f.destination
-                ORDER BY frequency DESC
-                LIMIT 5
-            """)
-            
-            result = db.execute(query, {"pid": passenger_id}).fetchall()
-            return [(row[0], row[1]) for row in result]
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur destinations populaires: {e}")
-            return []
-    
-    async def _find_optimal_flight_to_destination(self, db: Session, destination: str, passenger: Passenger) -> Flight:
-        """Trouver le vol optimal vers une destination"""
+    async def _find_optimal_flights(self, db: Session, destinations: List[str], passenger: Passenger) -> Dict[str, Flight]:
+        """Vol optimal de plusieurs destinations: index en mémoire puis un seul chargement groupé"""
         try:
-            # Critères de sélection: futur, disponible, classe préférée
+            # Critères de sélection: futur, disponible, classe préférée (tri maintenu par l'index)
+            if not bookable_flight_index.is_loaded:
+                bookable_flight_index.build(db)
             preferred_class = passenger.travel_class_preference or "ECONOMY"
-            
-            query = text("""
-                SELECT f.* FROM flights f
-                WHERE f.destination = :dest
-                AND f.departure_time > NOW()
-                AND f.status = 'SCHEDULED'
-                AND f.occupied_seats < f.capacity
-                ORDER BY 
-                    CASE WHEN :pref_class = 'BUSINESS' AND f.price > 800 THEN 1 ELSE 2 END,
-                    (f.capacity - f.occupied_seats) DESC,
-                    f.departure_time ASC
-                LIMIT 1
-            """)
-            
-            result = db.execute(query, {"dest": destination, "pref_class": preferred_class}).fetchone()
-            
-            if result:
-                # Convertir le résultat en objet Flight
-                return db.query(Flight).filter(Flight.id == result[0]).first()
-            
-            return None
+            best_ids = bookable_flight_index.best_many(destinations, preferred_class)
+            
+            loaded = await get_loaders(db).flights.load_many(list(best_ids.values()))
+            flights = {}
+            for (destination, flight_id), flight in zip(best_ids.items(), loaded):
+                if flight is not None and is_bookable(flight):
+                    flights[destination] = flight
+                elif flight is None:
+                    bookable_flight_index.remove_flight(flight_id)
+                else:
+                    # Index en retard sur la base: le corriger et rechercher à nouveau
+                    bookable_flight_index.upsert_flight(flight)
+                    retry = await self._find_optimal_flights(db, [destination], passenger)
+                    if destination in retry:
+                        flights[destination] = retry[destination]
+            return flights
             
         except Exception as e:
             logger.error(f"❌ Erreur recherche vol optimal: {e}")
-            return None
-    
-    async def _calculate_seasonal_factor(self, destination: str) -> float:
-        """Calculer le facteur saisonnier pour une destination"""
-        try:
-            current_month = datetime.now().month
-            
-            # Facteurs saisonniers par destination (simulation réaliste)
-            seasonal_factors = {
-                "Dubai": [0.9, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.4, 0.6, 0.8, 0.9, 1.0],
-                "London": [0.6, 0.6, 0.7, 0.8, 0.9, 1.0, 1.0, 1.0, 0.9, 0.8, 0.7, 0.6],
-                "New York": [0.7, 0.7, 0.8, 0.9, 1.0, 1.0, 0.9, 0.9, 1.0, 0.9, 0.8, 0.7],
-                "Tokyo": [0.8, 0.8, 0.9, 1.0, 0.9, 0.8, 0.7, 0.8, 0.9, 1.0, 0.9, 0.8],
-                "Sydney": [1.0, 1.0, 0.9, 0.8, 0.7, 0.6, 0.6, 0.7, 0.8, 0.9, 1.0, 1.0]
-            }
-            
-            if destination in seasonal_factors:
-                return seasonal_factors[destination][current_month - 1]
-            
-            return 0.8  # Facteur par défaut
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur facteur saisonnier: {e}")
-            return 0.8
-    
-    async def _calculate_price_attractiveness(self, db: Session, destination: str) -> float:
-        """Calculer l'attractivité prix pour une destination"""
-        try:
-            query = text("""
-                SELECT AVG(price) as avg_price, MIN(price) as min_price, MAX(price) as max_price
-                FROM flights
-                WHERE destination = :dest
-                AND departure_time > NOW()
-                AND status = 'SCHEDULED'
-            """)
-            
-            result = db.execute(query, {"dest": destination}).fetchone()
-            
-            if result and result[0]:
-                avg_price, min_price, max_price = result
-                
-                # Score inversement proportionnel au prix (normalisé)
-                if max_price > min_price:
-                    price_range = max_price - min_price
-                    normalized_price = (avg_price - min_price) / price_range
-                    return max(0.1, 1.0 - normalized_price)
-                
-            return 0.7  # Score par défaut
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur attractivité prix: {e}")
-            return 0.7
-    
-    async def _calculate_availability_factor(self, db: Session, destination: str) -> float:
-        """Calculer le facteur de disponibilité"""
-        try:
-            query = text("""
-                SELECT AVG(CAST(capacity - occupied_seats AS FLOAT) / capacity) as avg_availability
-                FROM flights
-                WHERE destination = :dest
-                AND departure_time > NOW()
-                AND status = 'SCHEDULED'
-                AND capacity > 0
-            """)
-            
-            result = db.execute(query, {"dest": destination}).fetchone()
-            
-            if result and result[0]:
-                return min(1.0, max(0.1, result[0]))
-            
-            return 0.5  # Facteur par défaut
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur facteur disponibilité: {e}")
-            return 0.5
-    
-    async def _calculate_destination_popularity(self, db: Session, destination: str) -> float:
-        """Calculer la popularité d'une destination"""
-        try:
-            query = text("""
-                SELECT COUNT(*) as booking_count
-                FROM bookings b
-                JOIN flights f ON b.flight_id = f.id
-                WHERE f.destination = :dest
-                AND b.booking_date >= NOW() - INTERVAL '90 days'
-            """)
-            
-            result = db.execute(query, {"dest": destination}).fetchone()
-            
-            if result and result[0]:
-                booking_count = result[0]
-                # Normaliser par rapport à une base de 50 réservations
-                return min(1.0, booking_count / 50.0)
-            
-            return 0.3  # Popularité par défaut
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur popularité destination: {e}")
-            return 0.3
-    
-    async def _fallback_recommendations(self, db: Session, passenger: Passenger, limit: int) -> List[Dict]:
-        """Recommandations de fallback en cas d'échec ML"""
-        try:
-            logger.info("🔄 Utilisation des recommandations de fallback")
-            
-            recommendations = []
-            
-            # Recommandations basées sur les destinations populaires générales
-            popular_query = text("""
-                SELECT f.destination, COUNT(*) as popularity, AVG(f.price) as avg_price
-                FROM flights f
-                JOIN bookings b ON f.id = b.flight_id
-                WHERE f.departure_time > NOW()
-                AND f.status = 'SCHEDULED'
-                GROUP BY f.destination
-                HAVING COUNT(*) >= 3
-                ORDER BY popularity DESC
-                LIMIT 5
-            """)
-            
-            popular_destinations = db.execute(popular_query).fetchall()
-            
-            for dest_info in popular_destinations:
-                destination, popularity, avg_price = dest_info
-                
-                # Éviter les destinations déjà préférées
-                if destination not in (passenger.preferred_destinations or []):
-                    flight = await self._find_optimal_flight_to_destination(db, destination, passenger)
-                    
-                    if flight:
-                        score = min(0.8, popularity / 10.0)
-                        recommendations.append({
-                            "passenger_id": passenger.id,
-                            "flight_id": flight.id,
-                            "recommendation_type": "POPULAR_DESTINATION",
-                            "score": round(score, 2),
-                            "reason": f"Destination populaire: {destination} - {popularity} réservations récentes"
-                        })
-                        
-                        if len(recommendations) >= limit:
-                            break
-            
-            return recommendations
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur recommandations fallback: {e}")
-            return []
+            return {}
     
     async def _build_ml_passenger_profile(self, db: Session, passenger: Passenger) -> Dict[str, Any]:
         """Construire un profil ML détaillé du passager"""
@@ -801,7 +339,8 @@ class AdvancedRecommendationService:
                 'travel_frequency': len(bookings) / max(1, (datetime.now() - passenger.created_at).days / 30),
                 'loyalty_score': self._calculate_loyalty_score(passenger, bookings),
                 'price_sensitivity': self._estimate_price_sensitivity(bookings),
-                'seasonal_preferences': self._analyze_seasonal_patterns(bookings)
+                'seasonal_preferences': self._analyze_seasonal_patterns(bookings),
+                'predicted_destination': self._predict_preferred_destination(passenger, len(bookings))
             }
             
             logger.info(f"👤 Profil ML construit: loyalty={profile['loyalty_score']:.2f}, frequency={profile['travel_frequency']:.2f}")
@@ -812,83 +351,109 @@ class AdvancedRecommendationService:
             return {}
     
     async def _find_similar_passengers_ml(self, db: Session, passenger: Passenger, profile: Dict) -> List[Passenger]:
-        """Trouver des passagers similaires avec clustering ML"""
+        """Trouver des passagers similaires via l'index cluster -> passagers du clustering incrémental"""
         try:
-            # Récupérer tous les passagers avec leurs profils
-            all_passengers = db.query(Passenger).limit(1000).all()  # Limite pour performance
-            
-            # Créer une matrice de caractéristiques
-            features_matrix = []
-            passenger_ids = []
-            
-            for p in all_passengers:
-                if p.id == passenger.id:
-                    continue
-                    
-                # Calculer des caractéristiques comparables
-                p_bookings = db.query(Booking).filter(Booking.passenger_id == p.id).count()
-                
-                features = [
-                    p_bookings,
-                    len(p.preferred_destinations or []),
-                    1 if p.travel_class_preference == passenger.travel_class_preference else 0,
-                    1 if p.nationality == passenger.nationality else 0
-                ]
-                
-                features_matrix.append(features)
-                passenger_ids.append(p.id)
+            if passenger_clusters.cluster_for(passenger.id) is not None:
+                similar_passenger_ids = passenger_clusters.cluster_members(passenger.id, limit=10)
+                source = "clustering incrémental"
+            else:
+                # Passager pas encore intégré: clustering publié par train.py
+                similar_passenger_ids = self._published_cluster_members(passenger, profile)
+                source = f"modèles {model_registry.version}"
             
-            if len(features_matrix) < 2:
-                return []
+            similar_passengers = [
+                p for p in await get_loaders(db).passengers.load_many(similar_passenger_ids) if p is not None
+            ]
             
-            # Clustering avec KMeans
-            features_array = np.array(features_matrix)
-            if features_array.shape[0] > 5:  # Minimum pour clustering
-                clusters = self.ml_models['passenger_clusters'].fit_predict(features_array)
-                
-                # Trouver le cluster du passager cible
-                target_features = [
-                    profile['total_flights'],
-                    len(profile['destination_preferences']),
-                    1,  # Même classe
-                    1   # Même nationalité
-                ]
-                
-                target_cluster = self.ml_models['passenger_clusters'].predict([target_features])[0]
-                
-                # Récupérer les passagers du même cluster
-                similar_passenger_ids = [passenger_ids[i] for i, cluster in enumerate(clusters) if cluster == target_cluster]
-                similar_passengers = db.query(Passenger).filter(Passenger.id.in_(similar_passenger_ids[:10])).all()
-                
-                logger.info(f"🎯 {len(similar_passengers)} passagers similaires trouvés via ML")
-                return similar_passengers
-            
-            return []
+            logger.info(f"🎯 {len(similar_passengers)} passagers similaires trouvés via ML ({source})")
+            return similar_passengers
             
         except Exception as e:
             logger.error(f"❌ Erreur recherche passagers similaires ML: {e}")
             return []
     
+    def _ensure_trending(self, db: Session) -> None:
+        """Remplir les compteurs de tendances à la demande si le démarrage ne l'a pas fait"""
+        if not trending_destinations.is_loaded:
+            trending_destinations.backfill(db)
+    
+    def _published_cluster_members(self, passenger: Passenger, profile: Dict, limit: int = 10) -> List[int]:
+        """Passagers du même cluster selon le modèle publié (affectations calculées à l'entraînement)"""
+        model_registry.maybe_reload()
+        # Une seule lecture: un rechargement à chaud ne mélange pas le KMeans d'une version et les tableaux d'une autre
+        snapshot = model_registry.snapshot(
+            models=('passenger_clusters',),
+            arrays=('cluster_passenger_ids', 'cluster_offsets', 'cluster_features')
+        )
+        kmeans = snapshot.models['passenger_clusters']
+        cluster_passenger_ids = snapshot.arrays['cluster_passenger_ids']
+        cluster_offsets = snapshot.arrays['cluster_offsets']
+        if kmeans is None or cluster_passenger_ids is None or cluster_offsets is None:
+            logger.warning("⚠️ Passager hors clustering incrémental et aucun modèle publié (lancer train.py)")
+            return []
+        
+        target_features = self._encode_passenger_features(
+            passenger, profile.get('total_flights', 0), snapshot.metadata.get('encodings', {})
+        )
+        target_cluster = kmeans.predict([target_features])[0]
+        # Échantillon aléatoire borné du cluster: seules les lignes lues du tableau projeté sont chargées
+        start, end = int(cluster_offsets[target_cluster]), int(cluster_offsets[target_cluster + 1])
+        positions = np.arange(start, end)
+        if end - start > MEMBER_CANDIDATES:
+            positions = np.sort(self._rng.choice(positions, size=MEMBER_CANDIDATES, replace=False))
+        cluster_ids = cluster_passenger_ids[positions]
+        keep = cluster_ids != passenger.id
+        cluster_features = snapshot.arrays['cluster_features']
+        if cluster_features is None:
+            # Version publiée sans caractéristiques: ordre aléatoire plutôt que les plus petits ids
+            return [int(pid) for pid in self._rng.permutation(cluster_ids[keep])[:limit]]
+        return nearest_members(target_features, cluster_ids[keep], cluster_features[positions][keep], limit)
+    
+    def _encode_passenger_features(self, passenger: Passenger, booking_count: int,
+                                   encodings: Dict[str, List[str]]) -> List[float]:
+        """Vecteur de caractéristiques d'un passager, encodé comme à l'entraînement de la version lue"""
+        return [
+            booking_count,
+            len(passenger.preferred_destinations or []),
+            encode_category(passenger.travel_class_preference, encodings.get('travel_class', [])),
+            encode_category(passenger.nationality, encodings.get('nationality', []))
+        ]
+    
+    def _predict_preferred_destination(self, passenger: Passenger, booking_count: int) -> Optional[str]:
+        """Destination préférée prédite par le RandomForest publié (None si aucun modèle)"""
+        try:
+            model_registry.maybe_reload()
+            snapshot = model_registry.snapshot(models=('preference_predictor',))
+            predictor = snapshot.models['preference_predictor']
+            if predictor is None:
+                return None
+            features = self._encode_passenger_features(passenger, booking_count, snapshot.metadata.get('encodings', {}))
+            return predictor.predict([features])[0]
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur prédiction destination préférée: {e}")
+            return None
+    
     async def _generate_ml_recommendations(self, db: Session, passenger: Passenger, similar_passengers: List[Passenger]) -> List[Dict]:
         """Générer des recommandations basées sur ML collaborative filtering"""
         recommendations = []
         
         try:
-            # Analyser les destinations des passagers similaires
-            similar_bookings = []
-            for sim_passenger in similar_passengers:
-                bookings = db.query(Booking).filter(Booking.passenger_id == sim_passenger.id).all()
-                similar_bookings.extend(bookings)
-            
-            if not similar_bookings:
+            # Analyser les destinations des passagers similaires (une seule requête)
+            flight_ids = [
+                row[0] for row in db.query(Booking.flight_id).filter(
+                    Booking.passenger_id.in_([p.id for p in similar_passengers])
+                ).distinct().all()
+            ] if similar_passengers else []
+            
+            if not flight_ids:
                 return []
             
             # Extraire les destinations populaires
-            flight_ids = [b.flight_id for b in similar_bookings]
-            popular_flights = db.query(Flight).filter(
+            popular_flights = get_loaders(db).flights.prime_many(db.query(Flight).filter(
                 Flight.id.in_(flight_ids),
                 Flight.departure_time > datetime.now()
-            ).limit(10).all()
+            ).limit(10).all())
             
             for flight in popular_flights:
                 score = self._calculate_ml_score(passenger, flight, similar_passengers)
@@ -907,36 +472,137 @@ class AdvancedRecommendationService:
         
         return recommendations
     
-    async def _generate_realtime_recommendations(self, db: Session, passenger: Passenger) -> List[Dict]:
-        """Générer des recommandations basées sur les tendances temps réel"""
+    async def _generate_embedding_recommendations(self, db: Session, passenger: Passenger, limit: int = 3) -> List[Dict]:
+        """Recommandations par factorisation de matrice (produit scalaire passager x destinations)"""
         recommendations = []
         
         try:
-            # Analyser les tendances des dernières 24h
-            recent_bookings = db.query(Booking).filter(
-                Booking.booking_date >= datetime.now() - timedelta(hours=24)
-            ).all()
+            top_destinations = embedding_recommender.top_destinations(passenger.id, k=limit)
+            if not top_destinations:
+                return []
+            
+            best_flights = await self._find_optimal_flights(db, [dest for dest, _ in top_destinations], passenger)
+            for destination, similarity in top_destinations:
+                flight = best_flights.get(destination)
+                if not flight or similarity <= 0:
+                    continue
+                
+                recommendations.append({
+                    'flight_id': flight.id,
+                    'type': 'ML_EMBEDDING',
+                    'score': min(0.95, similarity),
+                    'reason': f"Profil de voyage proche de {destination} (affinité latente: {similarity:.2f})"
+                })
             
-            if not recent_bookings:
+            logger.info(f"🧭 {len(recommendations)} recommandations par embeddings générées")
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur recommandations par embeddings: {e}")
+        
+        return recommendations
+    
+    def _is_cold_start(self, passenger: Passenger) -> bool:
+        """Passager sans réservation (feature store en mémoire, sinon compteur du passager)"""
+        features = passenger_feature_store.features_for(passenger.id)
+        if features is not None:
+            return features[0] == 0
+        return not passenger.total_flights
+    
+    async def _generate_content_recommendations(self, db: Session, passenger: Passenger, limit: int = 3) -> List[Dict]:
+        """Recommandations par contenu (TF-IDF destinations x destinations préférées et classe)"""
+        recommendations = []
+        
+        try:
+            destination_content_vectors.ensure_fresh(db)
+            top_destinations = destination_content_vectors.top_destinations(passenger, k=limit)
+            if not top_destinations:
                 return []
             
-            # Destinations trending
-            destination_counts = Counter()
-            for booking in recent_bookings:
-                flight = db.query(Flight).filter(Flight.id == booking.flight_id).first()
-                if flight:
-                    destination_counts[flight.destination] += 1
+            best_flights = await self._find_optimal_flights(db, [dest for dest, _ in top_destinations], passenger)
+            for destination, similarity in top_destinations:
+                flight = best_flights.get(destination)
+                if not flight:
+                    continue
+                
+                recommendations.append({
+                    'flight_id': flight.id,
+                    'type': 'CONTENT_BASED',
+                    'score': min(0.95, similarity),
+                    'reason': f"Proche de vos destinations préférées: {destination} (similarité: {similarity:.2f})"
+                })
+            
+            logger.info(f"📝 {len(recommendations)} recommandations par contenu générées")
             
-            # Recommander les destinations trending
-            trending_destinations = destination_counts.most_common(3)
+        except Exception as e:
+            logger.error(f"❌ Erreur recommandations par contenu: {e}")
+        
+        return recommendations
+    
+    async def _generate_destination_recommendations(self, db: Session, passenger: Passenger, limit: int = 2) -> List[Dict]:
+        """Scoring avancé des destinations préférées (saison, prix, disponibilité, popularité)"""
+        recommendations = []
+        
+        try:
+            preferred_destinations = list(dict.fromkeys(passenger.preferred_destinations or []))
+            if not preferred_destinations:
+                return []
             
-            for destination, count in trending_destinations:
+            # Toutes les destinations préférées notées en une opération sur la table précalculée
+            destination_feature_store.ensure_fresh(db)
+            factors = destination_feature_store.factor_matrix(preferred_destinations)
+            composite_scores = factors @ COMPOSITE_WEIGHTS
+            
+            # Seuil de qualité, puis les meilleures destinations seulement
+            order = [i for i in np.argsort(-composite_scores, kind="stable") if composite_scores[i] > 0.6]
+            candidates = [preferred_destinations[i] for i in order]
+            best_flights = await self._find_optimal_flights(db, candidates, passenger)
+            for i in order:
+                destination = preferred_destinations[i]
+                flight = best_flights.get(destination)
+                if not flight:
+                    continue
+                
+                seasonal, price = factors[i, 0], factors[i, 1]
+                recommendations.append({
+                    'flight_id': flight.id,
+                    'type': 'ADVANCED_SCORING',
+                    'score': round(float(composite_scores[i]), 2),
+                    'reason': f"Destination optimale {destination} - Score composite: {composite_scores[i]:.2f} (saisonnier: {seasonal:.2f}, prix: {price:.2f})"
+                })
+                if len(recommendations) >= limit:
+                    break
+            
+            logger.info(f"📈 {len(recommendations)} recommandations avec scoring avancé générées")
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur scoring avancé: {e}")
+        
+        return recommendations
+    
+    async def _generate_realtime_recommendations(self, db: Session, passenger: Passenger,
+                                                 deadline: Optional[float] = None) -> List[Dict]:
+        """Générer des recommandations basées sur les tendances temps réel"""
+        recommendations = []
+        
+        try:
+            # Destinations trending des dernières 24h (compteurs en mémoire)
+            self._ensure_trending(db)
+            trends = trending_destinations.top(window_hours=24, limit=3)
+            
+            if not trends:
+                return []
+            
+            loaders = get_loaders(db)
+            for trend in trends:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                destination, count = trend["destination"], trend["bookings"]
                 # Trouver des vols vers cette destination
-                trending_flights = db.query(Flight).filter(
+                trending_flights = loaders.flights.prime_many(db.query(Flight).filter(
                     Flight.destination == destination,
                     Flight.departure_time > datetime.now(),
                     Flight.departure_time < datetime.now() + timedelta(days=30)
-                ).limit(2).all()
+                ).limit(2).all())
                 
                 for flight in trending_flights:
                     score = min(0.8, count / 10)  # Score basé sur la popularité
@@ -955,44 +621,52 @@ class AdvancedRecommendationService:
         
         return recommendations
     
-    async def _score_recommendations_hybrid(self, db: Session, passenger: Passenger, recommendations: List[Dict]) -> List[Dict]:
-        """Scorer les recommandations avec un modèle hybride"""
+    async def _score_recommendations_hybrid(
+        self,
+        db: Session,
+        passenger: Passenger,
+        recommendations: List[Dict],
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Scorer les recommandations avec un modèle hybride (noyau vectorisé, top-K trié)"""
         try:
-            for rec in recommendations:
-                flight = db.query(Flight).filter(Flight.id == rec['flight_id']).first()
-                if not flight:
-                    continue
-                
-                # Score hybride combinant plusieurs facteurs
-                base_score = rec['score']
-                
-                # Facteur prix (si dans la gamme du passager)
-                price_factor = self._calculate_price_factor(passenger, flight)
-                
-                # Facteur disponibilité
-                availability_factor = (flight.capacity - flight.occupied_seats) / flight.capacity
-                
-                # Facteur préférence destination
-                destination_factor = 1.0
-                if passenger.preferred_destinations and flight.destination in passenger.preferred_destinations:
-                    destination_factor = 1.5
-                
-                # Score final
-                final_score = base_score * price_factor * availability_factor * destination_factor
-                rec['score'] = min(1.0, final_score)
-                
-                # Améliorer la raison
-                rec['reason'] += f" | Score: {final_score:.2f} | Places: {flight.capacity - flight.occupied_seats}"
+            flight_ids = [rec['flight_id'] for rec in recommendations]
+            flights = await get_loaders(db).flights.load_many(flight_ids)
+            n = len(recommendations)
+            
+            found = np.fromiter((flight is not None for flight in flights), dtype=bool, count=n)
+            base_scores = np.fromiter((rec['score'] for rec in recommendations), dtype=np.float64, count=n)
+            prices = np.fromiter(
+                (float(flight.price) if flight is not None and flight.price else np.nan for flight in flights),
+                dtype=np.float64, count=n
+            )
+            capacities = np.fromiter((flight.capacity if flight is not None else 0 for flight in flights), dtype=np.float64, count=n)
+            occupied = np.fromiter((flight.occupied_seats if flight is not None else 0 for flight in flights), dtype=np.float64, count=n)
+            preferred_destinations = set(passenger.preferred_destinations or [])
+            preferred = np.fromiter(
+                (flight is not None and flight.destination in preferred_destinations for flight in flights),
+                dtype=bool, count=n
+            )
             
-            # Trier par score décroissant
-            recommendations.sort(key=lambda x: x['score'], reverse=True)
+            # Score final = base x prix x disponibilité x destination (vols introuvables: score de base)
+            raw_scores = hybrid_scores(
+                base_scores, prices, capacities, occupied, preferred, passenger.travel_class_preference
+            )
+            final_scores = np.where(found, np.minimum(1.0, raw_scores), base_scores)
             
-            logger.info(f"🎯 {len(recommendations)} recommandations scorées avec modèle hybride")
-            return recommendations
+            scored = []
+            for i in top_k_order(final_scores, limit).tolist():
+                rec = dict(recommendations[i], score=float(final_scores[i]))
+                if found[i]:
+                    rec['reason'] += f" | Score: {raw_scores[i]:.2f} | Places: {int(capacities[i] - occupied[i])}"
+                scored.append(rec)
+            
+            logger.info(f"🎯 {len(scored)}/{n} recommandations scorées avec modèle hybride")
+            return scored
             
         except Exception as e:
             logger.error(f"❌ Erreur scoring hybride: {e}")
-            return recommendations
+            return recommendations[:limit]
     
     def _calculate_ml_score(self, passenger: Passenger, flight: Flight, similar_passengers: List[Passenger]) -> float:
         """Calculer un score ML pour une recommandation"""
@@ -1083,23 +757,3 @@ class AdvancedRecommendationService:
         except Exception as e:
             logger.error(f"❌ Erreur analyse patterns saisonniers: {e}")
             return {}
-    
-    def _calculate_price_factor(self, passenger: Passenger, flight: Flight) -> float:
-        """Calculer le facteur prix pour le scoring"""
-        if not flight.price:
-            return 1.0
-        
-        try:
-            # Basé sur la classe préférée du passager
-            if passenger.travel_class_preference == "BUSINESS" and flight.price > 1500:
-                return 1.2
-            elif passenger.travel_class_preference == "ECONOMY" and flight.price < 800:
-                return 1.2
-            elif passenger.travel_class_preference == "FIRST" and flight.price > 3000:
-                return 1.2
-            else:
-                return 0.8
-                
-        except Exception as e:
-            logger.error(f"❌ Erreur calcul facteur prix: {e}")
-            return 1.0
@@ -0,0 +1,195 @@
+"""
+Écriture en masse et rétention des recommandations.
+
+Une recommandation est identifiée par (passenger_id, flight_id,
+recommendation_type) : l'API fait un upsert multi-lignes sur cette clé, le
+batch (batch_recommendations.py) remplace une plage de passagers en une
+transaction (DELETE de la plage puis COPY). La tâche de rétention supprime
+les recommandations de vols partis, annulés ou complets, celles trop
+anciennes, et ne garde que les meilleures par passager.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Dict, List
+from datetime import datetime, timedelta
+import csv
+import io
+import logging
+import os
+
+from models import Flight, Recommendation
+
+logger = logging.getLogger(__name__)
+
+COPY_COLUMNS = ["passenger_id", "flight_id", "recommendation_type", "score", "reason", "created_at"]
+UPSERT_KEY = ["passenger_id", "flight_id", "recommendation_type"]
+
+RECOMMENDATION_RETENTION_DAYS = int(os.getenv("RECOMMENDATION_RETENTION_DAYS", "30"))
+RECOMMENDATION_MAX_PER_PASSENGER = int(os.getenv("RECOMMENDATION_MAX_PER_PASSENGER", "50"))
+
+# Vols qui ne peuvent plus être réservés
+CLOSED_FLIGHT_STATUSES = ["BOARDING", "DEPARTED", "CANCELLED"]
+
+
+def deduplicate(rows: List[Dict]) -> List[Dict]:
+    """Une ligne par clé (passager, vol, type), en gardant le meilleur score"""
+    best: Dict[tuple, Dict] = {}
+    for row in rows:
+        key = tuple(row[column] for column in UPSERT_KEY)
+        current = best.get(key)
+        if current is None or row["score"] > current["score"]:
+            best[key] = row
+    return list(best.values())
+
+
+class RecommendationStore:
+    """Persistance en masse de la table recommendations"""
+
+    def upsert(self, db: Session, rows: List[Dict]) -> List[Recommendation]:
+        """Insérer ou mettre à jour (score, raison, date) en une requête ; la transaction reste au caller"""
+        rows = deduplicate(rows)
+        if not rows:
+            return []
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            statement = postgresql.insert(Recommendation)
+        elif dialect == "sqlite":
+            statement = sqlite.insert(Recommendation)
+        else:
+            return self._replace_keys(db, rows)
+
+        statement = statement.values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=UPSERT_KEY,
+            set_={
+                "score": statement.excluded.score,
+                "reason": statement.excluded.reason,
+                "created_at": statement.excluded.created_at,
+                "is_sent": False
+            }
+        ).returning(Recommendation)
+
+        return list(db.scalars(statement, execution_options={"populate_existing": True}).all())
+
+    def _replace_keys(self, db: Session, rows: List[Dict]) -> List[Recommendation]:
+        """Upsert générique (dialectes sans ON CONFLICT): supprimer les clés puis insérer"""
+        for row in rows:
+            db.query(Recommendation).filter_by(
+                **{column: row[column] for column in UPSERT_KEY}
+            ).delete(synchronize_session=False)
+        recommendations = [Recommendation(**row, is_sent=False) for row in rows]
+        db.add_all(recommendations)
+        db.flush()
+        return recommendations
+
+    def replace_range(self, db: Session, start_id: int, end_id: int, rows: List[Dict]) -> int:
+        """Remplacer les recommandations des passagers [start_id, end_id]"""
+        rows = deduplicate(rows)
+        try:
+            db.execute(
+                text("DELETE FROM recommendations WHERE passenger_id BETWEEN :start AND :end"),
+                {"start": start_id, "end": end_id}
+            )
+            if rows:
+                if db.get_bind().dialect.name == "postgresql":
+                    self._copy(db, rows)
+                else:
+                    db.execute(insert(Recommendation), rows)
+            db.commit()
+            return len(rows)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur écriture recommandations {start_id}-{end_id}: {e}")
+            db.rollback()
+            raise
+
+    def replace_passengers(self, db: Session, passenger_ids: List[int], rows: List[Dict]) -> int:
+        """Remplacer les recommandations d'une liste de passagers (rafraîchissement incrémental)"""
+        rows = deduplicate(rows)
+        try:
+            db.query(Recommendation).filter(
+                Recommendation.passenger_id.in_(passenger_ids)
+            ).delete(synchronize_session=False)
+            if rows:
+                db.execute(insert(Recommendation), rows)
+            db.commit()
+            return len(rows)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur écriture recommandations de {len(passenger_ids)} passagers: {e}")
+            db.rollback()
+            raise
+
+    # === RÉTENTION ===
+
+    def expire(self, db: Session) -> int:
+        """Supprimer les recommandations de vols partis, fermés ou complets"""
+        closed_flights = select(Flight.id).where(or_(
+            Flight.departure_time <= datetime.now(),
+            Flight.status.in_(CLOSED_FLIGHT_STATUSES),
+            Flight.occupied_seats >= Flight.capacity
+        ))
+        return db.query(Recommendation).filter(
+            Recommendation.flight_id.in_(closed_flights)
+        ).delete(synchronize_session=False)
+
+    def purge_old(self, db: Session, max_age_days: int = RECOMMENDATION_RETENTION_DAYS) -> int:
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        return db.query(Recommendation).filter(
+            Recommendation.created_at < cutoff
+        ).delete(synchronize_session=False)
+
+    def trim_per_passenger(self, db: Session, max_per_passenger: int = RECOMMENDATION_MAX_PER_PASSENGER) -> int:
+        """Ne garder que les `max_per_passenger` meilleures recommandations de chaque passager"""
+        ranked = select(
+            Recommendation.id,
+            func.row_number().over(
+                partition_by=Recommendation.passenger_id,
+                order_by=(Recommendation.score.desc(), Recommendation.created_at.desc())
+            ).label("rank")
+        ).subquery()
+        overflow = select(ranked.c.id).where(ranked.c.rank > max_per_passenger)
+        return db.query(Recommendation).filter(
+            Recommendation.id.in_(overflow)
+        ).delete(synchronize_session=False)
+
+    def apply_retention(self, db: Session) -> Dict[str, int]:
+        """Passe complète de rétention, en une transaction"""
+        try:
+            report = {
+                "expired": self.expire(db),
+                "purged": self.purge_old(db),
+                "trimmed": self.trim_per_passenger(db)
+            }
+            db.commit()
+        except Exception as e:
+            logger.error(f"❌ Erreur rétention recommandations: {e}")
+            db.rollback()
+            raise
+
+        logger.info(
+            f"🧹 Rétention recommandations: {report['expired']} expirées, "
+            f"{report['purged']} anciennes, {report['trimmed']} au-delà du top {RECOMMENDATION_MAX_PER_PASSENGER}"
+        )
+        return report
+
+    def _copy(self, db: Session, rows: List[Dict]) -> None:
+        """COPY FROM STDIN sur la connexion de la session (même transaction que le DELETE)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in COPY_COLUMNS])
+        buffer.seek(0)
+
+        dbapi_connection = db.connection().connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY recommendations ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+
+
+# Instance partagée (batch et API)
+recommendation_store = RecommendationStore()
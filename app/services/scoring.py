@@ -0,0 +1,65 @@
+"""
+Noyau vectorisé du scoring hybride des recommandations.
+
+Les candidats d'un passager sont passés sous forme de tableaux (score de base,
+prix, capacité, sièges occupés, destination préférée) et scorés en une passe
+NumPy : score = base x facteur prix x disponibilité x facteur destination,
+plafonné à 1. Le top-K est obtenu par tri partiel, avec le même ordre qu'un
+tri stable par score décroissant.
+"""
+from typing import Optional
+
+import numpy as np
+
+# Facteur prix: bonus si le prix correspond à la classe préférée du passager
+PRICE_MATCH_FACTOR = 1.2
+PRICE_MISMATCH_FACTOR = 0.8
+# (comparaison, seuil) par classe préférée
+PRICE_RULES = {
+    "BUSINESS": (np.greater, 1500),
+    "ECONOMY": (np.less, 800),
+    "FIRST": (np.greater, 3000)
+}
+PREFERRED_DESTINATION_FACTOR = 1.5
+
+
+def price_factors(prices: np.ndarray, travel_class: Optional[str]) -> np.ndarray:
+    """Facteur prix de chaque candidat (1.0 quand le prix est inconnu ou nul)"""
+    prices = np.asarray(prices, dtype=np.float64)
+    factors = np.full(len(prices), PRICE_MISMATCH_FACTOR)
+
+    rule = PRICE_RULES.get(travel_class)
+    if rule is not None:
+        compare, threshold = rule
+        with np.errstate(invalid="ignore"):
+            factors[compare(prices, threshold)] = PRICE_MATCH_FACTOR
+
+    factors[np.isnan(prices) | (prices == 0)] = 1.0
+    return factors
+
+
+def hybrid_scores(base_scores: np.ndarray, prices: np.ndarray, capacities: np.ndarray,
+                  occupied: np.ndarray, preferred: np.ndarray, travel_class: Optional[str]) -> np.ndarray:
+    """Scores hybrides non plafonnés de tous les candidats"""
+    capacities = np.asarray(capacities, dtype=np.float64)
+    free_seats = capacities - np.asarray(occupied, dtype=np.float64)
+    availability = np.divide(free_seats, capacities, out=np.zeros_like(capacities), where=capacities > 0)
+    destination = np.where(np.asarray(preferred, dtype=bool), PREFERRED_DESTINATION_FACTOR, 1.0)
+    return np.asarray(base_scores, dtype=np.float64) * price_factors(prices, travel_class) * availability * destination
+
+
+def top_k_order(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Indices des k meilleurs scores, décroissants, égalités dans l'ordre d'origine"""
+    scores = np.asarray(scores, dtype=np.float64)
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Tri partiel: garder tout ce qui atteint le k-ième score, puis tri stable de ce sous-ensemble
+    threshold = np.partition(-scores, k - 1)[k - 1]
+    candidates = np.flatnonzero(-scores <= threshold)
+    order = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return order[:k]
+
@@ -1,11 +1,12 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from typing import List, Optional
 import logging
 from datetime import datetime, timedelta
 
 from models import Service
 from schemas import ServiceCreate, ServiceUpdate
+from services.pagination import Page, paginate
 
 logger = logging.getLogger(__name__)
 
@@ -13,37 +14,39 @@ class ServiceService:
     
     async def get_services(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
         service_type: Optional[str] = None,
-        terminal: Optional[str] = None
-    ) -> List[Service]:
-        """Récupérer les services avec filtres optionnels"""
-        query = db.query(Service)
+        terminal: Optional[str] = None,
+        cursor: Optional[str] = None,
+        sort: str = "id"
+    ) -> Page:
+        """Récupérer les services avec filtres optionnels (page par curseur ou skip historique)"""
+        query = select(Service)
         
         if service_type:
-            query = query.filter(Service.type == service_type)
+            query = query.where(Service.type == service_type)
         if terminal:
-            query = query.filter(Service.terminal == terminal)
+            query = query.where(Service.terminal == terminal)
             
-        return query.offset(skip).limit(limit).all()
+        return await paginate(db, query, Service, limit, sort=sort, cursor=cursor, skip=skip)
     
-    async def get_service(self, db: Session, service_id: int) -> Optional[Service]:
+    async def get_service(self, db: AsyncSession, service_id: int) -> Optional[Service]:
         """Récupérer un service par ID"""
-        return db.query(Service).filter(Service.id == service_id).first()
+        return await db.get(Service, service_id)
     
-    async def create_service(self, db: Session, service_data: ServiceCreate) -> Service:
+    async def create_service(self, db: AsyncSession, service_data: ServiceCreate) -> Service:
         """Créer un nouveau service"""
         db_service = Service(**service_data.dict())
         db.add(db_service)
-        db.commit()
-        db.refresh(db_service)
+        await db.commit()
+        await db.refresh(db_service)
         
         logger.info(f"Service créé: {db_service.name}")
         return db_service
     
-    async def update_service(self, db: Session, service_id: int, service_update: ServiceUpdate) -> Optional[Service]:
+    async def update_service(self, db: AsyncSession, service_id: int, service_update: ServiceUpdate) -> Optional[Service]:
         """Mettre à jour un service"""
         db_service = await self.get_service(db, service_id)
         if not db_service:
@@ -53,58 +56,60 @@ class ServiceService:
         for field, value in update_data.items():
             setattr(db_service, field, value)
         
-        db.commit()
-        db.refresh(db_service)
+        await db.commit()
+        await db.refresh(db_service)
         
         logger.info(f"Service mis à jour: {db_service.name}")
         return db_service
     
-    async def delete_service(self, db: Session, service_id: int) -> bool:
+    async def delete_service(self, db: AsyncSession, service_id: int) -> bool:
         """Supprimer un service"""
         db_service = await self.get_service(db, service_id)
         if not db_service:
             return False
             
-        db.delete(db_service)
-        db.commit()
+        await db.delete(db_service)
+        await db.commit()
         
         logger.info(f"Service supprimé: {db_service.name}")
         return True
     
-    async def get_services_by_type(self, db: Session, service_type: str) -> List[Service]:
+    async def get_services_by_type(self, db: AsyncSession, service_type: str) -> List[Service]:
         """Récupérer les services par type"""
-        return db.query(Service).filter(Service.type == service_type).all()
+        return list(await db.scalars(select(Service).where(Service.type == service_type)))
     
-    async def get_services_by_terminal(self, db: Session, terminal: str) -> List[Service]:
+    async def get_services_by_terminal(self, db: AsyncSession, terminal: str) -> List[Service]:
         """Récupérer les services par terminal"""
-        return db.query(Service).filter(Service.terminal == terminal).all()
+        return list(await db.scalars(select(Service).where(Service.terminal == terminal)))
     
-    async def update_service_usage(self, db: Session, service_id: int, usage_change: int):
+    async def update_service_usage(self, db: AsyncSession, service_id: int, usage_change: int):
         """Mettre à jour l'utilisation d'un service"""
         service = await self.get_service(db, service_id)
         if service:
             new_usage = max(0, service.current_usage + usage_change)
             service.current_usage = min(new_usage, service.capacity or new_usage)
-            db.commit()
+            await db.commit()
     
-    async def get_service_stats(self, db: Session) -> dict:
+    async def get_service_stats(self, db: AsyncSession) -> dict:
         """Statistiques des services"""
         # Services par type
-        services_by_type = db.query(
-            Service.type, func.count(Service.id)
-        ).group_by(Service.type).all()
+        services_by_type = (await db.execute(
+            select(Service.type, func.count(Service.id)).group_by(Service.type)
+        )).all()
         
         # Taux d'utilisation moyen
-        avg_usage = db.query(
-            func.avg(Service.current_usage * 100.0 / Service.capacity)
-        ).filter(Service.capacity > 0).scalar() or 0
+        avg_usage = await db.scalar(
+            select(func.avg(Service.current_usage * 100.0 / Service.capacity)).where(Service.capacity > 0)
+        ) or 0
         
         # Services les plus utilisés
-        top_services = db.query(Service).filter(
-            Service.capacity > 0
-        ).order_by(
-            (Service.current_usage * 100.0 / Service.capacity).desc()
-        ).limit(5).all()
+        top_services = await db.scalars(
+            select(Service).where(
+                Service.capacity > 0
+            ).order_by(
+                (Service.current_usage * 100.0 / Service.capacity).desc()
+            ).limit(5)
+        )
         
         return {
             "services_by_type": dict(services_by_type),
@@ -119,18 +124,20 @@ class ServiceService:
             ]
         }
     
-    async def get_realtime_data(self, db: Session) -> dict:
+    async def get_realtime_data(self, db: AsyncSession) -> dict:
         """Données temps réel des services"""
         # Services avec forte utilisation
-        high_usage_services = db.query(Service).filter(
-            Service.capacity > 0,
-            Service.current_usage / Service.capacity > 0.8
-        ).all()
+        high_usage_services = await db.scalars(
+            select(Service).where(
+                Service.capacity > 0,
+                Service.current_usage / Service.capacity > 0.8
+            )
+        )
         
         # Services fermés ou en maintenance
-        inactive_services = db.query(Service).filter(
-            Service.status != "ACTIVE"
-        ).all()
+        inactive_services = await db.scalars(
+            select(Service).where(Service.status != "ACTIVE")
+        )
         
         return {
             "high_usage_services": [
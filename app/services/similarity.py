@@ -0,0 +1,429 @@
+"""
+Moteur de similarité entre passagers sur vecteurs binaires creux.
+
+Chaque passager est décrit par sa nationalité, sa classe préférée et deux
+vecteurs binaires passager x destination (destinations préférées et
+destinations réservées). Le score composite historique (nationalité 0.2,
+classe 0.2, recouvrement des préférences 0.3, Jaccard des destinations
+réservées 0.3) est calculé contre toute la population en quelques produits
+matrice creuse x vecteur. Pour les grandes populations, des signatures
+MinHash (LSH par bandes, clés triées par bande: recherche dichotomique)
+restreignent le calcul exact aux candidats. Les passagers créés, modifiés ou
+supprimés via l'API sont appliqués au fil de l'eau dans une surcouche
+(insertion dans les bandes, ligne de base masquée) jusqu'à la reconstruction
+suivante.
+"""
+from sqlalchemy.orm import Session
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+from collections import defaultdict
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from models import Passenger, Booking, Flight
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_ENGINE_MAX_AGE = int(os.getenv("SIMILARITY_ENGINE_MAX_AGE", "300"))
+# Au-delà de cette population, le mode "auto" passe par les candidats MinHash
+SIMILARITY_MINHASH_THRESHOLD = int(os.getenv("SIMILARITY_MINHASH_THRESHOLD", "50000"))
+
+MERSENNE_PRIME = (1 << 31) - 1
+EMPTY_SIGNATURE = np.iinfo(np.int64).max
+
+
+class MinHashSignatures:
+    """Signatures MinHash des ensembles de destinations et LSH par bandes"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self._band_weights = rng.integers(1, MERSENNE_PRIME, size=self.rows_per_band, dtype=np.int64)
+        self.band_keys = np.zeros((0, bands), dtype=np.int64)
+        # Par bande: clés triées et lignes correspondantes (recherche dichotomique)
+        self._sorted_keys = np.zeros((0, bands), dtype=np.int64)
+        self._sorted_rows = np.zeros((0, bands), dtype=np.int64)
+        # Insertions incrémentales: bande -> clé -> identifiants, et clés de chaque identifiant
+        self._inserted: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in range(bands)]
+        self._inserted_keys: Dict[int, np.ndarray] = {}
+
+    def signatures(self, matrix: sparse.csr_matrix, chunk_rows: int = 20000) -> np.ndarray:
+        """Signatures (n_lignes x num_perm) d'une matrice binaire CSR, par blocs de lignes"""
+        n_rows = matrix.shape[0]
+        signatures = np.full((n_rows, self.num_perm), EMPTY_SIGNATURE, dtype=np.int64)
+
+        for start in range(0, n_rows, chunk_rows):
+            block = matrix[start:start + chunk_rows]
+            non_empty = np.flatnonzero(np.diff(block.indptr))
+            if non_empty.size == 0:
+                continue
+            hashed = (np.outer(block.indices.astype(np.int64), self._a) + self._b) % MERSENNE_PRIME
+            signatures[start + non_empty] = np.minimum.reduceat(hashed, block.indptr[non_empty], axis=0)
+        return signatures
+
+    def band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        """Une clé par bande (débordement int64 volontaire, sert de hachage)"""
+        bands = signatures.reshape(signatures.shape[0], self.bands, self.rows_per_band)
+        with np.errstate(over="ignore"):
+            return (bands * self._band_weights).sum(axis=2)
+
+    def index(self, matrix: sparse.csr_matrix) -> None:
+        self.band_keys = self.band_hashes(self.signatures(matrix))
+        self._sorted_rows = np.argsort(self.band_keys, axis=0, kind="stable")
+        self._sorted_keys = np.take_along_axis(self.band_keys, self._sorted_rows, axis=0)
+        self._inserted = [defaultdict(set) for _ in range(self.bands)]
+        self._inserted_keys = {}
+
+    def candidates(self, vector: sparse.csr_matrix) -> np.ndarray:
+        """Lignes indexées partageant au moins une bande avec le vecteur requête"""
+        keys = self.band_hashes(self.signatures(vector))[0]
+        found = []
+        for band, key in enumerate(keys.tolist()):
+            column = self._sorted_keys[:, band]
+            start, end = np.searchsorted(column, key, side="left"), np.searchsorted(column, key, side="right")
+            found.append(self._sorted_rows[start:end, band])
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+    def insert(self, key_id: int, vector: sparse.csr_matrix) -> None:
+        """Ajouter (ou remplacer) un identifiant hors de la matrice indexée"""
+        self.remove(key_id)
+        keys = self.band_hashes(self.signatures(vector))[0]
+        for band, key in enumerate(keys.tolist()):
+            self._inserted[band][key].add(key_id)
+        self._inserted_keys[key_id] = keys
+
+    def remove(self, key_id: int) -> None:
+        keys = self._inserted_keys.pop(key_id, None)
+        if keys is None:
+            return
+        for band, key in enumerate(keys.tolist()):
+            bucket = self._inserted[band].get(key)
+            if bucket is not None:
+                bucket.discard(key_id)
+                if not bucket:
+                    del self._inserted[band][key]
+
+    def inserted_candidates(self, vector: sparse.csr_matrix) -> Set[int]:
+        """Identifiants insérés partageant au moins une bande avec le vecteur requête"""
+        keys = self.band_hashes(self.signatures(vector))[0]
+        found: Set[int] = set()
+        for band, key in enumerate(keys.tolist()):
+            found |= self._inserted[band].get(key, set())
+        return found
+
+
+class _OverlayEntry(NamedTuple):
+    """Passager appliqué depuis la dernière construction"""
+    nationality: Optional[str]
+    travel_class: Optional[str]
+    preferred: Tuple[str, ...]
+    visited: FrozenSet[str]
+    applied_at: float
+
+
+class PassengerSimilarityEngine:
+    """Score composite d'un passager contre toute la population, vectorisé"""
+
+    def __init__(self, max_age: float = SIMILARITY_ENGINE_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self.passenger_ids = np.zeros(0, dtype=np.int64)
+        self.destination_index: Dict[str, int] = {}
+        self._nationalities: Dict[str, int] = {}
+        self._classes: Dict[str, int] = {}
+        self.nationality_codes = np.zeros(0, dtype=np.int64)
+        self.class_codes = np.zeros(0, dtype=np.int64)
+        self.preferred = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.preferred_lengths = np.zeros(0)
+        self.visited = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.visited_lengths = np.zeros(0)
+        self.minhash = MinHashSignatures()
+        self._destination_names: List[str] = []
+        self._row_of: Dict[int, int] = {}
+        # Lignes de base remplacées par la surcouche (passager modifié ou supprimé)
+        self._superseded = np.zeros(0, dtype=bool)
+        self._overlay: Dict[int, _OverlayEntry] = {}
+        self._removed: Dict[int, float] = {}
+        self.built_at: Optional[datetime] = None
+        self._built_monotonic: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.built_at is not None
+
+    # === CONSTRUCTION ===
+
+    def build(self, db: Session) -> None:
+        """Charger profils et destinations réservées (deux requêtes) et construire les matrices"""
+        started = time.monotonic()
+        rows = db.query(
+            Passenger.id, Passenger.nationality, Passenger.travel_class_preference, Passenger.preferred_destinations
+        ).order_by(Passenger.id).all()
+        visited_pairs = db.query(Booking.passenger_id, Flight.destination).join(
+            Flight, Booking.flight_id == Flight.id
+        ).distinct().all()
+
+        destination_index: Dict[str, int] = {}
+        nationalities: Dict[str, int] = {}
+        classes: Dict[str, int] = {}
+        passenger_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        row_of = {pid: i for i, pid in enumerate(passenger_ids.tolist())}
+
+        nationality_codes = np.array([self._code(nationalities, row[1]) for row in rows], dtype=np.int64)
+        class_codes = np.array([self._code(classes, row[2]) for row in rows], dtype=np.int64)
+        preferred_lengths = np.array([len(row[3] or []) for row in rows], dtype=np.float64)
+
+        pref_rows, pref_cols = [], []
+        for i, row in enumerate(rows):
+            for destination in set(row[3] or []):
+                pref_rows.append(i)
+                pref_cols.append(destination_index.setdefault(destination, len(destination_index)))
+
+        visited_rows, visited_cols = [], []
+        for passenger_id, destination in visited_pairs:
+            row = row_of.get(passenger_id)
+            if row is not None and destination:
+                visited_rows.append(row)
+                visited_cols.append(destination_index.setdefault(destination, len(destination_index)))
+
+        shape = (len(rows), len(destination_index))
+        preferred = self._binary_matrix(pref_rows, pref_cols, shape)
+        visited = self._binary_matrix(visited_rows, visited_cols, shape)
+
+        minhash = MinHashSignatures()
+        minhash.index(self._binary_union(preferred, visited))
+
+        with self._lock:
+            # Écritures appliquées pendant la lecture: peut-être absentes des matrices, reportées
+            overlay = {pid: entry for pid, entry in self._overlay.items() if entry.applied_at >= started}
+            removed = {pid: at for pid, at in self._removed.items() if at >= started}
+
+            self.passenger_ids = passenger_ids
+            self._row_of = row_of
+            self._superseded = np.zeros(len(rows), dtype=bool)
+            self._destination_names = list(destination_index)
+            self.destination_index = destination_index
+            self._nationalities = nationalities
+            self._classes = classes
+            self.nationality_codes = nationality_codes
+            self.class_codes = class_codes
+            self.preferred = preferred
+            self.preferred_lengths = preferred_lengths
+            self.visited = visited
+            self.visited_lengths = np.diff(visited.indptr).astype(np.float64)
+            self.minhash = minhash
+            self._overlay, self._removed = {}, {}
+            for passenger_id, entry in overlay.items():
+                self._apply(passenger_id, entry)
+            for passenger_id, removed_at in removed.items():
+                self._remove(passenger_id, removed_at)
+            self.built_at = datetime.now()
+            self._built_monotonic = time.monotonic()
+
+        logger.info(f"🧮 Moteur de similarité construit: {shape[0]} passagers x {shape[1]} destinations")
+
+    def ensure_fresh(self, db: Session) -> None:
+        if self._built_monotonic is None or time.monotonic() - self._built_monotonic > self.max_age:
+            self.build(db)
+
+    # === MISES À JOUR INCRÉMENTALES ===
+
+    def upsert_passenger(self, passenger: Passenger, visited_destinations: Optional[Iterable[str]] = None) -> None:
+        """Appliquer un passager créé ou modifié (destinations réservées conservées si non fournies)"""
+        with self._lock:
+            if not self.is_loaded:
+                return
+            visited = (
+                self._visited_of(passenger.id) if visited_destinations is None
+                else {dest for dest in visited_destinations if dest}
+            )
+            self._apply(passenger.id, _OverlayEntry(
+                passenger.nationality, passenger.travel_class_preference,
+                tuple(passenger.preferred_destinations or []), frozenset(visited), time.monotonic()
+            ))
+
+    def add_visit(self, passenger: Passenger, destination: str) -> None:
+        """Nouvelle réservation: ajouter la destination aux destinations réservées du passager"""
+        with self._lock:
+            if self.is_loaded and destination:
+                self.upsert_passenger(passenger, self._visited_of(passenger.id) | {destination})
+
+    def remove_passenger(self, passenger_id: int) -> None:
+        with self._lock:
+            if self.is_loaded:
+                self._remove(passenger_id, time.monotonic())
+
+    def _apply(self, passenger_id: int, entry: _OverlayEntry) -> None:
+        row = self._row_of.get(passenger_id)
+        if row is not None:
+            self._superseded[row] = True
+        self._removed.pop(passenger_id, None)
+        self._overlay[passenger_id] = entry
+        # Destinations inconnues de la matrice ignorées par la signature jusqu'à la reconstruction
+        self.minhash.insert(passenger_id, self._binary_union(
+            self._query_vector(entry.preferred), self._query_vector(entry.visited)
+        ))
+
+    def _remove(self, passenger_id: int, removed_at: float) -> None:
+        row = self._row_of.get(passenger_id)
+        if row is not None:
+            self._superseded[row] = True
+        self._overlay.pop(passenger_id, None)
+        self.minhash.remove(passenger_id)
+        self._removed[passenger_id] = removed_at
+
+    def _visited_of(self, passenger_id: int) -> Set[str]:
+        entry = self._overlay.get(passenger_id)
+        if entry is not None:
+            return set(entry.visited)
+        row = self._row_of.get(passenger_id)
+        if row is None or passenger_id in self._removed:
+            return set()
+        columns = self.visited.indices[self.visited.indptr[row]:self.visited.indptr[row + 1]]
+        return {self._destination_names[column] for column in columns.tolist()}
+
+    # === REQUÊTES ===
+
+    def similar(self, passenger: Passenger, visited_destinations: Iterable[str], min_score: float = 0.3,
+                skip: int = 0, limit: int = 10, method: str = "auto") -> Tuple[List[Tuple[int, float]], int]:
+        """Passagers de score > min_score, triés par score décroissant et paginés (résultats, total)"""
+        visited_destinations = {dest for dest in visited_destinations if dest}
+
+        with self._lock:
+            if method == "auto":
+                method = "minhash" if len(self.passenger_ids) > SIMILARITY_MINHASH_THRESHOLD else "exact"
+
+            rows, overlay_ids = None, list(self._overlay)
+            if method == "minhash" and (passenger.preferred_destinations or visited_destinations):
+                query_vector = self._binary_union(
+                    self._query_vector(passenger.preferred_destinations or []),
+                    self._query_vector(visited_destinations)
+                )
+                rows = self.minhash.candidates(query_vector)
+                overlay_ids = sorted(self.minhash.inserted_candidates(query_vector))
+
+            scores = self.scores(passenger, visited_destinations, rows)
+            ids = self.passenger_ids if rows is None else self.passenger_ids[rows]
+            live = ~self._superseded if rows is None else ~self._superseded[rows]
+            if overlay_ids:
+                overlay_scores = [
+                    self._entry_score(passenger, visited_destinations, self._overlay[pid]) for pid in overlay_ids
+                ]
+                ids = np.concatenate([ids, np.asarray(overlay_ids, dtype=np.int64)])
+                scores = np.concatenate([scores, np.asarray(overlay_scores, dtype=np.float64)])
+                live = np.concatenate([live, np.ones(len(overlay_ids), dtype=bool)])
+
+        keep = np.flatnonzero((scores > min_score) & (ids != passenger.id) & live)
+        total = int(keep.size)
+        end = min(total, skip + limit)
+        if skip >= end:
+            return [], total
+
+        # Tri partiel: seuls les skip + limit meilleurs sont ordonnés
+        if end < total:
+            threshold = -np.partition(-scores[keep], end - 1)[end - 1]
+            keep = keep[scores[keep] >= threshold]
+        keep = keep[np.lexsort((ids[keep], -scores[keep]))][skip:end]
+        return [(int(ids[i]), float(scores[i])) for i in keep], total
+
+    def scores(self, passenger: Passenger, visited_destinations: Set[str],
+               rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Score composite du passager contre toutes les lignes (ou un sous-ensemble)"""
+        nationality_codes, class_codes = self.nationality_codes, self.class_codes
+        preferred, preferred_lengths = self.preferred, self.preferred_lengths
+        visited, visited_lengths = self.visited, self.visited_lengths
+        if rows is not None:
+            nationality_codes, class_codes = nationality_codes[rows], class_codes[rows]
+            preferred, preferred_lengths = preferred[rows], preferred_lengths[rows]
+            visited, visited_lengths = visited[rows], visited_lengths[rows]
+
+        # Nationalité et classe (égalité stricte, valeurs absentes comprises)
+        score = 0.2 * (nationality_codes == self._lookup(self._nationalities, passenger.nationality))
+        score = score + 0.2 * (class_codes == self._lookup(self._classes, passenger.travel_class_preference))
+
+        # Recouvrement des destinations préférées
+        target_preferred = passenger.preferred_destinations or []
+        if target_preferred:
+            common = self._dot(preferred, set(target_preferred))
+            denominator = np.maximum(preferred_lengths, len(target_preferred))
+            score = score + 0.3 * np.divide(common, denominator, out=np.zeros_like(common), where=common > 0)
+
+        # Jaccard des destinations réservées
+        if visited_destinations:
+            common = self._dot(visited, visited_destinations)
+            union = visited_lengths + len(visited_destinations) - common
+            score = score + 0.3 * np.divide(common, union, out=np.zeros_like(common), where=common > 0)
+
+        return np.minimum(1.0, score)
+
+    @staticmethod
+    def _entry_score(passenger: Passenger, visited_destinations: Set[str], entry: _OverlayEntry) -> float:
+        """Score composite contre un passager de la surcouche (même formule, sur les ensembles)"""
+        score = 0.2 * (entry.nationality == passenger.nationality)
+        score += 0.2 * (entry.travel_class == passenger.travel_class_preference)
+        target_preferred = passenger.preferred_destinations or []
+        if target_preferred and entry.preferred:
+            common = len(set(entry.preferred) & set(target_preferred))
+            score += 0.3 * common / max(len(entry.preferred), len(target_preferred))
+        if visited_destinations and entry.visited:
+            common = len(entry.visited & visited_destinations)
+            score += 0.3 * common / len(entry.visited | visited_destinations)
+        return min(1.0, score)
+
+    # === INTERNES ===
+
+    def _dot(self, matrix: sparse.csr_matrix, destinations: Set[str]) -> np.ndarray:
+        """Nombre de destinations communes avec chaque ligne (produit matrice creuse x vecteur)"""
+        vector = np.zeros(matrix.shape[1], dtype=np.float32)
+        columns = [self.destination_index[d] for d in destinations if d in self.destination_index]
+        vector[columns] = 1.0
+        return np.asarray(matrix @ vector, dtype=np.float64).ravel()
+
+    def _query_vector(self, destinations: Iterable[str]) -> sparse.csr_matrix:
+        columns = sorted({self.destination_index[d] for d in destinations if d in self.destination_index})
+        return self._binary_matrix([0] * len(columns), columns, (1, len(self.destination_index)))
+
+    @staticmethod
+    def _code(vocabulary: Dict[str, int], value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        return vocabulary.setdefault(value, len(vocabulary))
+
+    @staticmethod
+    def _lookup(vocabulary: Dict[str, int], value: Optional[str]) -> int:
+        """Code d'une valeur de requête (-2 si inconnue: ne correspond à aucune ligne)"""
+        if value is None:
+            return -1
+        return vocabulary.get(value, -2)
+
+    @staticmethod
+    def _binary_matrix(rows: List[int], cols: List[int], shape: Tuple[int, int]) -> sparse.csr_matrix:
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+        matrix.sort_indices()
+        return matrix
+
+    @staticmethod
+    def _binary_union(left: sparse.csr_matrix, right: sparse.csr_matrix) -> sparse.csr_matrix:
+        union = (left + right).tocsr()
+        union.data[:] = 1.0
+        union.sort_indices()
+        return union
+
+
+# Instance partagée par l'API
+passenger_similarity_engine = PassengerSimilarityEngine()
@@ -0,0 +1,194 @@
+"""
+Compteur glissant des réservations par destination (destinations tendance).
+
+Les réservations sont comptées dans des buckets horaires d'un buffer
+circulaire (720 heures = 30 jours). Le top-N sur une fenêtre quelconque
+revient à sommer au plus 720 lignes, sans relire les réservations en base.
+Le buffer est rempli au démarrage par une requête agrégée, alimenté par les
+créations/suppressions de réservations de l'API, puis réconcilié
+périodiquement avec les réservations insérées directement en base.
+
+Les identifiants de réservation sont attribués avant le commit : une
+transaction lente peut rendre visible un id inférieur au dernier id déjà
+compté. La réconciliation relit donc une marge de TRENDING_ID_LAG ids sous
+le dernier id vu et ignore ceux déjà comptés (`_recorded_ids`).
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional, Set
+from datetime import datetime
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+MAX_WINDOW_HOURS = 720
+# Dates naïves converties comme EXTRACT(epoch FROM timestamp) côté PostgreSQL
+EPOCH = datetime(1970, 1, 1)
+# Marge d'ids relue à chaque réconciliation (réservations commitées dans le désordre)
+TRENDING_ID_LAG = int(os.getenv("TRENDING_ID_LAG", "1000"))
+
+
+class TrendingDestinations:
+    """Buffer circulaire de compteurs horaires par destination"""
+
+    def __init__(self, n_buckets: int = MAX_WINDOW_HOURS, id_lag: int = TRENDING_ID_LAG):
+        self.n_buckets = n_buckets
+        self.id_lag = id_lag
+        self._lock = threading.RLock()
+        self.destination_index: Dict[str, int] = {}
+        self.destinations: List[str] = []
+        # Heure absolue (epoch // 3600) occupant chaque slot, -1 si vide
+        self.bucket_hours = np.full(n_buckets, -1, dtype=np.int64)
+        self.counts = np.zeros((n_buckets, 0), dtype=np.float64)
+        # Somme des délais réservation -> départ (jours), pour la moyenne par destination
+        self.lead_days = np.zeros((n_buckets, 0), dtype=np.float64)
+        self.last_booking_id = 0
+        # Réservations déjà comptées (API ou marge de réconciliation), à ignorer lors de la réconciliation
+        self._recorded_ids: Set[int] = set()
+        self.is_loaded = False
+
+    # === ALIMENTATION ===
+
+    def record_booking(self, destination: str, booking_date: Optional[datetime] = None,
+                       departure_time: Optional[datetime] = None, booking_id: Optional[int] = None,
+                       delta: float = 1.0) -> None:
+        """Compter (ou décompter) une réservation créée via l'API"""
+        if not destination:
+            return
+        booking_date = booking_date or datetime.now()
+        lead = (departure_time - booking_date).total_seconds() / 86400 if departure_time else 0.0
+
+        with self._lock:
+            if booking_id is not None and delta > 0:
+                self._recorded_ids.add(booking_id)
+            self._add(destination, self._hour(booking_date), delta, lead * delta)
+
+    def reserve_booking(self, booking_id: int) -> None:
+        """Écarter de la réconciliation une réservation de l'API, avant son commit"""
+        with self._lock:
+            self._recorded_ids.add(booking_id)
+
+    def refresh(self, db: Session) -> int:
+        """Compter les réservations apparues en base depuis le dernier passage (une requête agrégée)"""
+        # Borne lue d'abord: une réservation commitée pendant l'agrégat sera comptée au prochain passage.
+        # Toute réservation de l'API visible ici a été réservée avant son commit, donc figure dans skip_ids.
+        max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM bookings")).scalar() or 0
+        with self._lock:
+            low_id = max(0, self.last_booking_id - self.id_lag)
+            skip_ids = list(self._recorded_ids) or [0]
+        # Ids comptés dans la marge: relus au prochain passage, à ignorer alors
+        recent_floor = max(0, int(max_id) - self.id_lag)
+
+        rows = db.execute(text("""
+            SELECT f.destination,
+                   FLOOR(EXTRACT(epoch FROM b.booking_date) / :bucket) as hour,
+                   COUNT(*) as booking_count,
+                   SUM(EXTRACT(epoch FROM (f.departure_time - b.booking_date)) / 86400) as lead_days,
+                   ARRAY_AGG(b.id) FILTER (WHERE b.id > :recent_floor) as recent_ids
+            FROM bookings b
+            JOIN flights f ON b.flight_id = f.id
+            WHERE b.id > :low_id
+            AND b.id <= :max_id
+            AND b.id <> ALL(:skip_ids)
+            AND b.booking_date >= NOW() - make_interval(hours => :window)
+            GROUP BY f.destination, hour
+        """), {
+            "bucket": BUCKET_SECONDS,
+            "low_id": low_id,
+            "max_id": max_id,
+            "recent_floor": recent_floor,
+            "skip_ids": skip_ids,
+            "window": self.n_buckets
+        }).fetchall()
+
+        with self._lock:
+            for destination, hour, booking_count, lead_days, recent_ids in rows:
+                self._add(destination, int(hour), float(booking_count), float(lead_days or 0.0))
+                self._recorded_ids.update(recent_ids or ())
+            self.last_booking_id = max(self.last_booking_id, int(max_id))
+            floor = self.last_booking_id - self.id_lag
+            self._recorded_ids = {bid for bid in self._recorded_ids if bid > floor}
+            self.is_loaded = True
+
+        return sum(int(row[2]) for row in rows)
+
+    def backfill(self, db: Session) -> None:
+        """Remplir le buffer avec les 30 derniers jours de réservations"""
+        with self._lock:
+            self.bucket_hours[:] = -1
+            self.counts[:] = 0
+            self.lead_days[:] = 0
+            self.last_booking_id = 0
+            self._recorded_ids = set()
+        total = self.refresh(db)
+        logger.info(f"🔥 Tendances initialisées: {total} réservations, {len(self.destinations)} destinations")
+
+    # === LECTURE ===
+
+    def top(self, window_hours: int = 24, limit: int = 10, min_count: float = 1) -> List[Dict]:
+        """Top-N des destinations sur les `window_hours` dernières heures"""
+        window_hours = max(1, min(window_hours, self.n_buckets))
+        current_hour = self._hour(datetime.now())
+
+        with self._lock:
+            if not self.destinations:
+                return []
+            hours = np.arange(current_hour - window_hours + 1, current_hour + 1)
+            slots = hours % self.n_buckets
+            valid = slots[self.bucket_hours[slots] == hours]
+            counts = self.counts[valid].sum(axis=0)
+            lead_days = self.lead_days[valid].sum(axis=0)
+            destinations = list(self.destinations)
+
+        order = np.argsort(-counts, kind="stable")[:limit]
+        return [
+            {
+                "destination": destinations[i],
+                "bookings": int(counts[i]),
+                "avg_lead_days": round(float(lead_days[i] / counts[i]), 2)
+            }
+            for i in order
+            if counts[i] >= min_count
+        ]
+
+    # === INTERNES ===
+
+    def _hour(self, moment: datetime) -> int:
+        return int((moment - EPOCH).total_seconds() // BUCKET_SECONDS)
+
+    def _add(self, destination: str, hour: int, count: float, lead_days: float) -> None:
+        current_hour = self._hour(datetime.now())
+        if hour <= current_hour - self.n_buckets or hour > current_hour + 1:
+            return
+
+        slot = hour % self.n_buckets
+        if self.bucket_hours[slot] != hour:
+            if self.bucket_hours[slot] > hour:
+                return
+            # Slot occupé par une heure sortie de la fenêtre: le recycler
+            self.bucket_hours[slot] = hour
+            self.counts[slot] = 0
+            self.lead_days[slot] = 0
+
+        column = self._ensure_destination(destination)
+        self.counts[slot, column] = max(0.0, self.counts[slot, column] + count)
+        self.lead_days[slot, column] += lead_days
+
+    def _ensure_destination(self, destination: str) -> int:
+        index = self.destination_index.get(destination)
+        if index is None:
+            index = len(self.destinations)
+            self.destinations.append(destination)
+            self.destination_index[destination] = index
+            self.counts = np.hstack([self.counts, np.zeros((self.n_buckets, 1))])
+            self.lead_days = np.hstack([self.lead_days, np.zeros((self.n_buckets, 1))])
+        return index
+
+
+# Instance partagée par l'API
+trending_destinations = TrendingDestinations()
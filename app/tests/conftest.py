@@ -1,17 +1,18 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from datetime import datetime, timedelta
 
-from main import app
-from database import get_db, Base
+from main import app, start_background_tasks
+from database import get_async_db, get_db, Base
 from models import Flight, Passenger, Service, Booking
 
-# Base de données de test en mémoire
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessions liées au moteur de test par la fixture test_engine (base dans un répertoire temporaire)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+TestingAsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
 
 def override_get_db():
     try:
@@ -20,25 +21,49 @@ def override_get_db():
     finally:
         db.close()
 
-# Override de la dépendance
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+# Override des dépendances
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+# Pas de tâches de fond en test: elles ouvrent leurs sessions sur la base PostgreSQL réelle
+app.router.on_startup.remove(start_background_tasks)
+
+@pytest.fixture(scope="session")
+def test_engine(tmp_path_factory):
+    """Base SQLite de la session de tests, hors de l'arbre du dépôt"""
+    path = tmp_path_factory.mktemp("db") / "test.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    TestingSessionLocal.configure(bind=engine)
+    # Même fichier via aiosqlite pour les services asynchrones (une boucle par TestClient: pas de pool)
+    TestingAsyncSessionLocal.configure(bind=create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool))
+    yield engine
+    engine.dispose()
 
 @pytest.fixture
-def client():
-    Base.metadata.create_all(bind=engine)
+def client(test_engine):
+    Base.metadata.create_all(bind=test_engine)
     with TestClient(app) as test_client:
         yield test_client
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=test_engine)
 
 @pytest.fixture
-def db_session():
-    Base.metadata.create_all(bind=engine)
+def db_session(test_engine):
+    Base.metadata.create_all(bind=test_engine)
     db = TestingSessionLocal()
     try:
         yield db
     finally:
         db.close()
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=test_engine)
+
+@pytest.fixture
+async def async_db_session(db_session):
+    async with TestingAsyncSessionLocal() as db:
+        yield db
 
 @pytest.fixture
 def sample_flight_data():
@@ -10,9 +10,12 @@ def test_health_check(client):
     assert data["status"] == "healthy"
 
 def test_root_endpoint(client):
-    """Test de l'endpoint racine"""
+    """Test de l'endpoint racine (page web) et des informations JSON de l'API"""
     response = client.get("/")
     assert response.status_code == 200
+    
+    response = client.get("/api")
+    assert response.status_code == 200
     data = response.json()
     assert "message" in data
     assert "CDG Airport Management System API" in data["message"]
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+from models import Passenger
+from services.batch_loader import BatchLoader, get_loaders, pipeline_loaders
+
+
+@pytest.fixture
+def passengers(db_session):
+    passengers = [Passenger(first_name=f"P{i}", last_name="Test", email=f"p{i}@example.com") for i in range(4)]
+    db_session.add_all(passengers)
+    db_session.commit()
+    return passengers
+
+
+class TestBatchLoader:
+    async def test_loads_of_one_tick_share_a_query(self, db_session, passengers):
+        loader = BatchLoader(db_session, Passenger)
+        ids = [passenger.id for passenger in passengers]
+
+        # Doublons et id inconnu dans le même tour de boucle: une seule requête IN (...)
+        loaded = await asyncio.gather(loader.load(ids[0]), *(loader.load(pid) for pid in ids + [999]))
+
+        assert loader.queries == 1
+        assert loaded[0] is loaded[1] is passengers[0]
+        assert loaded[2:] == passengers[1:] + [None]
+
+    async def test_cached_and_primed_entities_are_not_reloaded(self, db_session, passengers):
+        loader = BatchLoader(db_session, Passenger)
+        loader.prime(passengers[0])
+
+        assert await loader.load(passengers[0].id) is passengers[0]
+        assert loader.queries == 0
+
+        await loader.load(passengers[1].id)
+        await loader.load_many([passengers[1].id, 999])
+        # 999 absent: mémorisé comme None, pas relu au tour suivant
+        assert await loader.load(999) is None
+        assert loader.queries == 2
+
+    async def test_separate_ticks_issue_separate_queries(self, db_session, passengers):
+        loader = BatchLoader(db_session, Passenger)
+
+        await loader.load(passengers[0].id)
+        await loader.load(passengers[1].id)
+
+        assert loader.queries == 2
+
+
+class TestGetLoaders:
+    def test_scope_is_shared_for_the_same_session(self, db_session):
+        with pipeline_loaders(db_session) as loaders:
+            assert get_loaders(db_session) is loaders
+        assert get_loaders(db_session) is not loaders
+
+    def test_other_session_gets_ephemeral_loaders(self, db_session, test_engine):
+        with Session(bind=test_engine) as other, pipeline_loaders(db_session) as loaders:
+            ephemeral = get_loaders(other)
+            assert ephemeral is not loaders
+            assert ephemeral.flights.db is other
+            assert get_loaders(other) is not ephemeral
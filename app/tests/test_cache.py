@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge monotone du cache, avancée à la main"""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr("services.cache.time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self, clock):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Lecture: "a" devient le plus récent, "b" est évincé
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert (cache.get("a"), cache.get("c")) == (1, 3)
+        assert len(cache) == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire_after_ttl(self, clock):
+        cache = LRUCache(ttl=30)
+        cache.set("default", 1)
+        cache.set("short", 2, ttl=5)
+
+        clock.now += 5
+        assert cache.get("short") is None
+        assert cache.get("default") == 1
+
+        clock.now += 25
+        assert cache.get("default") is None
+        assert len(cache) == 0
+        assert cache.stats()["expirations"] == 2
+
+    def test_invalidate_group_drops_only_its_entries(self, clock):
+        cache = LRUCache()
+        cache.set(("recs", 1, 5), "a", group=1)
+        cache.set(("recs", 1, 10), "b", group=1)
+        cache.set(("recs", 2, 5), "c", group=2)
+
+        assert cache.invalidate_group(1) == 2
+        assert cache.get(("recs", 1, 5)) is None
+        assert cache.get(("recs", 1, 10)) is None
+        assert cache.get(("recs", 2, 5)) == "c"
+        assert cache.invalidate_group(1) == 0
+        assert cache.stats()["invalidations"] == 2
+
+    def test_evicted_and_replaced_keys_leave_their_group(self, clock):
+        cache = LRUCache(max_entries=1)
+        cache.set("a", 1, group="g")
+        cache.set("a", 2, group="h")
+        assert cache._groups == {"h": {"a"}}
+
+        cache.set("b", 3, group="g")
+        assert cache._groups == {"g": {"b"}}
+        assert cache.invalidate_group("h") == 0
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Flight, Service
+from services.change_feed import ChangeFeed, DeltaFilter
+
+
+def add_flight(db, number, terminal="2E", status="SCHEDULED"):
+    flight = Flight(flight_number=number, airline="Air France", origin="Paris CDG", destination="Rome",
+                    departure_time=datetime.now() + timedelta(hours=3), arrival_time=datetime.now() + timedelta(hours=5),
+                    terminal=terminal, status=status, capacity=100)
+    db.add(flight)
+    db.commit()
+    return flight
+
+
+class TestChangeFeed:
+    def test_first_poll_loads_snapshot_without_deltas(self, db_session):
+        add_flight(db_session, "AF1")
+        feed = ChangeFeed(sweep_interval=0)
+
+        assert feed.poll(db_session) == []
+        snapshot = feed.snapshot(DeltaFilter(["flights", "services"]))
+        assert [row["flight_number"] for row in snapshot["flights"]] == ["AF1"]
+        assert snapshot["services"] == []
+
+    def test_only_changed_rows_and_fields_are_reported(self, db_session):
+        flight = add_flight(db_session, "AF1")
+        add_flight(db_session, "AF2")
+        feed = ChangeFeed(sweep_interval=3600)
+        feed.poll(db_session)
+
+        # Relecture de la marge du filigrane: aucune ligne inchangée ne ressort
+        assert feed.poll(db_session) == []
+
+        flight.gate = "K42"
+        db_session.commit()
+        changes = feed.poll(db_session)
+        assert len(changes) == 1
+        assert DeltaFilter(["flights"]).delta(changes[0]) == {
+            "table": "flights", "op": "update", "id": flight.id, "fields": {"gate": "K42"}
+        }
+
+    def test_rows_entering_and_leaving_filters(self, db_session):
+        flight = add_flight(db_session, "AF1", status="SCHEDULED")
+        feed = ChangeFeed(sweep_interval=3600)
+        feed.poll(db_session)
+        boarding = DeltaFilter(["flights"], status=["BOARDING"])
+
+        flight.status = "BOARDING"
+        db_session.commit()
+        entered = boarding.delta(feed.poll(db_session)[0])
+        assert entered["op"] == "insert" and entered["row"]["flight_number"] == "AF1"
+
+        flight.status = "DEPARTED"
+        db_session.commit()
+        assert boarding.delta(feed.poll(db_session)[0]) == {"table": "flights", "op": "delete", "id": flight.id}
+
+        flight.gate = "A1"
+        db_session.commit()
+        assert DeltaFilter(["flights"], terminal=["1"]).delta(feed.poll(db_session)[0]) is None
+
+    def test_deleted_rows_found_by_sweep(self, db_session):
+        service = Service(name="Relay", type="SHOP", terminal="2A", capacity=20)
+        db_session.add(service)
+        db_session.commit()
+        feed = ChangeFeed(sweep_interval=0)
+        feed.poll(db_session)
+
+        db_session.delete(service)
+        db_session.commit()
+        changes = feed.poll(db_session)
+        assert [(change["table"], change["op"]) for change in changes] == [("services", "delete")]
+        assert feed.stats()["rows"]["services"] == 0
+
+    def test_publish_filters_per_subscriber_and_resyncs_slow_ones(self):
+        feed = ChangeFeed(queue_size=2)
+        terminal_1, all_flights = feed.new_queue(), feed.new_queue()
+        feed.subscribe(terminal_1, DeltaFilter(["flights"], terminal=["1"]))
+        feed.subscribe(all_flights, DeltaFilter(["flights"]))
+        for queue in (terminal_1, all_flights):
+            assert queue.get_nowait()["type"] == "snapshot"
+
+        change = {"table": "flights", "op": "update", "id": 7,
+                  "before": {"terminal": "2E", "gate": "A1"}, "after": {"terminal": "2E", "gate": "A2"}}
+        for _ in range(3):
+            feed.publish([change])
+
+        assert terminal_1.empty()
+        assert all_flights.get_nowait() == {"type": "resync"}
+        assert feed.stats()["resyncs"] == 1
+
+    def test_invalid_filters_rejected(self):
+        with pytest.raises(ValueError):
+            DeltaFilter.from_message({"gate": ["A1"]})
+        with pytest.raises(ValueError):
+            DeltaFilter.from_message({"tables": ["bookings"]})
+        assert DeltaFilter.from_message({"terminal": "2E"}).terminal == {"2E"}
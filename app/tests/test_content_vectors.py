@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from models import Flight
+from services.content_vectors import DestinationContentVectors, _token
+
+
+def add_flight(db, number, destination, airline, price):
+    departure = datetime.now() + timedelta(days=3)
+    db.add(Flight(flight_number=number, airline=airline, origin="Paris CDG", destination=destination,
+                  departure_time=departure, arrival_time=departure + timedelta(hours=8), capacity=100,
+                  aircraft_type="Boeing 777", terminal="2E", price=price))
+
+
+@pytest.fixture
+def vectors(db_session):
+    add_flight(db_session, "AF1", "New York", "Air France", 2000)
+    add_flight(db_session, "DL1", "New York", "Delta Air Lines", 1800)
+    add_flight(db_session, "AZ1", "Rome", "ITA Airways", 200)
+    add_flight(db_session, "AF2", "Rio de Janeiro", "Air France", 900)
+    db_session.commit()
+    vectors = DestinationContentVectors()
+    vectors.build(db_session)
+    return vectors
+
+
+def passenger(preferred, travel_class=None):
+    return SimpleNamespace(preferred_destinations=preferred, travel_class_preference=travel_class)
+
+
+class TestDestinationContentVectors:
+    def test_multi_word_values_are_single_terms(self, vectors):
+        assert _token("New  York") == "new_york"
+        vocabulary = vectors.vectorizer.vocabulary_
+        for term in ["new_york", "rio_de_janeiro", "air_france", "delta_air_lines", "terminal_2e", "tier_business"]:
+            assert term in vocabulary
+        # Pas de mots isolés: « New York » et « Air France » ne partagent pas de terme « air » / « new »
+        assert not {"new", "york", "air", "france", "rio", "janeiro"} & set(vocabulary)
+
+    def test_profile_terms_match_document_terms(self, vectors):
+        # Destination préférée hors index: vectorisée par son nom, avec le même découpage que les documents
+        with vectors._lock:
+            vectors.destination_index.pop("New York")
+        vector = vectors.profile_vector(["New York"], None)
+
+        vocabulary = vectors.vectorizer.vocabulary_
+        assert vector.indices.tolist() == [vocabulary["new_york"]]
+
+    def test_top_destinations_follow_preferences_and_class(self, vectors):
+        assert vectors.top_destinations(passenger(["New York"]), k=1)[0][0] == "New York"
+
+        ranked = [dest for dest, _ in vectors.top_destinations(passenger([], "BUSINESS"), k=3)]
+        assert ranked == ["New York"]
+        assert vectors.top_destinations(passenger(["Lima"]), k=3) == []
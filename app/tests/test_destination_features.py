@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from models import Booking, Flight, Passenger
+from services.destination_features import COMPOSITE_WEIGHTS, DestinationFeatureStore, destination_feature_store, seasonal_factor
+from services.flight_index import bookable_flight_index
+from services.recommendation_service import AdvancedRecommendationService
+
+
+def add_flight(db, number, destination, price, capacity=100, occupied=0, days=5):
+    departure = datetime.now() + timedelta(days=days)
+    flight = Flight(flight_number=number, airline="Air France", origin="Paris CDG", destination=destination,
+                    departure_time=departure, arrival_time=departure + timedelta(hours=3),
+                    capacity=capacity, occupied_seats=occupied, price=price)
+    db.add(flight)
+    return flight
+
+
+@pytest.fixture
+def flights(db_session):
+    flights = {
+        "rome_low": add_flight(db_session, "AF1", "Rome", 200, occupied=50),
+        "rome_high": add_flight(db_session, "AF2", "Rome", 600, occupied=0),
+        "dubai": add_flight(db_session, "AF3", "Dubai", 900),
+        "oslo": add_flight(db_session, "AF4", "Oslo", 400, occupied=95),
+    }
+    passenger = Passenger(first_name="Ana", last_name="Lima", email="ana@example.com",
+                          preferred_destinations=["Oslo", "Dubai", "Rome", "Lima"])
+    db_session.add(passenger)
+    db_session.flush()
+    for i in range(5):
+        db_session.add(Booking(passenger_id=passenger.id, flight_id=flights["rome_low"].id,
+                               booking_reference=f"R{i}", booking_date=datetime.now() - timedelta(days=i)))
+    db_session.commit()
+    return flights, passenger
+
+
+class TestDestinationFeatureStore:
+    def test_refresh_computes_features_in_one_query(self, db_session, flights):
+        store = DestinationFeatureStore()
+        store.refresh(db_session)
+        rome = store.destination_index["Rome"]
+
+        assert sorted(store.destinations) == ["Dubai", "Oslo", "Rome"]
+        assert (store.price_min[rome], store.price_avg[rome], store.price_max[rome]) == (200, 400, 600)
+        assert store.free_seat_ratio[rome] == pytest.approx(0.75)
+        assert store.bookings_90d[rome] == 5
+        assert store.factors[rome].tolist() == pytest.approx([seasonal_factor("Rome"), 0.5, 0.75, 0.1])
+
+    def test_unknown_destination_gets_defaults(self, db_session, flights):
+        store = DestinationFeatureStore()
+        store.refresh(db_session)
+
+        scores = store.composite_scores(["Lima"])
+        expected = np.array([seasonal_factor("Lima"), 0.7, 0.5, 0.3]) @ COMPOSITE_WEIGHTS
+        assert scores.tolist() == pytest.approx([expected])
+
+
+class TestDestinationScoringStage:
+    async def test_preferred_destinations_above_threshold_ranked_by_score(self, db_session, flights):
+        flight_rows, passenger = flights
+        destination_feature_store.refresh(db_session)
+        bookable_flight_index.build(db_session)
+
+        recommendations = await AdvancedRecommendationService()._generate_destination_recommendations(
+            db_session, passenger, limit=5
+        )
+
+        scores = dict(zip(["Oslo", "Dubai", "Rome", "Lima"], destination_feature_store.composite_scores(
+            ["Oslo", "Dubai", "Rome", "Lima"]
+        ).tolist()))
+        # Oslo (presque complet) sous le seuil, Lima sans vol
+        expected = sorted((dest for dest in ["Dubai", "Rome"] if scores[dest] > 0.6), key=lambda dest: -scores[dest])
+        assert [rec["type"] for rec in recommendations] == ["ADVANCED_SCORING"] * len(expected)
+        assert [rec["flight_id"] for rec in recommendations] == [
+            {"Dubai": flight_rows["dubai"].id, "Rome": flight_rows["rome_high"].id}[dest] for dest in expected
+        ]
+        assert scores["Oslo"] <= 0.6
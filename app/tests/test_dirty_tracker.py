@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from models import Booking, Flight, Passenger
+from services.dirty_tracker import REASON_BOOKING, DirtyPassengerTracker
+
+
+def add_booking(db, booking_id, passenger, flight):
+    db.add(Booking(id=booking_id, passenger_id=passenger.id, flight_id=flight.id, booking_reference=f"B{booking_id}"))
+    db.commit()
+
+
+class TestDirtyPassengerTracker:
+    def test_reconcile_marks_bookings_committed_out_of_order_once(self, db_session):
+        departure = datetime.now() + timedelta(days=5)
+        flight = Flight(flight_number="AF1", airline="Air France", origin="Paris CDG", destination="Rome",
+                        departure_time=departure, arrival_time=departure + timedelta(hours=2), capacity=100)
+        passengers = [Passenger(first_name=f"P{i}", last_name="Test", email=f"p{i}@example.com") for i in range(3)]
+        db_session.add_all([flight, *passengers])
+        db_session.commit()
+
+        tracker = DirtyPassengerTracker()
+        tracker.reconcile(db_session)
+        add_booking(db_session, 50, passengers[0], flight)
+        assert tracker.reconcile(db_session) == 1
+        assert tracker.take(10) == [passengers[0].id]
+
+        # Id 40 attribué avant la réservation 50 mais commité après la réconciliation
+        add_booking(db_session, 40, passengers[1], flight)
+        assert tracker.reconcile(db_session) == 1
+        assert tracker.take(10) == [passengers[1].id]
+        assert tracker.last_booking_id == 50
+
+        # Les réservations de la marge déjà vues ne remarquent personne
+        assert tracker.reconcile(db_session) == 0
+        assert tracker.marked[REASON_BOOKING] == 2
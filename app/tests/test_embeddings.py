@@ -0,0 +1,32 @@
+import numpy as np
+
+from services.embeddings import EmbeddingRecommender
+from services.interaction_matrix import InteractionMatrix
+from services.model_registry import ModelRegistry
+
+
+def publish(registry, destinations):
+    """Une version où le passager 1 préfère la dernière destination"""
+    count = len(destinations)
+    return registry.publish({}, {}, arrays={
+        "passenger_embeddings": np.eye(1, count, count - 1, dtype=np.float32),
+        "destination_embeddings": np.eye(count, dtype=np.float32),
+        "embedding_passenger_ids": np.array([1], dtype=np.int64),
+        "embedding_destinations": np.asarray(destinations, dtype=str)
+    })
+
+
+class TestEmbeddingRecommender:
+    def test_hot_reload_swaps_arrays_and_index_together(self, tmp_path):
+        registry = ModelRegistry(root=str(tmp_path), mmap=False)
+        recommender = EmbeddingRecommender(registry, InteractionMatrix())
+        first = publish(registry, ["Rome", "Tokyo"])
+        assert recommender.top_destinations(1, k=1)[0][0] == "Tokyo"
+
+        second = publish(registry, ["Rome", "Tokyo", "Oslo"])
+        registry.load(second)
+        state = recommender._arrays()
+        assert state.version == second != first
+        assert state.names == ["Rome", "Tokyo", "Oslo"]
+        assert state.destinations.shape[0] == len(state.destination_index) == state.fold_in.shape[0]
+        assert recommender.top_destinations(1, k=1)[0][0] == "Oslo"
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+
+from models import Event, Flight
+from services.event_stream import EventBroadcaster, format_event
+
+
+def make_event(event_id, event_type="GATE_CHANGE"):
+    return format_event(event_id, event_type, f"Événement {event_id}", datetime(2024, 1, 1), None, None, None)
+
+
+async def next_message(stream):
+    return await asyncio.wait_for(stream.__anext__(), timeout=1)
+
+
+class TestEventBroadcaster:
+    def test_publish_fans_out_to_every_subscriber(self):
+        broadcaster = EventBroadcaster()
+        first, second = broadcaster.subscribe(), broadcaster.subscribe()
+        broadcaster.publish([make_event(1), make_event(2)])
+
+        for queue in (first, second):
+            assert [queue.get_nowait()["id"] for _ in range(2)] == [1, 2]
+        assert broadcaster.stats()["last_event_id"] == 2
+
+    def test_slow_subscriber_is_dropped(self):
+        broadcaster = EventBroadcaster(queue_size=2)
+        slow = broadcaster.subscribe()
+        broadcaster.publish([make_event(1), make_event(2), make_event(3)])
+
+        assert broadcaster.stats()["subscribers"] == 0
+        assert broadcaster.stats()["dropped_subscribers"] == 1
+        assert slow.get_nowait()["id"] == 2
+        assert slow.get_nowait() is None
+
+    async def test_stream_catches_up_from_buffer_without_duplicates(self, async_db_session):
+        broadcaster = EventBroadcaster()
+        broadcaster.publish([make_event(i) for i in range(1, 6)])
+
+        stream = broadcaster.stream(async_db_session, last_event_id=3)
+        assert (await next_message(stream)).startswith("retry:")
+        assert (await next_message(stream)).startswith("id: 4\n")
+        assert (await next_message(stream)).startswith("id: 5\n")
+
+        broadcaster.publish([make_event(5), make_event(6)])
+        assert (await next_message(stream)).startswith("id: 6\n")
+        await stream.aclose()
+        assert broadcaster.stats()["subscribers"] == 0
+
+    async def test_catch_up_reads_database_when_buffer_is_too_recent(self, db_session, async_db_session):
+        flight = Flight(flight_number="AF1", airline="Air France", origin="Paris CDG", destination="Rome",
+                        departure_time=datetime(2024, 1, 1, 10), arrival_time=datetime(2024, 1, 1, 12), capacity=100)
+        db_session.add(flight)
+        db_session.flush()
+        db_session.add_all([Event(event_type="GATE_CHANGE", flight_id=flight.id, description=str(i)) for i in range(3)])
+        db_session.commit()
+
+        broadcaster = EventBroadcaster()
+        broadcaster.publish([make_event(100)])
+        events = await broadcaster.catch_up(async_db_session, last_event_id=1)
+
+        assert [event["id"] for event in events] == [2, 3]
+        assert events[0]["destination"] == "Rome"
+        assert events[0]["emoji"] == "🚪"
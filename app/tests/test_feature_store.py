@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Booking, Flight, Passenger
+from services.feature_store import PassengerFeatureStore
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def passengers(db_session):
+    departure = datetime.now() + timedelta(days=5)
+    flight = Flight(flight_number="AF1", airline="Air France", origin="Paris CDG", destination="Rome",
+                    departure_time=departure, arrival_time=departure + timedelta(hours=2), capacity=100)
+    passengers = [
+        Passenger(first_name=f"P{i}", last_name="Test", email=f"p{i}@example.com", nationality="France",
+                  travel_class_preference="ECONOMY", preferred_destinations=["Rome"], updated_at=NOW)
+        for i in range(3)
+    ]
+    db_session.add_all([flight, *passengers])
+    db_session.flush()
+    # Dernière réservation vue: id 50
+    db_session.add(Booking(id=50, passenger_id=passengers[0].id, flight_id=flight.id, booking_reference="B50"))
+    db_session.commit()
+    return flight, passengers
+
+
+def refreshed_store(db_session, **kwargs):
+    store = PassengerFeatureStore(**kwargs)
+    store.refresh(db_session)
+    notified, removed = [], []
+    store.add_listener(notified.extend)
+    store.add_removal_listener(removed.extend)
+    return store, notified, removed
+
+
+class TestPassengerFeatureStore:
+    def test_booking_committed_late_below_last_id_is_read(self, db_session, passengers):
+        flight, (first, second, _) = passengers
+        store, notified, _ = refreshed_store(db_session)
+        assert store.last_booking_id == 50
+
+        # Id attribué avant la réservation 50, commité après le rafraîchissement
+        db_session.add(Booking(id=40, passenger_id=second.id, flight_id=flight.id, booking_reference="B40"))
+        db_session.commit()
+
+        assert store.refresh(db_session) == 1
+        assert notified == [second.id]
+        assert store.features_for(second.id)[0] == 1
+
+    def test_update_at_watermark_is_read(self, db_session, passengers):
+        _, (first, _, third) = passengers
+        store, notified, _ = refreshed_store(db_session)
+        assert store.watermark == NOW
+
+        # Même updated_at que le filigrane (écriture concurrente dans la même seconde)
+        third.preferred_destinations = ["Rome", "Oslo"]
+        third.updated_at = NOW
+        db_session.commit()
+
+        assert store.refresh(db_session) == 1
+        assert notified == [third.id]
+        assert store.features_for(third.id)[1] == 2
+
+    def test_rows_reread_in_margin_are_not_notified(self, db_session, passengers):
+        store, notified, _ = refreshed_store(db_session)
+
+        assert store.refresh(db_session) == 0
+        assert notified == []
+
+    def test_sweep_removes_passengers_deleted_in_database(self, db_session, passengers):
+        _, (first, second, third) = passengers
+        store, _, removed = refreshed_store(db_session, sweep_interval=0)
+
+        db_session.delete(second)
+        db_session.commit()
+        store.refresh(db_session)
+
+        assert removed == [second.id]
+        assert store.features_for(second.id) is None
+        assert sorted(store.row_of) == sorted([first.id, third.id])
+        assert store.ids.tolist() == [pid for pid, _ in sorted(store.row_of.items(), key=lambda item: item[1])]
+        assert store.features.shape == (2, 4)
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from models import Flight
+from services.flight_index import BookableFlightIndex
+
+DESTINATIONS = ["Rome", "Tokyo", "Madrid"]
+
+
+def legacy_best(flights, destination, preferred_class):
+    """Ancien ORDER BY de _find_optimal_flight_to_destination, référence de l'index"""
+    now = datetime.now()
+    candidates = [
+        flight for flight in flights
+        if flight.destination == destination and flight.departure_time > now
+        and flight.status == "SCHEDULED" and flight.occupied_seats < flight.capacity
+    ]
+    candidates.sort(key=lambda flight: (
+        1 if preferred_class == "BUSINESS" and flight.price > 800 else 2,
+        -(flight.capacity - flight.occupied_seats),
+        flight.departure_time
+    ))
+    return candidates[0].id if candidates else None
+
+
+@pytest.fixture
+def flights(db_session):
+    rng = random.Random(3)
+    flights = []
+    for i in range(60):
+        departure = datetime.now() + timedelta(hours=rng.randint(-48, 240), minutes=i)
+        capacity = rng.choice([50, 100, 180])
+        flight = Flight(
+            flight_number=f"AF{i}", airline="Air France", origin="Paris CDG",
+            destination=rng.choice(DESTINATIONS), departure_time=departure,
+            arrival_time=departure + timedelta(hours=2), capacity=capacity,
+            occupied_seats=rng.choice([0, capacity // 2, capacity - 1, capacity]),
+            price=rng.choice([300, 750, 900, 1500]), status=rng.choice(["SCHEDULED", "SCHEDULED", "CANCELLED"])
+        )
+        db_session.add(flight)
+        flights.append(flight)
+    db_session.commit()
+    return flights
+
+
+class TestBookableFlightIndex:
+    @pytest.mark.parametrize("travel_class", ["ECONOMY", "BUSINESS", None])
+    def test_best_matches_legacy_order(self, db_session, flights, travel_class):
+        index = BookableFlightIndex()
+        index.build(db_session)
+
+        for destination in DESTINATIONS + ["Oslo"]:
+            assert index.best(destination, travel_class) == legacy_best(flights, destination, travel_class)
+
+    def test_upsert_follows_occupancy_changes(self, db_session, flights):
+        index = BookableFlightIndex()
+        index.build(db_session)
+
+        for destination in DESTINATIONS:
+            for travel_class in ["ECONOMY", "BUSINESS"]:
+                best_id = index.best(destination, travel_class)
+                if best_id is None:
+                    continue
+                # Le meilleur vol devient complet: il sort de l'index au profit du suivant
+                best = next(flight for flight in flights if flight.id == best_id)
+                best.occupied_seats = best.capacity
+                index.upsert_flight(best)
+                assert index.best(destination, travel_class) == legacy_best(flights, destination, travel_class)
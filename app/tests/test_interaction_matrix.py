@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Booking, Flight, Passenger
+from services.interaction_matrix import InteractionMatrix
+
+
+def add_flight(db, number, destination, status="DEPARTED"):
+    departure = datetime.now() - timedelta(days=2)
+    flight = Flight(flight_number=number, airline="Air France", origin="Paris CDG", destination=destination,
+                    departure_time=departure, arrival_time=departure + timedelta(hours=2), capacity=100,
+                    status=status)
+    db.add(flight)
+    db.flush()
+    return flight
+
+
+def add_booking(db, passenger, flight):
+    db.add(Booking(passenger_id=passenger.id, flight_id=flight.id, booking_reference=f"B{passenger.id}-{flight.id}"))
+
+
+@pytest.fixture
+def history(db_session):
+    passengers = [Passenger(first_name=f"P{i}", last_name="Test", email=f"p{i}@example.com") for i in range(3)]
+    db_session.add_all(passengers)
+    flights = {"rome": add_flight(db_session, "AF1", "Rome"), "tokyo": add_flight(db_session, "AF2", "Tokyo"),
+               "oslo": add_flight(db_session, "AF3", "Oslo", status="SCHEDULED")}
+    add_booking(db_session, passengers[0], flights["rome"])
+    add_booking(db_session, passengers[1], flights["tokyo"])
+    add_booking(db_session, passengers[2], flights["oslo"])
+    db_session.commit()
+    return passengers, flights
+
+
+def count(matrix, passenger_id, destination):
+    return matrix.matrix[matrix.passenger_index[passenger_id], matrix.destination_index[destination]]
+
+
+class TestInteractionMatrix:
+    def test_record_booking_merges_new_rows_and_columns(self, db_session, history):
+        passengers, _ = history
+        matrix = InteractionMatrix()
+        matrix.build(db_session)
+        assert matrix.shape == (2, 2)
+        notified = []
+        matrix.add_listener(notified.extend)
+
+        # Passager et destination inconnus: la CSR de base est élargie puis complétée (padding de indptr)
+        matrix.record_booking(passengers[2].id, "Lima")
+        matrix.record_booking(passengers[0].id, "Rome")
+        matrix.record_booking(passengers[1].id, "Tokyo", delta=-1)
+
+        assert matrix.matrix.shape == (3, 3)
+        assert count(matrix, passengers[2].id, "Lima") == 1
+        assert count(matrix, passengers[0].id, "Rome") == 2
+        assert count(matrix, passengers[1].id, "Tokyo") == 0
+        assert matrix.matrix.nnz == 2
+        assert notified == [passengers[2].id, passengers[0].id, passengers[1].id]
+
+    def test_record_flight_departure_counts_every_booking(self, db_session, history):
+        passengers, flights = history
+        add_booking(db_session, passengers[0], flights["oslo"])
+        db_session.commit()
+        matrix = InteractionMatrix()
+        matrix.build(db_session)
+
+        matrix.record_flight_departure(db_session, flights["oslo"].id, "Oslo")
+        assert count(matrix, passengers[0].id, "Oslo") == 1
+        assert count(matrix, passengers[2].id, "Oslo") == 1
+        assert matrix.row(passengers[2].id).toarray().tolist() == [[0, 0, 1]]
+
+        matrix.record_flight_departure(db_session, flights["oslo"].id, "Oslo", delta=-1)
+        assert matrix.row(passengers[2].id).nnz == 0
+
+    def test_initialize_rebuilds_a_stale_snapshot(self, db_session, history, tmp_path):
+        passengers, flights = history
+        path = str(tmp_path / "interaction_matrix.npz")
+        InteractionMatrix(snapshot_path=path).initialize(db_session)
+
+        fresh = InteractionMatrix(snapshot_path=path)
+        fresh.initialize(db_session)
+        assert fresh.shape == (2, 2)
+
+        # Réservation insérée directement en base après l'écriture du snapshot
+        add_booking(db_session, passengers[2], flights["rome"])
+        db_session.commit()
+        stale = InteractionMatrix(snapshot_path=path)
+        stale.initialize(db_session)
+
+        assert count(stale, passengers[2].id, "Rome") == 1
+        assert stale.watermark == stale._read_watermark(db_session)
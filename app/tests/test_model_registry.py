@@ -0,0 +1,84 @@
+import os
+import threading
+
+import numpy as np
+
+from services.model_registry import LATEST_FILE, ModelRegistry
+
+
+class TestModelRegistry:
+    def test_publish_then_load_latest(self, tmp_path):
+        registry = ModelRegistry(root=str(tmp_path))
+        version = registry.publish({"model": {"k": 3}}, {"encodings": {}}, arrays={"ids": np.arange(4)})
+
+        served = ModelRegistry(root=str(tmp_path))
+        assert served.load()
+        assert served.version == version
+        assert served.get("model") == {"k": 3}
+        assert served.metadata["version"] == version
+        ids = served.get_array("ids")
+        assert isinstance(ids, np.memmap)
+        assert ids.tolist() == [0, 1, 2, 3]
+
+    def test_publishes_in_the_same_second_get_distinct_versions(self, tmp_path):
+        registry = ModelRegistry(root=str(tmp_path))
+        versions = [registry.publish({"n": i}, {}) for i in range(3)]
+
+        assert len(set(versions)) == 3
+        assert registry.list_versions() == sorted(versions)
+        assert registry.latest_version() == versions[-1]
+
+    def test_retention_keeps_the_newest_versions(self, tmp_path):
+        registry = ModelRegistry(root=str(tmp_path))
+        versions = [registry.publish({"n": i}, {}, keep=2) for i in range(4)]
+
+        assert registry.list_versions() == versions[-2:]
+        assert sorted(os.listdir(tmp_path)) == sorted(versions[-2:] + [LATEST_FILE])
+
+    def test_maybe_reload_follows_latest(self, tmp_path):
+        registry = ModelRegistry(root=str(tmp_path))
+        registry.publish({"n": 1}, {})
+        served = ModelRegistry(root=str(tmp_path), mmap=False)
+        assert served.maybe_reload()
+        assert served.get("n") == 1
+        assert not served.maybe_reload()
+
+        latest = registry.publish({"n": 2}, {})
+        # Forcer un mtime différent même si le système de fichiers est grossier
+        stat = os.stat(os.path.join(tmp_path, LATEST_FILE))
+        os.utime(os.path.join(tmp_path, LATEST_FILE), (stat.st_atime, stat.st_mtime + 1))
+        assert served.maybe_reload()
+        assert served.version == latest
+        assert served.get("n") == 2
+
+    def test_concurrent_maybe_reload_loads_once(self, tmp_path, monkeypatch):
+        ModelRegistry(root=str(tmp_path)).publish({"n": 1}, {})
+        served = ModelRegistry(root=str(tmp_path), mmap=False)
+        loads = []
+        original = served.load
+        monkeypatch.setattr(served, "load", lambda version=None: loads.append(version) or original(version))
+
+        threads = [threading.Thread(target=served.maybe_reload) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(loads) == 1
+        assert served.get("n") == 1
+
+    def test_snapshot_reads_one_version(self, tmp_path):
+        registry = ModelRegistry(root=str(tmp_path))
+        registry.publish({"kmeans": "v1"}, {"encodings": {"nationality": ["France"]}}, arrays={"ids": np.arange(2)})
+        served = ModelRegistry(root=str(tmp_path), mmap=False)
+        served.load()
+        snapshot = served.snapshot(models=("kmeans",), arrays=("ids", "missing"))
+
+        latest = registry.publish({"kmeans": "v2"}, {"encodings": {}}, arrays={"ids": np.arange(3)})
+        served.load(latest)
+
+        assert snapshot.models == {"kmeans": "v1"}
+        assert snapshot.arrays["ids"].tolist() == [0, 1]
+        assert snapshot.arrays["missing"] is None
+        assert snapshot.metadata["encodings"] == {"nationality": ["France"]}
+        assert snapshot.version != served.version == latest
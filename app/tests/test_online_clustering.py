@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Passenger
+from services.feature_store import PassengerFeatureStore
+from services.online_clustering import OnlinePassengerClusters
+
+DESTINATIONS = ["Rome", "Tokyo", "Madrid", "Berlin"]
+
+
+def add_passengers(db, count, start=0, preferred=None):
+    """Passagers aux caractéristiques variées; updated_at futur pour être relus au rafraîchissement"""
+    passengers = []
+    for i in range(start, start + count):
+        passenger = Passenger(
+            first_name=f"P{i}", last_name="Test", email=f"p{i}@example.com",
+            nationality=["France", "Italie", "Japon"][i % 3],
+            travel_class_preference=["ECONOMY", "BUSINESS"][i % 2],
+            preferred_destinations=preferred if preferred is not None else DESTINATIONS[:i % 4],
+            updated_at=datetime.now() + timedelta(minutes=i)
+        )
+        db.add(passenger)
+        passengers.append(passenger)
+    db.commit()
+    return passengers
+
+
+@pytest.fixture
+def clusters(db_session):
+    add_passengers(db_session, 12)
+    clusters = OnlinePassengerClusters(PassengerFeatureStore(), n_clusters=3, batch_size=4)
+    assert clusters.fit(db_session)
+    return clusters
+
+
+class TestOnlinePassengerClusters:
+    def test_update_integrates_pending_passengers(self, db_session, clusters):
+        new = add_passengers(db_session, 3, start=100)
+
+        assert clusters.update(db_session) >= len(new)
+        assert clusters.partial_fits >= 1
+        assert clusters.stats()["pending"] == 0
+        for passenger in new:
+            label = clusters.cluster_for(passenger.id)
+            assert label is not None
+            assert passenger.id in clusters.members[label]
+
+    def test_drift_triggers_full_refit(self, db_session, clusters):
+        # Passagers très éloignés des centroïdes: la distance glissante dépasse le ratio
+        outliers = add_passengers(db_session, 4, start=200, preferred=[f"D{i}" for i in range(60)])
+
+        clusters.update(db_session)
+        assert clusters.refits == 2
+        assert not clusters.has_drifted()
+        assert clusters.recent_distance == clusters.baseline_distance
+        assert all(clusters.cluster_for(passenger.id) is not None for passenger in outliers)
+
+    def test_has_drifted_compares_to_baseline(self, clusters):
+        clusters.recent_distance = clusters.drift_ratio * clusters.baseline_distance * 0.9
+        assert not clusters.has_drifted()
+        clusters.recent_distance = clusters.drift_ratio * clusters.baseline_distance * 1.1
+        assert clusters.has_drifted()
+
+    def test_cluster_members_excludes_the_passenger(self, clusters):
+        for passenger_id, label in list(clusters.cluster_of.items()):
+            members = clusters.cluster_members(passenger_id, limit=100)
+            assert passenger_id not in members
+            assert set(members) == clusters.members[label] - {passenger_id}
+
+    def test_cluster_members_are_the_nearest_in_the_cluster(self, clusters):
+        for passenger_id, label in list(clusters.cluster_of.items()):
+            target = clusters.store.features_for(passenger_id)
+            others = sorted(clusters.members[label] - {passenger_id})
+            distances = {pid: float(((clusters.store.features_for(pid) - target) ** 2).sum()) for pid in others}
+
+            members = clusters.cluster_members(passenger_id, limit=2)
+            assert [distances[pid] for pid in members] == sorted(distances.values())[:2]
+
+    def test_remove_drops_passenger_from_index(self, clusters):
+        passenger_id, label = next(iter(clusters.cluster_of.items()))
+        clusters.remove(passenger_id)
+
+        assert clusters.cluster_for(passenger_id) is None
+        assert clusters.cluster_members(passenger_id) == []
+        assert passenger_id not in clusters.members[label]
+        for other in clusters.members[label]:
+            assert passenger_id not in clusters.cluster_members(other, limit=100)
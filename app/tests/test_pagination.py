@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Flight
+from services.flight_service import FlightService
+from services.pagination import decode_cursor, encode_cursor
+
+flight_service = FlightService()
+DEPARTURE = datetime(2030, 1, 1, 8, 0)
+
+
+def add_flights(db, numbers, departure=DEPARTURE):
+    for number in numbers:
+        db.add(Flight(flight_number=number, airline="Air France", origin="Paris CDG", destination="Rome",
+                      departure_time=departure, arrival_time=departure + timedelta(hours=2), capacity=100))
+    db.commit()
+
+
+class TestCursor:
+    def test_roundtrip_keeps_datetimes(self):
+        cursor = encode_cursor("departure_time", DEPARTURE, 42)
+        assert decode_cursor(cursor) == ("departure_time", DEPARTURE, 42)
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor("pas-un-curseur")
+
+
+class TestKeysetPagination:
+    async def test_walk_is_stable_when_rows_are_inserted(self, db_session, async_db_session):
+        # Même heure de départ pour tous: l'id départage
+        add_flights(db_session, [f"AF{i}" for i in range(5)])
+
+        first = await flight_service.get_flights(async_db_session, limit=2, sort="departure_time")
+        assert [flight.flight_number for flight in first.items] == ["AF0", "AF1"]
+
+        # Une insertion en tête de tri ne décale pas la page suivante
+        add_flights(db_session, ["AF9"], departure=DEPARTURE - timedelta(hours=1))
+        second = await flight_service.get_flights(async_db_session, limit=2, cursor=first.next_cursor)
+        third = await flight_service.get_flights(async_db_session, limit=2, cursor=second.next_cursor)
+        assert [flight.flight_number for flight in second.items] == ["AF2", "AF3"]
+        assert [flight.flight_number for flight in third.items] == ["AF4"]
+        assert third.next_cursor is None
+
+    async def test_skip_with_cursor_or_unknown_sort_rejected(self, db_session, async_db_session):
+        add_flights(db_session, ["AF1", "AF2"])
+        page = await flight_service.get_flights(async_db_session, limit=1)
+
+        with pytest.raises(ValueError):
+            await flight_service.get_flights(async_db_session, limit=1, skip=1, cursor=page.next_cursor)
+        with pytest.raises(ValueError):
+            await flight_service.get_flights(async_db_session, limit=1, sort="price")
+
+
+class TestPaginationEndpoints:
+    def test_legacy_list_with_next_cursor_header(self, client, sample_flight_data):
+        for number in ["AF1", "AF2", "AF3"]:
+            client.post("/flights/", json={**sample_flight_data, "flight_number": number})
+
+        response = client.get("/flights/?skip=1&limit=1")
+        assert response.status_code == 200
+        assert [flight["flight_number"] for flight in response.json()] == ["AF2"]
+        assert "X-Next-Cursor" in response.headers
+
+        last = client.get("/flights/?skip=2&limit=1")
+        assert "X-Next-Cursor" not in last.headers
+
+    def test_envelope_when_cursor_is_given(self, client, sample_flight_data):
+        for number in ["AF1", "AF2", "AF3"]:
+            client.post("/flights/", json={**sample_flight_data, "flight_number": number})
+
+        first = client.get("/flights/?cursor=&limit=2&sort=flight_number").json()
+        assert [flight["flight_number"] for flight in first["items"]] == ["AF1", "AF2"]
+
+        second = client.get("/flights/", params={"cursor": first["next_cursor"], "limit": 2}).json()
+        assert [flight["flight_number"] for flight in second["items"]] == ["AF3"]
+        assert second["next_cursor"] is None
+
+    def test_bad_cursor_or_sort_is_400(self, client):
+        assert client.get("/flights/?cursor=abc").status_code == 400
+        assert client.get("/passengers/?sort=email").status_code == 400
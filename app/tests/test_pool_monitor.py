@@ -0,0 +1,51 @@
+import os
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from services.pool_monitor import PoolMonitor
+
+
+class TestPoolMonitor:
+    def setup_method(self):
+        self.monitor = PoolMonitor(leak_threshold=0.0)
+        self.engine = create_engine(
+            "sqlite:///./test_pool.db",
+            poolclass=self.monitor.pool_class(QueuePool, "test"),
+            pool_size=2,
+            max_overflow=1
+        )
+        self.monitor.attach(self.engine, "test")
+        self.Session = sessionmaker(bind=self.engine)
+
+    def teardown_method(self):
+        self.engine.dispose()
+        os.remove("./test_pool.db")
+
+    def test_checkout_and_checkin_counted(self):
+        with self.Session() as db:
+            db.execute(text("SELECT 1"))
+            pool = self.monitor.stats()["pools"]["test"]
+            assert pool["checked_out"] == 1
+            assert pool["size"] == 2
+
+        pool = self.monitor.stats()["pools"]["test"]
+        assert pool["checked_out"] == 0
+        assert pool["idle"] == 1
+        assert pool["checkouts"] == 1
+        assert pool["wait"]["count"] == 1
+
+    def test_leak_reported_once_with_location(self):
+        leaked = self.Session()
+        leaked.execute(text("SELECT 1"))
+
+        held = self.monitor.held_connections()
+        assert len(held) == 1
+        assert held[0]["location"].startswith("tests/test_pool_monitor.py:")
+        assert held[0]["location"].endswith("test_leak_reported_once_with_location")
+
+        assert self.monitor.check_leaks() == 1
+        assert self.monitor.check_leaks() == 0
+        leaked.close()
+        assert self.monitor.held_connections() == []
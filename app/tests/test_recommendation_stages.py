@@ -0,0 +1,62 @@
+import math
+import time
+
+import pytest
+
+from models import Passenger
+from services.recommendation_service import AdvancedRecommendationService
+
+
+@pytest.fixture
+def passenger(db_session):
+    passenger = Passenger(first_name="Ana", last_name="Lima", email="ana@example.com")
+    db_session.add(passenger)
+    db_session.commit()
+    return passenger
+
+
+def stage_sleeping(seconds, seen):
+    """Branche factice: note ce qu'elle reçoit puis dure `seconds`"""
+    async def stage(db, passenger, deadline, timings):
+        seen.update(passenger_id=passenger.id, deadline=deadline, session=db)
+        time.sleep(seconds)
+        timings["inner"] = seconds
+        return [{"flight_id": 1}]
+    return stage
+
+
+class TestRunStage:
+    async def test_stage_within_deadline_reports_results_and_timings(self, db_session, passenger):
+        service = AdvancedRecommendationService(stage_timeouts={"ml": 1.0})
+        seen, timings = {}, {}
+        started = time.monotonic()
+
+        result = await service._run_stage(db_session, passenger.id, "ml", stage_sleeping(0, seen), timings)
+
+        assert result == [{"flight_id": 1}]
+        assert seen["passenger_id"] == passenger.id
+        # Session propre à la branche, délai calculé au lancement
+        assert seen["session"] is not db_session
+        assert started < seen["deadline"] <= time.monotonic() + 1.0
+        assert set(timings) == {"inner", "ml_branch"}
+
+    async def test_stage_past_deadline_returns_empty_without_its_timings(self, db_session, passenger):
+        service = AdvancedRecommendationService(stage_timeouts={"realtime": 0.05})
+        timings = {}
+        started = time.perf_counter()
+
+        result = await service._run_stage(db_session, passenger.id, "realtime", stage_sleeping(0.3, {}), timings)
+
+        assert result == []
+        assert time.perf_counter() - started < 0.25
+        assert set(timings) == {"realtime_branch"}
+
+    async def test_disabled_timeout_waits_for_the_stage(self, db_session, passenger):
+        service = AdvancedRecommendationService(stage_timeouts={"ml": None})
+        seen, timings = {}, {}
+
+        result = await service._run_stage(db_session, passenger.id, "ml", stage_sleeping(0.1, seen), timings)
+
+        assert result == [{"flight_id": 1}]
+        assert seen["deadline"] == math.inf
+        assert timings["inner"] == 0.1
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Flight, Passenger, Recommendation
+from services.recommendation_store import RecommendationStore
+
+
+@pytest.fixture
+def flight_and_passenger(db_session):
+    passenger = Passenger(first_name="Ana", last_name="Lima", email="ana@example.com")
+    flight = Flight(flight_number="AF1", airline="Air France", origin="Paris CDG", destination="Rome",
+                    departure_time=datetime.now() + timedelta(days=3),
+                    arrival_time=datetime.now() + timedelta(days=3, hours=2), capacity=100)
+    db_session.add_all([passenger, flight])
+    db_session.commit()
+    return flight, passenger
+
+
+def rows(flight, passenger, score, reason):
+    return [{
+        "passenger_id": passenger.id, "flight_id": flight.id, "recommendation_type": "ML_EMBEDDING",
+        "score": score, "reason": reason, "created_at": datetime.now()
+    }]
+
+
+class TestRecommendationStore:
+    @pytest.mark.parametrize("write", ["upsert", "_replace_keys"])
+    def test_one_row_per_key_with_latest_values(self, db_session, flight_and_passenger, write):
+        flight, passenger = flight_and_passenger
+        store = RecommendationStore()
+
+        getattr(store, write)(db_session, rows(flight, passenger, 0.4, "avant"))
+        db_session.commit()
+        db_session.query(Recommendation).update({"is_sent": True})
+        db_session.commit()
+        saved = getattr(store, write)(db_session, rows(flight, passenger, 0.8, "après"))
+        db_session.commit()
+
+        assert [(float(rec.score), rec.reason) for rec in saved] == [(0.8, "après")]
+        stored = db_session.query(Recommendation).all()
+        assert [(float(rec.score), rec.reason, rec.is_sent) for rec in stored] == [(0.8, "après", False)]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from services.scoring import hybrid_scores, top_k_order
+
+
+def reference_score(base, price, capacity, occupied, preferred, travel_class):
+    """Scoring hybride historique, candidat par candidat"""
+    if not price:
+        price_factor = 1.0
+    elif travel_class == "BUSINESS" and price > 1500:
+        price_factor = 1.2
+    elif travel_class == "ECONOMY" and price < 800:
+        price_factor = 1.2
+    elif travel_class == "FIRST" and price > 3000:
+        price_factor = 1.2
+    else:
+        price_factor = 0.8
+    availability = (capacity - occupied) / capacity if capacity > 0 else 0
+    destination_factor = 1.5 if preferred else 1.0
+    return base * price_factor * availability * destination_factor
+
+
+class TestScoringKernel:
+    def setup_method(self):
+        rng = np.random.default_rng(42)
+        n = 2000
+        # Scores de base arrondis pour provoquer des égalités
+        self.base = np.round(rng.uniform(0.1, 1.0, n), 1)
+        self.prices = [None if rng.random() < 0.05 else float(rng.choice([500, 800, 1500, 2000, 3500])) for _ in range(n)]
+        self.capacities = rng.choice([0, 150, 180, 300], n).astype(float)
+        self.occupied = np.minimum(rng.integers(0, 300, n), self.capacities)
+        self.preferred = rng.random(n) < 0.3
+
+    def test_same_scores_as_reference(self):
+        prices = np.array([np.nan if p is None else p for p in self.prices])
+        for travel_class in ["ECONOMY", "BUSINESS", "FIRST", None]:
+            scores = hybrid_scores(self.base, prices, self.capacities, self.occupied, self.preferred, travel_class)
+            expected = [
+                reference_score(*row, travel_class)
+                for row in zip(self.base, self.prices, self.capacities, self.occupied, self.preferred)
+            ]
+            np.testing.assert_allclose(scores, expected)
+
+    def test_top_k_matches_stable_sort(self):
+        scores = np.minimum(1.0, self.base)
+        expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        assert top_k_order(scores).tolist() == expected
+        for k in [0, 1, 5, 50, len(scores) + 1]:
+            assert top_k_order(scores, k).tolist() == expected[:k]
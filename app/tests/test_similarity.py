@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+import random
+
+import numpy as np
+import pytest
+
+from models import Booking, Flight, Passenger
+from services.similarity import PassengerSimilarityEngine
+
+DESTINATIONS = ["Rome", "Tokyo", "Madrid", "Berlin", "Dubai", "Londres", "Lisbonne", "Oslo"]
+
+
+def legacy_similarity(passenger1, passenger2, passenger1_destinations, passenger2_destinations):
+    """Ancien calcul par paire (_calculate_passenger_similarity), référence du moteur vectorisé"""
+    score = 0.0
+    if passenger1.nationality == passenger2.nationality:
+        score += 0.2
+    if passenger1.travel_class_preference == passenger2.travel_class_preference:
+        score += 0.2
+    if passenger1.preferred_destinations and passenger2.preferred_destinations:
+        common_prefs = set(passenger1.preferred_destinations) & set(passenger2.preferred_destinations)
+        if common_prefs:
+            score += 0.3 * (len(common_prefs) / max(len(passenger1.preferred_destinations), len(passenger2.preferred_destinations)))
+    if passenger1_destinations and passenger2_destinations:
+        common_visited = passenger1_destinations & passenger2_destinations
+        if common_visited:
+            score += 0.3 * (len(common_visited) / len(passenger1_destinations | passenger2_destinations))
+    return min(1.0, score)
+
+
+@pytest.fixture
+def population(db_session):
+    rng = random.Random(7)
+    flights = []
+    for i, destination in enumerate(DESTINATIONS):
+        flight = Flight(flight_number=f"AF{i}", airline="Air France", origin="Paris CDG", destination=destination,
+                        departure_time=datetime.now() - timedelta(days=10),
+                        arrival_time=datetime.now() - timedelta(days=10, hours=-3), capacity=100)
+        db_session.add(flight)
+        flights.append(flight)
+
+    passengers = []
+    for i in range(40):
+        passenger = Passenger(
+            first_name=f"P{i}", last_name="Test", email=f"p{i}@example.com",
+            nationality=rng.choice(["France", "Italie", None]),
+            travel_class_preference=rng.choice(["ECONOMY", "BUSINESS"]),
+            preferred_destinations=rng.sample(DESTINATIONS, rng.randint(0, 3))
+        )
+        db_session.add(passenger)
+        passengers.append(passenger)
+    db_session.flush()
+
+    visited = {}
+    for passenger in passengers:
+        chosen = rng.sample(flights, rng.randint(0, 3))
+        for flight in chosen:
+            db_session.add(Booking(passenger_id=passenger.id, flight_id=flight.id,
+                                   booking_reference=f"R{passenger.id:03d}{flight.id:02d}"))
+        visited[passenger.id] = {flight.destination for flight in chosen}
+    db_session.commit()
+
+    engine = PassengerSimilarityEngine()
+    engine.build(db_session)
+    return engine, passengers, visited
+
+
+def legacy_ranking(target, passengers, visited, min_score):
+    """Ancien find_similar_passengers: score > seuil, tri décroissant stable (ordre des ids)"""
+    scored = [
+        (other.id, legacy_similarity(target, other, visited[target.id], visited[other.id]))
+        for other in passengers if other.id != target.id
+    ]
+    scored = [(pid, score) for pid, score in scored if score > min_score]
+    return sorted(scored, key=lambda item: -item[1])
+
+
+class TestPassengerSimilarityEngine:
+    def test_scores_match_per_pair_formula(self, population):
+        engine, passengers, visited = population
+        by_id = {p.id: p for p in passengers}
+
+        for target in passengers[:10]:
+            scores = engine.scores(target, visited[target.id])
+            expected = [
+                legacy_similarity(target, by_id[pid], visited[target.id], visited[pid])
+                for pid in engine.passenger_ids.tolist()
+            ]
+            assert scores.tolist() == pytest.approx(expected, abs=1e-6)
+
+    @pytest.mark.parametrize("min_score", [0.0, 0.3, 0.5])
+    def test_ranking_and_pagination_match_legacy_order(self, population, min_score):
+        engine, passengers, visited = population
+
+        for target in passengers[:10]:
+            expected = legacy_ranking(target, passengers, visited, min_score)
+            for skip, limit in [(0, 5), (5, 5), (3, 100), (len(expected), 5)]:
+                page, total = engine.similar(target, visited[target.id], min_score=min_score,
+                                             skip=skip, limit=limit, method="exact")
+                assert total == len(expected)
+                assert [pid for pid, _ in page] == [pid for pid, _ in expected[skip:skip + limit]]
+                assert [score for _, score in page] == pytest.approx(
+                    [score for _, score in expected[skip:skip + limit]], abs=1e-6
+                )
+
+    def test_minhash_candidates_keep_exact_scores(self, population):
+        engine, passengers, visited = population
+        target = next(p for p in passengers if p.preferred_destinations)
+        exact = dict(legacy_ranking(target, passengers, visited, 0.0))
+
+        page, _ = engine.similar(target, visited[target.id], min_score=0.0, limit=100, method="minhash")
+        assert page
+        for pid, score in page:
+            assert score == pytest.approx(exact[pid], abs=1e-6)
+
+    def test_band_lookup_matches_full_scan(self, population):
+        engine, passengers, visited = population
+        minhash = engine.minhash
+
+        for target in passengers:
+            query = engine._binary_union(
+                engine._query_vector(target.preferred_destinations or []), engine._query_vector(visited[target.id])
+            )
+            keys = minhash.band_hashes(minhash.signatures(query))[0]
+            expected = np.flatnonzero((minhash.band_keys == keys).any(axis=1))
+            assert minhash.candidates(query).tolist() == expected.tolist()
+
+    @pytest.mark.parametrize("method", ["exact", "minhash"])
+    def test_inserted_passenger_is_found_with_exact_score(self, db_session, population, method):
+        engine, passengers, visited = population
+        target = next(p for p in passengers if p.preferred_destinations and visited[p.id])
+        # Même profil que la cible: mêmes signatures, donc candidat MinHash certain
+        twin = Passenger(first_name="Nouveau", last_name="Test", email="twin@example.com",
+                         nationality=target.nationality, travel_class_preference=target.travel_class_preference,
+                         preferred_destinations=list(target.preferred_destinations))
+        db_session.add(twin)
+        db_session.commit()
+
+        engine.upsert_passenger(twin, ())
+        engine.add_visit(twin, sorted(visited[target.id])[0])
+        page, _ = engine.similar(target, visited[target.id], min_score=0.0, limit=100, method=method)
+        scores = dict(page)
+        assert scores[twin.id] == pytest.approx(
+            legacy_similarity(target, twin, visited[target.id], {sorted(visited[target.id])[0]}), abs=1e-6
+        )
+
+    def test_update_replaces_and_remove_hides_the_indexed_row(self, population):
+        engine, passengers, visited = population
+        target, other = passengers[0], passengers[1]
+        other.preferred_destinations = list(target.preferred_destinations or ["Rome"])
+        other.nationality = target.nationality
+
+        engine.upsert_passenger(other)
+        page, total = engine.similar(target, visited[target.id], min_score=0.0, limit=100, method="exact")
+        assert [pid for pid, _ in page].count(other.id) == 1
+        assert dict(page)[other.id] == pytest.approx(
+            legacy_similarity(target, other, visited[target.id], visited[other.id]), abs=1e-6
+        )
+
+        engine.remove_passenger(other.id)
+        page, removed_total = engine.similar(target, visited[target.id], min_score=0.0, limit=100, method="exact")
+        assert other.id not in dict(page)
+        assert removed_total == total - 1
@@ -0,0 +1,135 @@
+"""
+Entraînement hors ligne des modèles de recommandation.
+
+Usage : python train.py [--keep 5]
+
+Ajuste le clustering des passagers (KMeans), le prédicteur de préférences
+(RandomForest) et les embeddings passagers/destinations (SVD tronquée) sur un
+instantané complet de la base, puis publie une nouvelle version d'artefacts
+que l'API recharge à chaud.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Tuple
+import argparse
+import logging
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn.ensemble import RandomForestClassifier
+
+from database import SessionLocal
+from services.model_registry import model_registry
+from services.feature_store import PassengerFeatureStore, PASSENGER_FEATURES
+from services.interaction_matrix import InteractionMatrix
+from services.embeddings import fit_embeddings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("train")
+
+# Estimateurs non ajustés, clonés à chaque entraînement (l'API ne sert que les modèles publiés)
+MODEL_TEMPLATES: Dict[str, Any] = {
+    "passenger_clusters": KMeans(n_clusters=5, random_state=42),
+    "preference_predictor": RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10)
+}
+
+
+def load_training_snapshot(db: Session) -> Tuple[np.ndarray, np.ndarray, List, Dict[str, List[str]]]:
+    """Charger les caractéristiques de tous les passagers et leur destination la plus fréquente"""
+    store = PassengerFeatureStore()
+    passenger_ids, features = store.get_matrix(db)
+
+    favourite_rows = db.execute(text("""
+        SELECT DISTINCT ON (b.passenger_id) b.passenger_id, f.destination
+        FROM bookings b
+        JOIN flights f ON b.flight_id = f.id
+        GROUP BY b.passenger_id, f.destination
+        ORDER BY b.passenger_id, COUNT(*) DESC, f.destination
+    """)).fetchall()
+    favourites = {row[0]: row[1] for row in favourite_rows}
+    labels = [favourites.get(pid) for pid in passenger_ids.tolist()]
+
+    return passenger_ids, features, labels, store.vocabularies
+
+
+def train_models(db: Session) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, np.ndarray]]:
+    """Entraîner les modèles sur un instantané de la base (sans les publier)"""
+    started = time.perf_counter()
+
+    passenger_ids, features, labels, encodings = load_training_snapshot(db)
+    logger.info(f"📥 Instantané chargé: {len(passenger_ids)} passagers en {time.perf_counter() - started:.1f}s")
+
+    models: Dict[str, Any] = {}
+    metadata: Dict[str, Any] = {
+        "features": PASSENGER_FEATURES,
+        "encodings": encodings,
+        "n_passengers": int(len(passenger_ids))
+    }
+
+    arrays: Dict[str, np.ndarray] = {}
+
+    # Clustering des passagers (affectations publiées en tableaux: ids et caractéristiques triés par cluster + bornes)
+    kmeans = clone(MODEL_TEMPLATES['passenger_clusters'])
+    if len(passenger_ids) >= kmeans.n_clusters:
+        cluster_labels = kmeans.fit_predict(features)
+        models['passenger_clusters'] = kmeans
+        order = np.argsort(cluster_labels, kind="stable")
+        arrays["cluster_passenger_ids"] = passenger_ids[order].astype(np.int64)
+        # Caractéristiques alignées sur les ids: les membres servis sont classés par distance au passager
+        arrays["cluster_features"] = features[order].astype(np.float32)
+        arrays["cluster_offsets"] = np.searchsorted(
+            cluster_labels[order], np.arange(kmeans.n_clusters + 1)
+        ).astype(np.int64)
+        metadata["kmeans_inertia"] = float(kmeans.inertia_)
+        logger.info(f"🎯 KMeans entraîné: {kmeans.n_clusters} clusters, inertie {kmeans.inertia_:.1f}")
+    else:
+        logger.warning("⚠️ Pas assez de passagers pour le clustering")
+
+    # Prédicteur de destination préférée
+    labelled = [i for i, label in enumerate(labels) if label]
+    if len({labels[i] for i in labelled}) >= 2:
+        predictor = clone(MODEL_TEMPLATES['preference_predictor'])
+        predictor.fit(features[labelled], [labels[i] for i in labelled])
+        models['preference_predictor'] = predictor
+        metadata["predictor_train_accuracy"] = float(
+            predictor.score(features[labelled], [labels[i] for i in labelled])
+        )
+        metadata["n_labelled"] = len(labelled)
+        logger.info(f"🌲 RandomForest entraîné sur {len(labelled)} passagers")
+    else:
+        logger.warning("⚠️ Pas assez d'historique pour le prédicteur de préférences")
+
+    # Embeddings passagers / destinations (factorisation des visites)
+    interactions = InteractionMatrix()
+    interactions.build(db)
+    embeddings = fit_embeddings(interactions.matrix, interactions.passenger_ids, interactions.destinations)
+    if embeddings:
+        arrays.update(embeddings)
+        metadata["embedding_factors"] = int(arrays["passenger_embeddings"].shape[1])
+        logger.info(
+            f"🧭 Embeddings entraînés: {len(interactions.passenger_ids)} passagers x "
+            f"{len(interactions.destinations)} destinations, {metadata['embedding_factors']} facteurs"
+        )
+    else:
+        logger.warning("⚠️ Pas assez d'interactions pour les embeddings")
+
+    metadata["training_seconds"] = round(time.perf_counter() - started, 2)
+    return models, metadata, arrays
+
+
+def train(keep: int = 5) -> str:
+    """Entraîner et publier une nouvelle version des modèles"""
+    with SessionLocal() as db:
+        models, metadata, arrays = train_models(db)
+    return model_registry.publish(models, metadata, keep=keep, arrays=arrays)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entraînement hors ligne des modèles de recommandation")
+    parser.add_argument("--keep", type=int, default=5, help="Nombre de versions conservées")
+    args = parser.parse_args()
+
+    version = train(keep=args.keep)
+    logger.info(f"✅ Version {version} publiée")
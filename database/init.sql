@@ -52,7 +52,8 @@ CREATE TABLE IF NOT EXISTS services (
     opening_hours VARCHAR(50),
     rating DECIMAL(3,2) DEFAULT 0.0,
     price_range VARCHAR(20), -- €, €€, €€€
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Table des réservations/billets
@@ -80,7 +81,8 @@ CREATE TABLE IF NOT EXISTS recommendations (
     score DECIMAL(5,2),
     reason TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    is_sent BOOLEAN DEFAULT FALSE
+    is_sent BOOLEAN DEFAULT FALSE,
+    CONSTRAINT uq_recommendations_passenger_flight_type UNIQUE (passenger_id, flight_id, recommendation_type)
 );
 
 -- Table des événements (pour le suivi temps réel)
@@ -95,12 +97,20 @@ CREATE TABLE IF NOT EXISTS events (
 );
 
 -- Indexes pour optimiser les requêtes
-CREATE INDEX IF NOT EXISTS idx_flights_departure ON flights(departure_time);
+-- Tri stable (colonne, id) de la pagination par curseur
+CREATE INDEX IF NOT EXISTS idx_flights_departure_id ON flights(departure_time, id);
+CREATE INDEX IF NOT EXISTS idx_flights_number_id ON flights(flight_number, id);
+CREATE INDEX IF NOT EXISTS idx_passengers_last_name_id ON passengers(last_name, id);
+CREATE INDEX IF NOT EXISTS idx_services_name_id ON services(name, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_reference_id ON bookings(booking_reference, id);
 CREATE INDEX IF NOT EXISTS idx_flights_status ON flights(status);
+CREATE INDEX IF NOT EXISTS idx_flights_updated_at ON flights(updated_at);
+CREATE INDEX IF NOT EXISTS idx_services_updated_at ON services(updated_at);
 CREATE INDEX IF NOT EXISTS idx_passengers_email ON passengers(email);
 CREATE INDEX IF NOT EXISTS idx_bookings_passenger ON bookings(passenger_id);
 CREATE INDEX IF NOT EXISTS idx_bookings_flight ON bookings(flight_id);
 CREATE INDEX IF NOT EXISTS idx_events_type_time ON events(event_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_recommendations_passenger_score ON recommendations(passenger_id, score DESC);
 
 -- Trigger pour mettre à jour updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -117,6 +127,21 @@ CREATE TRIGGER update_flights_updated_at BEFORE UPDATE ON flights
 CREATE TRIGGER update_passengers_updated_at BEFORE UPDATE ON passengers
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_services_updated_at BEFORE UPDATE ON services
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Notification des nouveaux événements (flux SSE de l'API, LISTEN airport_events)
+CREATE OR REPLACE FUNCTION notify_airport_event()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('airport_events', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_events_insert AFTER INSERT ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_airport_event();
+
 -- Données d'exemple
 INSERT INTO flights (flight_number, airline, origin, destination, departure_time, arrival_time, aircraft_type, gate, terminal, capacity, price) VALUES
 ('AF1234', 'Air France', 'Paris CDG', 'New York JFK', CURRENT_TIMESTAMP + INTERVAL '2 hours', CURRENT_TIMESTAMP + INTERVAL '10 hours', 'Boeing 777', 'A12', '2E', 350, 650.00),
@@ -0,0 +1,24 @@
+-- Clé unique (passager, vol, type) de l'upsert des recommandations, pour les bases
+-- créées avant son ajout dans init.sql. Idempotent: sans effet si l'index existe déjà.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE tablename = 'recommendations' AND indexname = 'uq_recommendations_passenger_flight_type'
+    ) THEN
+        -- Garder une ligne par clé: meilleur score, puis la plus récente
+        DELETE FROM recommendations r
+        USING (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY passenger_id, flight_id, recommendation_type
+                ORDER BY score DESC NULLS LAST, created_at DESC NULLS LAST, id DESC
+            ) AS rank
+            FROM recommendations
+        ) ranked
+        WHERE r.id = ranked.id AND ranked.rank > 1;
+
+        CREATE UNIQUE INDEX uq_recommendations_passenger_flight_type
+            ON recommendations (passenger_id, flight_id, recommendation_type);
+    END IF;
+END
+$$;
@@ -0,0 +1,13 @@
+-- Notification des nouveaux événements (flux SSE de l'API, LISTEN airport_events),
+-- pour les bases créées avant son ajout dans init.sql. Idempotent.
+CREATE OR REPLACE FUNCTION notify_airport_event()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('airport_events', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_events_insert ON events;
+CREATE TRIGGER notify_events_insert AFTER INSERT ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_airport_event();
@@ -0,0 +1,18 @@
+-- services.updated_at (flux de modifications /ws/deltas), pour les bases créées avant
+-- son ajout dans init.sql. Idempotent.
+ALTER TABLE services ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_services_updated_at ON services;
+CREATE TRIGGER update_services_updated_at BEFORE UPDATE ON services
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE INDEX IF NOT EXISTS idx_flights_updated_at ON flights(updated_at);
+CREATE INDEX IF NOT EXISTS idx_services_updated_at ON services(updated_at);
@@ -0,0 +1,10 @@
+-- Index (colonne de tri, id) de la pagination par curseur, pour les bases créées avant
+-- leur ajout dans init.sql. Idempotent.
+CREATE INDEX IF NOT EXISTS idx_flights_departure_id ON flights(departure_time, id);
+CREATE INDEX IF NOT EXISTS idx_flights_number_id ON flights(flight_number, id);
+CREATE INDEX IF NOT EXISTS idx_passengers_last_name_id ON passengers(last_name, id);
+CREATE INDEX IF NOT EXISTS idx_services_name_id ON services(name, id);
+CREATE INDEX IF NOT EXISTS idx_bookings_reference_id ON bookings(booking_reference, id);
+
+-- Remplacé par idx_flights_departure_id (même préfixe departure_time)
+DROP INDEX IF EXISTS idx_flights_departure;
@@ -0,0 +1,3 @@
+-- Index de lecture du top-K précalculé (GET /recommendations/passenger/{id}), pour les
+-- bases créées avant son ajout dans init.sql. Idempotent.
+CREATE INDEX IF NOT EXISTS idx_recommendations_passenger_score ON recommendations(passenger_id, score DESC);
@@ -648,6 +648,33 @@ class CDGDashboardV2:
         else:
             st.warning("Aucune donnée d'événement disponible")
     
+    def display_trending_destinations(self):
+        """Destinations tendance (compteurs glissants de l'API)"""
+        st.markdown("### 🔥 Destinations Tendance")
+        
+        hours = st.select_slider(
+            "Fenêtre", options=[1, 6, 24, 72, 168, 720], value=24,
+            format_func=lambda h: f"{h} h" if h < 24 else f"{h // 24} j"
+        )
+        data = self.make_api_request(f"/recommendations/trending?hours={hours}&limit=10")
+        
+        if data and data.get("destinations"):
+            df = pd.DataFrame(data["destinations"])
+            fig_trending = px.bar(
+                df,
+                x="bookings",
+                y="destination",
+                orientation='h',
+                title=f"Réservations par Destination ({hours} h)",
+                color="bookings",
+                color_continuous_scale='oranges'
+            )
+            fig_trending.update_layout(showlegend=False, yaxis={'categoryorder':'total ascending'},
+                                       xaxis_title="Réservations", yaxis_title="")
+            st.plotly_chart(fig_trending, use_container_width=True)
+        else:
+            st.info("Aucune réservation sur cette période")
+    
     def run(self):
         """Interface principale cohérente"""
         self.display_header()
@@ -666,6 +693,7 @@ class CDGDashboardV2:
         
         with tab1:
             self.display_flights_table()
+            self.display_trending_destinations()
         
         with tab2:
             self.display_passengers_table()
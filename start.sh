@@ -33,6 +33,12 @@ docker-compose up --build -d
 echo "⏳ Attente du démarrage des services..."
 sleep 10
 
+# Mettre à niveau une base existante (init.sql ne s'exécute qu'à sa création)
+echo "🗄️ Application des migrations..."
+for migration in database/migrations/*.sql; do
+    docker-compose exec -T db psql -q -v ON_ERROR_STOP=1 -U cdg_user -d airport < "$migration" || exit 1
+done
+
 # Vérifier l'état des services
 echo "🔍 Vérification de l'état des services..."
 docker-compose ps